@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+预处理多进程加速基准测试
+
+用法:
+    python bench_preprocess.py --diseases 50000 --max-workers 8
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+from io import StringIO
+
+from preprocess import preprocess_medical_data
+
+def make_synthetic_corpus(path, n_diseases, seed=42):
+    """生成与 medical.json 结构一致的合成语料"""
+    rng = random.Random(seed)
+    symptoms = [f"症状{i}" for i in range(max(n_diseases // 10, 50))]
+    drugs = [f"药品{i}" for i in range(max(n_diseases // 5, 50))]
+    checks = [f"检查{i}" for i in range(max(n_diseases // 20, 20))]
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(n_diseases):
+            record = {
+                'name': f"疾病{i}",
+                'desc': "合成疾病描述。" * rng.randint(5, 40),
+                'prevent': "预防措施。" * rng.randint(2, 20),
+                'cause': "病因说明。" * rng.randint(2, 20),
+                'easy_get': "所有人群",
+                'cure_lasttime': f"{rng.randint(1, 30)}天",
+                'cured_prob': f"{rng.randint(50, 99)}%",
+                'cost_money': f"{rng.randint(100, 10000)}元",
+                'symptom': rng.sample(symptoms, rng.randint(1, 8)),
+                'common_drug': rng.sample(drugs, rng.randint(0, 5)),
+                'check': rng.sample(checks, rng.randint(0, 5)),
+            }
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def run_benchmark(n_diseases, max_workers, repeat=1):
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = os.path.join(tmp, "medical.json")
+        make_synthetic_corpus(corpus, n_diseases)
+        size_mb = os.path.getsize(corpus) / 1024 / 1024
+        print(f"合成语料: {n_diseases} 条疾病, {size_mb:.1f} MB")
+        print(f"{'workers':>8s} {'耗时(s)':>10s} {'加速比':>8s}")
+
+        baseline = None
+        for workers in range(1, max_workers + 1):
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                with redirect_stdout(StringIO()):
+                    preprocess_medical_data(corpus, os.path.join(tmp, f"out_{workers}"), workers=workers)
+                best = min(best, time.perf_counter() - start)
+            baseline = baseline or best
+            print(f"{workers:>8d} {best:>10.2f} {baseline / best:>8.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="比较 1..N 个进程的预处理耗时")
+    parser.add_argument('--diseases', type=int, default=50000, help="合成疾病条数")
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--repeat', type=int, default=1, help="每档重复次数，取最优")
+    args = parser.parse_args()
+    run_benchmark(args.diseases, args.max_workers, args.repeat)
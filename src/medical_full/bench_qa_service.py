@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+qa_service.py 压测脚本，统计延迟与首字耗时的 p50/p95/p99
+
+用法:
+    python bench_qa_service.py --url http://127.0.0.1:8000 --requests 500 --concurrency 50
+    python bench_qa_service.py --mock --requests 500 --concurrency 100   # 进程内启动模拟服务
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+
+import aiohttp
+
+DEFAULT_QUESTIONS = [
+    "感冒有什么症状",
+    "肺炎需要做什么检查",
+    "糖尿病吃什么药",
+    "头痛是什么病",
+    "咳嗽发热怎么回事",
+    "高血压要注意什么",
+]
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))
+    return values[idx]
+
+async def _ask(session, url, question, stream):
+    """返回 (状态码, 总耗时, 首字耗时)"""
+    start = time.perf_counter()
+    ttft = None
+    params = {'stream': '1'} if stream else None
+    async with session.post(f"{url}/ask", json={'question': question}, params=params) as response:
+        if response.status != 200:
+            await response.read()
+            return response.status, time.perf_counter() - start, None
+        if not stream:
+            body = await response.json()
+            return 200, time.perf_counter() - start, body.get('ttft')
+        status = 200
+        event = None
+        async for line in response.content:
+            line = line.decode('utf-8').strip()
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                if event == 'delta' and ttft is None:
+                    ttft = time.perf_counter() - start
+                elif event == 'error':
+                    status = json.loads(line[5:]).get('error', 'error')
+        return status, time.perf_counter() - start, ttft
+
+async def run_load(url, n_requests, concurrency, questions, stream=False, seed=0):
+    rng = random.Random(seed)
+    queue = asyncio.Queue()
+    for _ in range(n_requests):
+        queue.put_nowait(rng.choice(questions))
+    latencies, ttfts, statuses = [], [], Counter()
+
+    async def worker(session):
+        while not queue.empty():
+            question = queue.get_nowait()
+            try:
+                status, elapsed, ttft = await _ask(session, url, question, stream)
+            except aiohttp.ClientError as e:
+                status, elapsed, ttft = type(e).__name__, None, None
+            statuses[status] += 1
+            if status == 200:
+                latencies.append(elapsed)
+                if ttft is not None:
+                    ttfts.append(ttft)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    start = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    print(f"请求 {n_requests} 个, 并发 {concurrency}, 耗时 {wall:.2f}s, 吞吐 {n_requests / wall:.1f} req/s")
+    print(f"状态: {dict(statuses)}")
+    print(f"{'':8s} {'p50(ms)':>10s} {'p95(ms)':>10s} {'p99(ms)':>10s}")
+    for name, values in (('延迟', latencies), ('首字', ttfts)):
+        print(f"{name:8s} " + " ".join(f"{percentile(values, p) * 1000:>10.1f}" for p in (50, 95, 99)))
+
+async def run_with_mock_server(args, questions):
+    from aiohttp import web
+    from qa_service import build_mock_service
+
+    service = build_mock_service(args.data_dir, llm_delay=args.llm_delay, max_pending=args.max_pending)
+    runner = web.AppRunner(service.make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        await run_load(f"http://127.0.0.1:{port}", args.requests, args.concurrency, questions, args.stream)
+    finally:
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="问答服务压测")
+    parser.add_argument('--url', default="http://127.0.0.1:8000")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--stream', action='store_true', help="使用 SSE 接口并统计首字耗时")
+    parser.add_argument('--questions', default=None, help="问题文件，每行一个")
+    parser.add_argument('--mock', action='store_true', help="在进程内启动模拟服务 (模拟连接器 + 假 LLM)")
+    parser.add_argument('--data-dir', default="processed_data")
+    parser.add_argument('--llm-delay', type=float, default=0.2, help="模拟服务中假 LLM 的延迟秒数")
+    parser.add_argument('--max-pending', type=int, default=64, help="模拟服务的排队上限")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, 'r', encoding='utf-8') as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    if args.mock:
+        asyncio.run(run_with_mock_server(args, questions))
+    else:
+        asyncio.run(run_load(args.url, args.requests, args.concurrency, questions, args.stream))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+冷启动导入耗时基准测试 (基于 python -X importtime)
+
+每个模块在独立的子进程中导入，统计模块自身的累计导入耗时，以及导入时是否拉起了重依赖。
+传入 --baseline 时，会把该 git 版本的源码导出到临时目录，用同样方式测一遍作对比。
+
+用法:
+    python bench_startup.py
+    python bench_startup.py --baseline HEAD~1 --repeat 5
+"""
+import os
+import sys
+import tarfile
+import argparse
+import tempfile
+import subprocess
+from io import BytesIO
+
+MODULES = ['neo4j_qa_cli', 'tugraph_qa_cli', 'import_to_neo4j']
+HEAVY_PACKAGES = ('langchain_openai', 'langchain_core', 'pandas', 'py2neo', 'numpy')
+
+def measure_import(module, cwd, timeout=120):
+    """
+    返回 {'ms': 累计导入耗时, 'heavy': 导入过程中加载的重依赖, 'error': 失败原因}
+    导入有副作用 (例如连接数据库) 时，耗时也会计入
+    """
+    try:
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                              cwd=cwd, capture_output=True, text=True, timeout=timeout,
+                              stdin=subprocess.DEVNULL)
+    except subprocess.TimeoutExpired:
+        return {'ms': None, 'heavy': [], 'error': f"超时 ({timeout}s)"}
+
+    cumulative, heavy = None, set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        if name.split(".")[0] in HEAVY_PACKAGES:
+            heavy.add(name.split(".")[0])
+        if name == module:
+            cumulative = int(parts[1]) / 1000
+    error = None
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        error = lines[-1] if lines else f"exit {proc.returncode}"
+    return {'ms': cumulative, 'heavy': sorted(heavy), 'error': error}
+
+def best_of(module, cwd, repeat):
+    runs = [measure_import(module, cwd) for _ in range(repeat)]
+    ok = [r for r in runs if r['ms'] is not None and r['error'] is None]
+    return min(ok, key=lambda r: r['ms']) if ok else runs[-1]
+
+def export_revision(rev, dest, cwd):
+    """把 rev 版本中与 cwd 对应的目录导出到 dest，返回导出后的模块目录"""
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=cwd, capture_output=True, check=True).stdout
+
+    top = git('rev-parse', '--show-toplevel').decode().strip()
+    prefix = git('rev-parse', '--show-prefix').decode().strip()
+    archive = subprocess.run(['git', 'archive', '--format=tar', rev, prefix or '.'], cwd=top,
+                             capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=BytesIO(archive)) as tar:
+        tar.extractall(dest)
+    return os.path.join(dest, prefix)
+
+def _fmt(result):
+    if result['error']:
+        return f"失败: {result['error'][:40]}"
+    return f"{result['ms']:.1f}ms"
+
+def run_benchmark(modules, repeat, baseline=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        base_dir = export_revision(baseline, tmp, here) if baseline else None
+        header = f"{'模块':18s} {'当前':>14s}"
+        if base_dir:
+            header += f" {baseline:>14s}"
+        print(header + "  当前导入的重依赖")
+        for module in modules:
+            current = best_of(module, here, repeat)
+            line = f"{module:18s} {_fmt(current):>14s}"
+            if base_dir:
+                line += f" {_fmt(best_of(module, base_dir, repeat)):>14s}"
+            print(line + "  " + (", ".join(current['heavy']) or "无"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="统计各入口模块的冷启动导入耗时")
+    parser.add_argument('--modules', nargs='+', default=MODULES)
+    parser.add_argument('--repeat', type=int, default=3, help="每个模块重复次数，取最优")
+    parser.add_argument('--baseline', default=None, help="对比的 git 版本，如 HEAD~1")
+    args = parser.parse_args()
+    run_benchmark(args.modules, args.repeat, args.baseline)
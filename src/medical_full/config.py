@@ -24,5 +24,44 @@ class Config:
     TUGRAPH_USER = os.getenv('TUGRAPH_USER', 'admin')
     TUGRAPH_PASSWORD = os.getenv('TUGRAPH_PASSWORD', '!sMpAPDdS9p72DZZu')
 
+    # 图查询后端：remote 直连 Neo4j/TuGraph；snapshot 时一跳查询由 processed_data 构建的本地图快照回答，
+    # 快照不支持的查询仍发往远端
+    GRAPH_BACKEND = os.getenv('GRAPH_BACKEND', 'remote')
+
+    # 问答缓存配置 (QA_CACHE_PATH 为空时只使用内存缓存)；QA_CACHE_DISK_SIZE 为 SQLite 中每层保留的条目数
+    QA_CACHE_SIZE = int(os.getenv('QA_CACHE_SIZE', '1024'))
+    QA_CACHE_DISK_SIZE = int(os.getenv('QA_CACHE_DISK_SIZE', '100000'))
+    QA_CACHE_TTL = int(os.getenv('QA_CACHE_TTL', '3600'))
+    QA_CACHE_PATH = os.getenv('QA_CACHE_PATH', '')
+
+    # preprocess.py 的输出目录，问答时用于加载实体词典等本地索引
+    PROCESSED_DATA_DIR = os.getenv('PROCESSED_DATA_DIR', 'processed_data')
+
+    # 疾病描述向量检索 (索引由 vector_index.py build 生成，VECTOR_TOP_K 为 0 时关闭)
+    VECTOR_TOP_K = int(os.getenv('VECTOR_TOP_K', '3'))
+    VECTOR_NPROBE = int(os.getenv('VECTOR_NPROBE', '8'))
+
+    # 多症状 "可能是什么病" 问题在本地按症状重合度排序 (diagnosis.py)，至少识别出 DIAGNOSIS_MIN_SYMPTOMS 个症状时启用
+    DIAGNOSIS_TOP_K = int(os.getenv('DIAGNOSIS_TOP_K', '5'))
+    DIAGNOSIS_MIN_SYMPTOMS = int(os.getenv('DIAGNOSIS_MIN_SYMPTOMS', '2'))
+
+    # 执行前的 Cypher 检查 (cypher_guard.py)：缺省补充的 LIMIT、LIMIT 上限、变长路径最大跳数与单条查询超时 (秒)
+    CYPHER_DEFAULT_LIMIT = int(os.getenv('CYPHER_DEFAULT_LIMIT', '100'))
+    CYPHER_MAX_LIMIT = int(os.getenv('CYPHER_MAX_LIMIT', '1000'))
+    CYPHER_MAX_HOPS = int(os.getenv('CYPHER_MAX_HOPS', '3'))
+    CYPHER_TIMEOUT = float(os.getenv('CYPHER_TIMEOUT', '10'))
+    # 被拦截的查询追加写入的 JSONL 文件，为空时只打印
+    CYPHER_REJECT_LOG = os.getenv('CYPHER_REJECT_LOG', '')
+    # 仅 Neo4j：先 EXPLAIN，计划中预估行数超过该值时拦截 (0 为关闭，开启后每条 LLM 查询多一次往返)
+    CYPHER_EXPLAIN_MAX_ROWS = int(os.getenv('CYPHER_EXPLAIN_MAX_ROWS', '0'))
+
+    # qa_service.py 的监听地址、并发上限与超时
+    QA_SERVICE_HOST = os.getenv('QA_SERVICE_HOST', '0.0.0.0')
+    QA_SERVICE_PORT = int(os.getenv('QA_SERVICE_PORT', '8000'))
+    QA_LLM_CONCURRENCY = int(os.getenv('QA_LLM_CONCURRENCY', '8'))
+    QA_DB_CONCURRENCY = int(os.getenv('QA_DB_CONCURRENCY', '16'))
+    QA_MAX_PENDING = int(os.getenv('QA_MAX_PENDING', '64'))
+    QA_REQUEST_TIMEOUT = float(os.getenv('QA_REQUEST_TIMEOUT', '60'))
+
 # 导出当前配置实例供其他模块使用
 current_config = Config()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Cypher 执行前的静态检查与代价防护
+
+LLM 生成的查询可能带有无上限的变长路径、笛卡尔积或不带 LIMIT，负载高时会拖住数据库。
+执行前先做一次轻量的静态分析 (字符串字面量与注释先被遮蔽，不会误判实体名中的关键字):
+    拦截  多条语句、写操作、非白名单的过程调用、两个以上无锚点的互不相连的模式 (笛卡尔积)、
+          未指定标签也没有锚点的全图扫描、下限超过 max_hops 的变长路径
+    改写  变长路径的上限截到 max_hops；RETURN 没有 LIMIT 时补上 default_limit，超过 max_limit 时截断
+锚点指内联属性 {name: ...}，或 WHERE 中的 var.prop = / IN / STARTS WITH 以及 id(var) =。
+Neo4j 上可以再用 EXPLAIN 检查执行计划 (explain 回调)，计划中出现 CartesianProduct / AllNodesScan
+或预估行数超过 max_estimated_rows 时同样拦截。
+
+被拦截的查询连同原因打印出来，并可追加写入 JSONL 日志 (log_path)。
+超时由连接器执行：Neo4jConnector.run(_timeout=...) 与 TuGraphConnector.execute_cypher(timeout=...)。
+
+用法:
+    python cypher_guard.py "MATCH (a:Disease), (b:Disease) RETURN a, b"
+"""
+import re
+import json
+import time
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_HOPS = 3
+DEFAULT_TIMEOUT = 10.0
+
+# 只读的元数据/全文检索过程
+ALLOWED_PROCEDURES = {
+    'db.labels', 'db.relationshiptypes', 'db.propertykeys', 'db.schema.visualization',
+    'db.vertexlabels', 'db.edgelabels', 'db.index.fulltext.querynodes',
+}
+# EXPLAIN 计划中视为高代价的算子
+EXPENSIVE_OPERATORS = ('CartesianProduct', 'AllNodesScan')
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|//[^\n]*|/\*.*?\*/", flags=re.S)
+_WRITE_RE = re.compile(
+    r"(?<![.\w$])(create|merge|delete|detach|set|remove|drop|foreach|grant|revoke|deny|alter|terminate)\b"
+    r"|\bload\s+csv\b|\bin\s+transactions\b", flags=re.I)
+_CALL_RE = re.compile(r"\bcall\s+([\w.]+)\s*\(", flags=re.I)
+_CLAUSE_RE = re.compile(
+    r"\b(optional\s+match|match|where|return|with|unwind|order\s+by|skip|limit|call|union|yield)\b", flags=re.I)
+_REL_RE = re.compile(r"-\s*\[([^\[\]]*)\]\s*-")
+_VAR_LENGTH_RE = re.compile(r"\*\s*(\d+)?\s*(\.\.\s*(\d+)?)?")
+_NODE_RE = re.compile(r"\(\s*(\w+)?\s*((?::\s*\w+\s*)*)(\{[^}]*\})?\s*\)")
+_REL_VAR_RE = re.compile(r"\[\s*(\w+)")
+_LIMIT_RE = re.compile(r"\blimit\s+(\d+|\$\w+)", flags=re.I)
+_RETURN_RE = re.compile(r"\breturn\b", flags=re.I)
+_UNION_RE = re.compile(r"\bunion(?:\s+all)?\b", flags=re.I)
+
+class CypherRejected(ValueError):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+def mask_literals(cypher: str) -> str:
+    """把字符串字面量的内容与注释替换成等长的空白，位置不变，改写时可直接对应回原文"""
+    def blank(m):
+        text = m.group(0)
+        if text.startswith(('//', '/*')):
+            return ' ' * len(text)
+        return text[0] + ' ' * (len(text) - 2) + text[-1]
+    return _STRING_RE.sub(blank, cypher)
+
+def _split_top_level(text: str) -> List[str]:
+    """按不在括号内的逗号切分 MATCH 子句中的各个模式"""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(text):
+        if ch in '([{':
+            depth += 1
+        elif ch in ')]}':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p for p in parts if p.strip()]
+
+def _top_level(masked: str, pattern) -> list:
+    """pattern 在括号外的匹配 (子查询 CALL { ... } 中的关键字不算)"""
+    found, depth = [], 0
+    positions = {m.start(): m for m in pattern.finditer(masked)}
+    for i, ch in enumerate(masked):
+        if ch in '([{':
+            depth += 1
+        elif ch in ')]}':
+            depth -= 1
+        elif depth == 0 and i in positions:
+            found.append(positions[i])
+    return found
+
+def _branches(masked: str) -> List[Tuple[int, int]]:
+    """按括号外的 UNION 切分出各个子查询的 (起点, 终点)"""
+    bounds, start = [], 0
+    for m in _top_level(masked, _UNION_RE):
+        bounds.append((start, m.start()))
+        start = m.end()
+    bounds.append((start, len(masked)))
+    return bounds
+
+def _apply_edits(cypher: str, edits: List[Tuple[int, int, str]]) -> str:
+    """按 (起点, 终点, 替换文本) 改写，位置均指改写前的文本"""
+    for start, end, text in sorted(edits, reverse=True):
+        cypher = cypher[:start] + text + cypher[end:]
+    return cypher
+
+def _clauses(masked: str) -> List[Tuple[str, str]]:
+    """[(子句关键字小写, 子句正文)]，只认括号外的关键字"""
+    marks = _top_level(masked, _CLAUSE_RE)
+    return [(' '.join(m.group(1).lower().split()),
+             masked[m.end():marks[j + 1].start() if j + 1 < len(marks) else len(masked)])
+            for j, m in enumerate(marks)]
+
+def _anchored_vars(clauses: List[Tuple[str, str]]) -> set:
+    where = " ".join(body for kw, body in clauses if kw == 'where')
+    anchored = set(re.findall(r"\b(\w+)\.\w+\s*(?:=|in\b|starts\s+with)", where, flags=re.I))
+    anchored.update(re.findall(r"\b(?:id|elementid)\s*\(\s*(\w+)\s*\)\s*(?:=|in\b)", where, flags=re.I))
+    return anchored
+
+def check_patterns(masked: str):
+    """笛卡尔积与全图扫描：按共享变量把各模式合并成连通分量，逐个分量判断 (masked 为单个子查询，不含 UNION)"""
+    clauses = _clauses(masked)
+    anchored = _anchored_vars(clauses)
+    components = []   # [(变量集合, 有锚点, 有标签)]
+    for kw, body in clauses:
+        if kw not in ('match', 'optional match'):
+            continue
+        for part in _split_top_level(body):
+            nodes = _NODE_RE.findall(part)
+            variables = {v for v, _, _ in nodes if v} | set(_REL_VAR_RE.findall(part))
+            has_anchor = any(props or (v and v in anchored) for v, _, props in nodes)
+            has_label = any(labels for _, labels, _ in nodes)
+            merged = [c for c in components if c[0] & variables]
+            for c in merged:
+                components.remove(c)
+                variables |= c[0]
+                has_anchor |= c[1]
+                has_label |= c[2]
+            components.append((variables, has_anchor, has_label))
+
+    for _, has_anchor, has_label in components:
+        if not has_anchor and not has_label:
+            raise CypherRejected("未指定标签的全图扫描")
+    if sum(1 for _, has_anchor, _ in components if not has_anchor) >= 2:
+        raise CypherRejected("多个互不相连且没有锚点的模式 (笛卡尔积)")
+
+class CypherGuard:
+    """
+    参数:
+        explain: (cypher, params) -> 执行计划 dict (Bolt 格式: operatorType / args / children，
+                 见 Neo4jConnector.explain)，为 None 时不做 EXPLAIN
+        max_estimated_rows: 计划中任一算子的预估行数上限，0 为不限制
+        log_path: 被拦截查询的 JSONL 日志，为空时只打印
+    """
+
+    def __init__(self, default_limit: int = DEFAULT_LIMIT, max_limit: int = MAX_LIMIT, max_hops: int = MAX_HOPS,
+                 timeout: float = DEFAULT_TIMEOUT, explain: Optional[Callable] = None,
+                 max_estimated_rows: int = 0, log_path: Optional[str] = None):
+        self.default_limit = default_limit
+        self.max_limit = max_limit
+        self.max_hops = max_hops
+        self.timeout = timeout
+        self.explain = explain
+        self.max_estimated_rows = max_estimated_rows
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rewritten = 0
+        self.rejected = 0
+        self.reasons = {}
+
+    def _rewrite_var_length(self, cypher: str, masked: str, notes: List[str]) -> str:
+        edits = []
+        for rel in _REL_RE.finditer(masked):
+            m = _VAR_LENGTH_RE.search(rel.group(1))
+            if m is None:
+                continue
+            low = int(m.group(1)) if m.group(1) else None
+            if m.group(2) is None:
+                # *n 为固定跳数，单独的 * 为 1..无穷
+                high = low
+                low = 1 if low is None else low
+            else:
+                high = int(m.group(3)) if m.group(3) else None
+                low = 1 if low is None else low
+            if low > self.max_hops:
+                raise CypherRejected(f"变长路径至少 {low} 跳，超过上限 {self.max_hops}")
+            if high is None or high > self.max_hops:
+                start = rel.start(1) + m.start()
+                edits.append((start, rel.start(1) + m.end(), f"*{low}..{self.max_hops}"))
+                notes.append(f"变长路径上限改为 {self.max_hops}")
+        return _apply_edits(cypher, edits)
+
+    def _rewrite_limit(self, cypher: str, masked: str, notes: List[str]) -> str:
+        """UNION 的每个子查询各自在最后一个 RETURN 之后补充/截断 LIMIT"""
+        edits = []
+        for start, end in _branches(masked):
+            branch = masked[start:end]
+            returns = _top_level(branch, _RETURN_RE)
+            if not returns:
+                continue
+            m = _LIMIT_RE.search(branch, returns[-1].end())
+            if m is None:
+                # 插在子查询最后一个非空白字符之后，末尾的注释已被遮蔽为空白，不会把 LIMIT 注释掉
+                pos = start + len(branch.rstrip())
+                edits.append((pos, pos, f" LIMIT {self.default_limit}"))
+                notes.append(f"补充 LIMIT {self.default_limit}")
+            elif m.group(1).isdigit() and int(m.group(1)) > self.max_limit:
+                edits.append((start + m.start(1), start + m.end(1), str(self.max_limit)))
+                notes.append(f"LIMIT {m.group(1)} 截断为 {self.max_limit}")
+        return _apply_edits(cypher, edits)
+
+    def _check_plan(self, cypher: str, params: Optional[dict]):
+        try:
+            plan = self.explain(cypher, params or {})
+        except Exception as e:
+            # EXPLAIN 只是额外的防护，失败时 (如语法错误) 交给真正执行时报错
+            print(f"⚠️ EXPLAIN 失败，跳过执行计划检查: {e}")
+            return
+        stack = [plan] if plan else []
+        while stack:
+            op = stack.pop()
+            if not isinstance(op, dict):
+                continue
+            name = str(op.get('operatorType', ''))
+            if name.startswith(EXPENSIVE_OPERATORS):
+                raise CypherRejected(f"执行计划包含 {name.split('@')[0]}")
+            rows = (op.get('args') or {}).get('EstimatedRows', 0)
+            if self.max_estimated_rows and rows > self.max_estimated_rows:
+                raise CypherRejected(f"执行计划预估 {rows:.0f} 行，超过上限 {self.max_estimated_rows}")
+            stack.extend(op.get('children') or [])
+
+    def analyze(self, cypher: str, params: Optional[dict] = None) -> Tuple[str, List[str]]:
+        """返回 (改写后的 Cypher, 改写说明)；不允许执行时抛 CypherRejected"""
+        cypher = cypher.strip().rstrip(';').strip()
+        if not cypher:
+            raise CypherRejected("空查询")
+        masked = mask_literals(cypher)
+        if ';' in masked:
+            raise CypherRejected("包含多条语句")
+        if _WRITE_RE.search(masked):
+            raise CypherRejected("查询语句包含写操作")
+        for proc in _CALL_RE.findall(masked):
+            if proc.lower() not in ALLOWED_PROCEDURES:
+                raise CypherRejected(f"不允许调用过程 {proc}")
+        for start, end in _branches(masked):
+            check_patterns(masked[start:end])
+
+        notes = []
+        cypher = self._rewrite_var_length(cypher, masked, notes)
+        cypher = self._rewrite_limit(cypher, mask_literals(cypher), notes)
+        if self.explain is not None:
+            self._check_plan(cypher, params)
+        return cypher, notes
+
+    def check(self, cypher: str, params: Optional[dict] = None) -> str:
+        """analyze 并记录统计；被拦截时打印原因、写日志后重新抛出"""
+        try:
+            rewritten, notes = self.analyze(cypher, params)
+        except CypherRejected as e:
+            with self._lock:
+                self.checked += 1
+                self.rejected += 1
+                self.reasons[e.reason] = self.reasons.get(e.reason, 0) + 1
+            self._log(cypher, e.reason)
+            raise
+        with self._lock:
+            self.checked += 1
+            self.rewritten += bool(notes)
+        if notes:
+            print(f"[DEBUG Cypher 改写]: {'，'.join(notes)}")
+        return rewritten
+
+    def _log(self, cypher: str, reason: str):
+        print(f"⚠️ 已拦截 Cypher ({reason}): {' '.join(cypher.split())}")
+        if not self.log_path:
+            return
+        entry = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'reason': reason, 'cypher': cypher}
+        with self._lock, open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def stats(self) -> Dict[str, object]:
+        return {'checked': self.checked, 'rewritten': self.rewritten, 'rejected': self.rejected,
+                'reasons': dict(self.reasons)}
+
+    def format_stats(self) -> str:
+        detail = "，".join(f"{k} {v}" for k, v in self.reasons.items())
+        return (f"  Cypher 检查 {self.checked} 条，改写 {self.rewritten}，拦截 {self.rejected}"
+                f"{'：' + detail if detail else ''}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="检查一条 Cypher 是否会被拦截或改写")
+    parser.add_argument('cypher')
+    parser.add_argument('--max-hops', type=int, default=MAX_HOPS)
+    parser.add_argument('--default-limit', type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args()
+
+    guard = CypherGuard(default_limit=args.default_limit, max_hops=args.max_hops)
+    try:
+        result, notes = guard.analyze(args.cypher)
+    except CypherRejected as e:
+        raise SystemExit(f"拦截: {e.reason}")
+    print(result)
+    for note in notes:
+        print(f"  - {note}")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+症状集合鉴别诊断
+
+“我发烧、咳嗽、头痛，可能是什么病？”这类问题，LLM 要拼出多个 MATCH 的 Cypher，经常超时或查不到结果。
+这里直接在图快照的 疾病×症状 关联矩阵 (has_symptom 边的 CSR) 上给每个疾病打分:
+    idf(s) = ln((N + 1) / (df(s) + 1)) + 1          N 为疾病数，df(s) 为有该症状的疾病数
+    score  = Σ idf(Q∩D) / Σ idf(Q∪D)                IDF 加权 Jaccard，Q 为查询症状，D 为疾病的症状
+分子是查询向量与关联矩阵的稀疏乘积，只遍历查询症状在反向 CSR 中的邻居；
+分母用 Σ idf(Q) + Σ idf(D) - 分子 计算，其中 Σ idf(D) 在加载时按疾病预先算好。
+
+用法:
+    python diagnosis.py --data-dir processed_data 发热 咳嗽 头痛
+    python diagnosis.py --data-dir processed_data --bench 2000
+"""
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from graph_snapshot import DISEASE_LABEL, GraphSnapshot, Relation
+from intent_router import INTENTS
+
+SYMPTOM_LABEL = 'Symptom'
+EDGE_TYPE = 'has_symptom'
+DEFAULT_TOP_K = 5
+# “出现 Y 是什么病” 意图的关键词，与模板快速通道保持一致
+DIAGNOSIS_KEYWORDS = next(intent[1] for intent in INTENTS if intent[0] == 'symptom_disease')
+
+def idf_weights(relation: Relation) -> np.ndarray:
+    """关系目标节点 (症状、检查等) 的 idf，越常见的目标权重越低"""
+    n_diseases = len(relation.forward.indptr) - 1
+    df = np.diff(relation.reverse.indptr).astype(np.float64)
+    return np.log((n_diseases + 1) / (df + 1)) + 1
+
+class DifferentialDiagnoser:
+    def __init__(self, snapshot: GraphSnapshot, edge_type: str = EDGE_TYPE):
+        self.snapshot = snapshot
+        self.relation = snapshot.relations[edge_type]
+        forward = self.relation.forward
+        n_diseases = len(forward.indptr) - 1
+        self.idf = idf_weights(self.relation)
+        # 每个疾病全部症状的 idf 之和 (关联矩阵乘以 idf 向量)
+        src, dst = forward.edges()
+        self.disease_weight = np.bincount(src, weights=self.idf[dst], minlength=n_diseases)
+
+    @classmethod
+    def load(cls, data_dir: str) -> Optional['DifferentialDiagnoser']:
+        """没有症状关系数据时返回 None"""
+        snapshot = GraphSnapshot.open(data_dir)
+        rel = snapshot.relations.get(EDGE_TYPE)
+        if rel is None or not len(rel.forward.indices):
+            return None
+        return cls(snapshot)
+
+    def rank(self, symptoms: List[str], k: int = DEFAULT_TOP_K) -> List[Dict[str, object]]:
+        """
+        返回得分最高的 k 个疾病，按 得分、命中症状数 降序:
+            [{'disease', 'score', 'matched': [命中的查询症状], 'symptom_count': 该疾病的症状总数}]
+        图中不存在的症状会被忽略
+        """
+        query = np.unique(self.snapshot.lookup(SYMPTOM_LABEL, symptoms))
+        if not len(query) or k <= 0:
+            return []
+        sym, dis = self.relation.reverse.gather(query)
+        if not len(dis):
+            return []
+        # 只对至少命中一个症状的候选疾病计分
+        candidates, inverse = np.unique(dis, return_inverse=True)
+        inter = np.bincount(inverse, weights=self.idf[sym])
+        matched = np.bincount(inverse)
+        scores = inter / (self.idf[query].sum() + self.disease_weight[candidates] - inter)
+        top = np.lexsort((candidates, -matched, -scores))[:k]
+
+        names = self.snapshot.names
+        results = []
+        for j in top:
+            hit = sym[inverse == j]
+            results.append({
+                'disease': names[DISEASE_LABEL].get(int(candidates[j])),
+                'score': round(float(scores[j]), 4),
+                'matched': names[SYMPTOM_LABEL].take(hit),
+                'symptom_count': int(self.relation.forward.degree(candidates[j:j + 1])[0]),
+            })
+        return results
+
+    def unknown(self, symptoms: List[str]) -> List[str]:
+        """图中不存在的症状名"""
+        table = self.snapshot.names[SYMPTOM_LABEL]
+        return [name for name in symptoms if table.find(name) < 0]
+
+    def answer(self, question: str, entities, min_symptoms: int = 2, k: int = DEFAULT_TOP_K) -> Optional[str]:
+        """
+        “可能是什么病” 且识别出至少 min_symptoms 个症状时，返回排序结果的文字描述供回答链使用；
+        否则返回 None，交给模板快速通道或 LLM
+        """
+        if not any(kw in question for kw in DIAGNOSIS_KEYWORDS):
+            return None
+        symptoms = list(dict.fromkeys(e.name for e in entities if SYMPTOM_LABEL in e.labels))
+        if len(symptoms) < min_symptoms:
+            return None
+        return format_diagnosis(self.rank(symptoms, k))
+
+def format_diagnosis(ranked: List[Dict[str, object]]) -> str:
+    if not ranked:
+        return "知识库中目前没有找到相关具体条目。"
+    lines = [f"disease：{r['disease']}；匹配症状：{'、'.join(r['matched'])}；"
+             f"该病症状数：{r['symptom_count']}；得分：{r['score']:.2f}" for r in ranked]
+    return "按症状重合度排序的可能疾病：" + "。".join(lines) + "。"
+
+def run_benchmark(diagnoser: DifferentialDiagnoser, repeat: int, k: int, query_size: int = 3):
+    table = diagnoser.snapshot.names[SYMPTOM_LABEL]
+    rng = np.random.default_rng(0)
+    timings = []
+    for _ in range(repeat):
+        symptoms = table.take(rng.integers(0, len(table), query_size))
+        start = time.perf_counter()
+        diagnoser.rank(symptoms, k)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{repeat} 次查询 (每次 {query_size} 个症状)：平均 {sum(timings) / repeat:.3f}ms，"
+          f"p99 {timings[int(repeat * 0.99)]:.3f}ms")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="按症状集合给疾病排序")
+    parser.add_argument('symptoms', nargs='*')
+    parser.add_argument('--data-dir', default="processed_data")
+    parser.add_argument('-k', type=int, default=DEFAULT_TOP_K)
+    parser.add_argument('--bench', type=int, default=0, help="随机症状组合的查询次数")
+    args = parser.parse_args()
+
+    diagnoser = DifferentialDiagnoser.load(args.data_dir)
+    if diagnoser is None:
+        raise SystemExit(f"{args.data_dir} 中没有症状关系数据，请先运行 preprocess.py")
+    print(f"疾病 {len(diagnoser.disease_weight)}，症状 {len(diagnoser.idf)}，"
+          f"关系 {len(diagnoser.relation.forward.indices)}")
+    if args.symptoms:
+        start = time.perf_counter()
+        ranked = diagnoser.rank(args.symptoms, args.k)
+        elapsed = (time.perf_counter() - start) * 1000
+        for i, r in enumerate(ranked, 1):
+            print(f"{i:>2d}. {r['disease']}  得分 {r['score']:.3f}  匹配 {'、'.join(r['matched'])} "
+                  f"({len(r['matched'])}/{r['symptom_count']})")
+        print(f"耗时 {elapsed:.2f}ms")
+    if args.bench:
+        run_benchmark(diagnoser, args.bench, args.k)
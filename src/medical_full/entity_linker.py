@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+基于 Aho-Corasick 自动机的医疗实体识别
+
+从 preprocess.py 输出的 node_*.csv (以及可选的 aliases.csv) 构建自动机，
+一次扫描即可找出问题中的全部 Disease/Symptom/Drug/Check 名称，按最长匹配消歧。
+自动机序列化到 processed_data/entity_linker.pkl，CLI 启动时直接加载。
+
+aliases.csv 格式 (可选):
+    alias,name
+    拉肚子,腹泻
+"""
+import os
+import csv
+import pickle
+from collections import deque, namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LABELS = ('Disease', 'Symptom', 'Drug', 'Check')
+
+NODE_FILES = {
+    'Disease': "node_disease.csv",
+    'Symptom': "node_symptom.csv",
+    'Drug': "node_drug.csv",
+    'Check': "node_check.csv",
+}
+ALIAS_FILE = "aliases.csv"
+CACHE_FILE = "entity_linker.pkl"
+CACHE_VERSION = 1
+MIN_ENTITY_LEN = 2
+
+# surface: 文本中出现的字面；name: 图中的规范名称；labels: 该名称所属的全部标签
+Entity = namedtuple('Entity', ['surface', 'name', 'labels', 'start', 'end'])
+
+def _read_names(path: str) -> List[str]:
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return [row['name'].strip() for row in csv.DictReader(f) if (row.get('name') or '').strip()]
+
+def load_names_from_csv(data_dir: str) -> Dict[str, List[str]]:
+    names = {}
+    for label, filename in NODE_FILES.items():
+        path = os.path.join(data_dir, filename)
+        if os.path.exists(path):
+            names[label] = _read_names(path)
+    return names
+
+def load_names_from_connector(connector) -> Dict[str, List[str]]:
+    """从图数据库加载名称，兼容 TuGraphConnector (execute_cypher) 与 Neo4jConnector (data)"""
+    names = {}
+    for label in LABELS:
+        cypher = f"MATCH (n:{label}) RETURN n.name AS name"
+        if hasattr(connector, 'execute_cypher'):
+            result = connector.execute_cypher(cypher)
+            rows = result.get('data', []) if result.get('success') else []
+        else:
+            rows = connector.data(cypher)
+        names[label] = [str(row['name']) for row in rows if isinstance(row, dict) and row.get('name')]
+    return names
+
+def load_aliases(data_dir: str) -> Dict[str, str]:
+    path = os.path.join(data_dir, ALIAS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return {row['alias'].strip(): row['name'].strip()
+                for row in csv.DictReader(f) if (row.get('alias') or '').strip() and (row.get('name') or '').strip()}
+
+def _source_fingerprint(data_dir: str) -> Tuple:
+    """源文件的 (文件名, 大小, 修改时间)，用于判断缓存是否过期"""
+    fingerprint = []
+    for filename in list(NODE_FILES.values()) + [ALIAS_FILE]:
+        path = os.path.join(data_dir, filename)
+        if os.path.exists(path):
+            st = os.stat(path)
+            fingerprint.append((filename, st.st_size, int(st.st_mtime)))
+    return tuple(fingerprint)
+
+class EntityLinker:
+    """
+    Aho-Corasick 自动机
+
+    状态用并行数组保存: goto[i] 为 {字符: 子状态}，fail[i] 为失败指针，
+    out[i] 为以该状态结尾的模式编号 (-1 表示无)，dict_link[i] 为沿失败链的下一个输出状态
+    """
+
+    def __init__(self, names: Dict[str, Iterable[str]], aliases: Optional[Dict[str, str]] = None):
+        labels_of = {}
+        for label, ns in names.items():
+            for n in ns:
+                labels_of.setdefault(n, [])
+                if label not in labels_of[n]:
+                    labels_of[n].append(label)
+
+        # 模式: (字面, 规范名)；别名指向的规范名必须在图中存在
+        surfaces = {n: n for n in labels_of}
+        for alias, name in (aliases or {}).items():
+            if name in labels_of and alias not in surfaces:
+                surfaces[alias] = name
+        self.patterns = [(s, n) for s, n in surfaces.items() if len(s) >= MIN_ENTITY_LEN]
+        self.labels_of = {n: tuple(ls) for n, ls in labels_of.items()}
+        self._build()
+
+    def _build(self):
+        goto, out, depth = [{}], [-1], [0]
+        for pid, (surface, _) in enumerate(self.patterns):
+            state = 0
+            for ch in surface:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(-1)
+                    depth.append(depth[state] + 1)
+                state = nxt
+            out[state] = pid
+
+        fail = [0] * len(goto)
+        dict_link = [-1] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0) if goto[f].get(ch, 0) != nxt else 0
+                dict_link[nxt] = fail[nxt] if out[fail[nxt]] >= 0 else dict_link[fail[nxt]]
+                queue.append(nxt)
+
+        self.goto, self.fail, self.out, self.dict_link, self.depth = goto, fail, out, dict_link, depth
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def find_all(self, text: str) -> List[Tuple[int, int, int]]:
+        """返回全部 (起点, 终点, 模式编号)，允许重叠"""
+        goto, fail, out, dict_link = self.goto, self.fail, self.out, self.dict_link
+        matches = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            s = state if out[state] >= 0 else dict_link[state]
+            while s > 0:
+                pid = out[s]
+                matches.append((i + 1 - len(self.patterns[pid][0]), i + 1, pid))
+                s = dict_link[s]
+        return matches
+
+    def extract(self, text: str) -> List[Entity]:
+        """最左最长匹配，返回互不重叠的实体"""
+        entities = []
+        cursor = 0
+        for start, end, pid in sorted(self.find_all(text), key=lambda m: (m[0], -(m[1] - m[0]))):
+            if start < cursor:
+                continue
+            surface, name = self.patterns[pid]
+            entities.append(Entity(surface, name, self.labels_of[name], start, end))
+            cursor = end
+        return entities
+
+    def save(self, path: str, fingerprint: Tuple = ()):
+        with open(path, 'wb') as f:
+            pickle.dump({'version': CACHE_VERSION, 'fingerprint': fingerprint, 'linker': self}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, data_dir: str, cache_path: Optional[str] = None) -> 'EntityLinker':
+        """
+        加载自动机；缓存不存在或源 CSV 有变化时重新构建并写回缓存
+        """
+        cache_path = cache_path or os.path.join(data_dir, CACHE_FILE)
+        fingerprint = _source_fingerprint(data_dir)
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    cached = pickle.load(f)
+                if cached.get('version') == CACHE_VERSION and cached.get('fingerprint') == fingerprint:
+                    return cached['linker']
+            except Exception as e:
+                print(f"⚠️ 实体自动机缓存读取失败，将重新构建: {e}")
+
+        linker = cls(load_names_from_csv(data_dir), load_aliases(data_dir))
+        if len(linker) and os.path.isdir(data_dir):
+            try:
+                linker.save(cache_path, fingerprint)
+            except OSError as e:
+                print(f"⚠️ 实体自动机缓存写入失败: {e}")
+        return linker
+
+def format_entity_hint(entities: List[Entity]) -> str:
+    """把识别出的实体拼成 Prompt 提示，让 LLM 直接用精确名称查询"""
+    if not entities:
+        return ""
+    items = "、".join(f"{e.name}({'/'.join(e.labels)})" for e in entities)
+    return f"\n已识别的实体 (与图中名称完全一致，请直接用 name 精确匹配，不要使用 CONTAINS)：{items}"
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "processed_data"
+    start = time.perf_counter()
+    linker = EntityLinker.load(data_dir)
+    print(f"自动机就绪: {len(linker)} 个模式, 耗时 {time.perf_counter() - start:.3f}s")
+    while True:
+        try:
+            text = input("文本：").strip()
+        except (EOFError, KeyboardInterrupt):
+            break
+        start = time.perf_counter()
+        entities = linker.extract(text)
+        print(f"{[(e.name, e.labels) for e in entities]}  ({(time.perf_counter() - start) * 1e6:.0f}µs)")
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+节点名称的字符 n-gram 倒排索引
+
+LLM 生成的 `n.name CONTAINS '关键词'` 在 Neo4j/TuGraph 上都无法走属性索引，只能全标签扫描。
+先算出候选名称，再把谓词改写成 `n.name IN [...]`，数据库端即可走 name 上的唯一约束/索引:
+    NgramIndex     本地 单字 + 双字 倒排索引 (TuGraph 与图快照)
+    FulltextIndex  Neo4j 上 import_to_neo4j.py 建立的 CJK 全文索引 medical_name_fulltext，
+                   单字关键词 (CJK 分词为双字) 或全文索引不可用时退回本地倒排索引
+
+用法 (基准测试):
+    python fuzzy_index.py --data-dir processed_data
+"""
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MAX_CANDIDATES = 200
+FULLTEXT_INDEX = 'medical_name_fulltext'
+# 全文索引不存在 (未运行 import_to_neo4j.py 的批量导入) 或数据库不支持该过程时的报错，出现后不再访问全文索引
+_FULLTEXT_MISSING_RE = re.compile(
+    r"no such fulltext schema index|ProcedureNotFound|no procedure with the name|IndexNotFound", re.IGNORECASE)
+
+_CONTAINS_RE = re.compile(r"\b(\w+)\.name\s+CONTAINS\s+(['\"])(.*?)\2", flags=re.I)
+_VAR_LABEL_RE = re.compile(r"\(\s*(\w+)\s*:\s*(\w+)")
+
+def _grams(text: str) -> set:
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+class NgramIndex:
+    """每个标签一份 gram -> 名称编号 的倒排表"""
+
+    def __init__(self, names: Dict[str, Iterable[str]]):
+        self.names = {label: sorted(set(ns)) for label, ns in names.items()}
+        self.postings = {}
+        for label, ns in self.names.items():
+            postings = defaultdict(set)
+            for i, name in enumerate(ns):
+                for g in _grams(name):
+                    postings[g].add(i)
+            self.postings[label] = dict(postings)
+
+    @classmethod
+    def from_linker(cls, linker) -> 'NgramIndex':
+        """复用 EntityLinker 已加载的名称，避免再次读取 CSV"""
+        names = defaultdict(list)
+        for name, labels in linker.labels_of.items():
+            for label in labels:
+                names[label].append(name)
+        return cls(names)
+
+    def contains(self, label: str, keyword: str) -> List[str]:
+        """返回该标签下名称包含 keyword 的全部节点名"""
+        ns = self.names.get(label, [])
+        postings = self.postings.get(label, {})
+        if not keyword:
+            return list(ns)
+        # 关键词长度 >= 2 时只用双字求交即可，单字时退化为单字倒排
+        keys = [keyword[i:i + 2] for i in range(len(keyword) - 1)] or [keyword]
+        lists = sorted((postings.get(k, set()) for k in keys), key=len)
+        candidates = set(lists[0]).intersection(*lists[1:]) if lists else set()
+        return [ns[i] for i in sorted(candidates) if keyword in ns[i]]
+
+    def similar(self, label: str, text: str, threshold: float = 0.5) -> Optional[Tuple[str, float]]:
+        """
+        按双字 Dice 系数找最相近的节点名，返回 (名称, 相似度)；低于 threshold 时返回 None。
+        候选只来自与 text 至少共享一个双字的名称，不扫描整个标签
+        """
+        ns = self.names.get(label, [])
+        postings = self.postings.get(label, {})
+        grams = {text[i:i + 2] for i in range(len(text) - 1)} or {text}
+        overlap = Counter()
+        for g in grams:
+            overlap.update(postings.get(g, ()))
+        best, best_score = None, 0.0
+        for i, shared in overlap.items():
+            name = ns[i]
+            name_grams = len({name[j:j + 2] for j in range(len(name) - 1)}) or 1
+            score = 2 * shared / (len(grams) + name_grams)
+            # 同分时取更短的名称，避免把 "肺炎" 匹配到更长的疾病名
+            if score > best_score or (score == best_score and best is not None and len(name) < len(best)):
+                best, best_score = name, score
+        return (best, best_score) if best is not None and best_score >= threshold else None
+
+    def scan(self, label: str, keyword: str) -> List[str]:
+        """线性扫描，仅用于基准对比"""
+        return [n for n in self.names.get(label, []) if keyword in n]
+
+    def rewrite_contains(self, cypher: str, max_candidates: int = MAX_CANDIDATES) -> str:
+        return rewrite_contains(cypher, self.contains, self.names, max_candidates)
+
+class FulltextIndex:
+    """
+    用 Neo4j 全文索引查候选名称，接口与 NgramIndex 的 contains / rewrite_contains 相同
+
+    参数:
+        connector: Neo4jConnector
+        fallback: NgramIndex，单字关键词或全文索引查询失败时使用；超时等临时错误只对当次查询回退，
+            全文索引或查询过程不存在时之后都不再访问全文索引
+    """
+
+    def __init__(self, connector, fallback: 'NgramIndex', labels: Iterable[str] = ("Disease", "Symptom", "Drug", "Check"),
+                 timeout: Optional[float] = None):
+        self.connector = connector
+        self.fallback = fallback
+        self.labels = set(labels) | set(fallback.names)
+        self.timeout = timeout
+        self.available = True
+
+    def contains(self, label: str, keyword: str, limit: int = MAX_CANDIDATES + 1) -> List[str]:
+        # CJK 分词器按双字切分，单字无法用短语查询命中
+        if not self.available or len(keyword) < 2:
+            return self.fallback.contains(label, keyword)
+        query = '"' + keyword.replace("\\", "\\\\").replace('"', '\\"') + '"'
+        try:
+            rows = self.connector.data(
+                "CALL db.index.fulltext.queryNodes($index, $query) YIELD node "
+                "WHERE $label IN labels(node) AND node.name CONTAINS $keyword "
+                "RETURN node.name AS name LIMIT $limit",
+                _timeout=self.timeout, index=FULLTEXT_INDEX, query=query, label=label, keyword=keyword, limit=limit)
+        except Exception as e:
+            if _FULLTEXT_MISSING_RE.search(f"{getattr(e, 'code', '')} {e}"):
+                print(f"⚠️ 全文索引 {FULLTEXT_INDEX} 不可用，改用本地 n-gram 索引: {e}")
+                self.available = False
+            return self.fallback.contains(label, keyword)
+        return sorted(r['name'] for r in rows)
+
+    def rewrite_contains(self, cypher: str, max_candidates: int = MAX_CANDIDATES) -> str:
+        return rewrite_contains(cypher, self.contains, self.labels, max_candidates)
+
+def rewrite_contains(cypher: str, contains, labels, max_candidates: int = MAX_CANDIDATES) -> str:
+    """
+    把 `var.name CONTAINS 'kw'` 改写成 `var.name IN [候选]`，候选由 contains(label, kw) 给出。
+    变量的标签从 MATCH 模式 (var:Label) 中推断；推断不出、不在 labels 中或候选过多时保持原样。
+    """
+    var_labels = {var: label for var, label in _VAR_LABEL_RE.findall(cypher)}
+
+    def replace(m):
+        var, keyword = m.group(1), m.group(3)
+        label = var_labels.get(var)
+        if label not in labels:
+            return m.group(0)
+        candidates = contains(label, keyword)
+        if len(candidates) > max_candidates:
+            return m.group(0)
+        literal = ", ".join("'" + c.replace("\\", "\\\\").replace("'", "\\'") + "'" for c in candidates)
+        return f"{var}.name IN [{literal}]"
+
+    return _CONTAINS_RE.sub(replace, cypher)
+
+def run_benchmark(index: NgramIndex, keywords: List[str], repeat: int = 200, connector=None):
+    """比较线性扫描与倒排索引的本地耗时；传入 connector 时再比较数据库端 CONTAINS、全文索引查候选与 IN 查询"""
+    import time
+
+    def timeit(fn):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - start) / repeat * 1e6
+
+    print(f"{'标签':8s} {'节点数':>8s} {'关键词':8s} {'扫描(µs)':>10s} {'索引(µs)':>10s} {'命中':>6s}")
+    for label, ns in index.names.items():
+        for kw in keywords:
+            t_scan = timeit(lambda: index.scan(label, kw))
+            t_index = timeit(lambda: index.contains(label, kw))
+            print(f"{label:8s} {len(ns):>8d} {kw:8s} {t_scan:>10.1f} {t_index:>10.1f} {len(index.contains(label, kw)):>6d}")
+
+    if connector is None:
+        return
+    print("\n数据库端 (毫秒):")
+    fulltext = FulltextIndex(connector, fallback=index)
+    for label in index.names:
+        for kw in keywords:
+            start = time.perf_counter()
+            connector.data(f"MATCH (n:{label}) WHERE n.name CONTAINS $kw RETURN n.name AS name", kw=kw)
+            t_contains = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            names = fulltext.contains(label, kw)
+            t_fulltext = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            connector.data(f"MATCH (n:{label}) WHERE n.name IN $names RETURN n.name AS name", names=names)
+            t_in = (time.perf_counter() - start) * 1000
+            print(f"{label:8s} {kw:8s} CONTAINS {t_contains:>8.2f}  全文索引 {t_fulltext:>8.2f}  IN {t_in:>8.2f}")
+
+if __name__ == "__main__":
+    import argparse
+    from entity_linker import load_names_from_csv
+
+    parser = argparse.ArgumentParser(description="CONTAINS 扫描与 n-gram 索引的耗时对比")
+    parser.add_argument('--data-dir', default="processed_data")
+    parser.add_argument('--keywords', nargs='+', default=["炎", "头痛", "胃", "维生素"])
+    parser.add_argument('--neo4j', action='store_true', help="同时在 Neo4j 上对比 CONTAINS、全文索引与 IN 查询")
+    args = parser.parse_args()
+
+    connector = None
+    if args.neo4j:
+        from neo4j_connector import Neo4jConnector
+        connector = Neo4jConnector()
+    run_benchmark(NgramIndex(load_names_from_csv(args.data_dir)), args.keywords, connector=connector)
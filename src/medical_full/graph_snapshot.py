@@ -0,0 +1,623 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+嵌入式只读图快照
+
+问答中的意图基本都是一跳邻居查询 (疾病 -> 症状/药品/检查，以及反向)，
+每次都要走一次到 Neo4j/TuGraph 的网络往返。这里直接用 preprocess.py 的输出构建只读图:
+    - 每个标签的名称按 UTF-8 字节序排序后编号，存成 偏移数组 + 字节串 的字符串表，按名称二分查找
+    - 每种关系一对 CSR 邻接数组 (正向 疾病->目标，反向 目标->疾病)，基于 NumPy
+    - 疾病属性按疾病编号存成 JSON 字节串
+
+preprocess.py 会把这些数组写进单个二进制文件 processed_data/graph.snap，读取方 mmap 后直接在映射上
+构造数组，不拷贝也不解析：多个 worker 进程共享同一份页缓存，加载耗时与图的规模无关。
+graph.snap 缺失或比 CSV 旧时退回从 CSV 构建。
+
+文件格式 (小端):
+    头部      magic(8s) 版本(u32) 段数(u32) 段目录 CRC32(u32) 数据区 CRC32(u32) 数据区起点(u64) 文件大小(u64)
+    段目录    每段 名称(48s) dtype(8s) 偏移(u64) 元素个数(u64)
+    数据区    各段数组依次排列，按 8 字节对齐
+加载时总是校验头部与段目录；数据区 CRC 需要读完整个文件，只在 verify=True 时校验。
+
+SnapshotConnector 提供与两个连接器兼容的 execute_cypher / data / execute_many 接口，
+支持如下形状的查询 (关系名两个后端的写法都认，方向可以写成 <-)：
+    MATCH (d:Disease)-[:has_symptom]->(s:Symptom) WHERE d.name IN $names RETURN d.name AS disease, s.name LIMIT 100
+    MATCH (d:Disease {name: '感冒'})-[:TREATED_BY_DRUG]->(t:Drug) RETURN DISTINCT t.name AS drug
+    MATCH (d:Disease) WHERE d.name = $name RETURN d.desc AS 简介, d.cause
+其他查询交给 fallback 连接器 (未配置时返回失败)。
+
+用法:
+    python graph_snapshot.py --data-dir processed_data            # 一跳查询基准测试
+    python graph_snapshot.py --data-dir processed_data --build    # 从 CSV 重新生成 graph.snap
+    python graph_snapshot.py --data-dir processed_data --verify   # 校验 graph.snap 的数据区 CRC
+"""
+import os
+import re
+import json
+import mmap
+import time
+import zlib
+import struct
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from entity_linker import NODE_FILES
+from preprocess import DISEASE_PROPS, RELATION_SPECS
+
+DISEASE_LABEL = 'Disease'
+# 两个后端的关系名都映射到 TuGraph 边类型 (也是 rel_*.csv 的文件名)
+EDGE_TYPES = {}
+for _col, _neo4j_type, _edge_label, _target in RELATION_SPECS:
+    EDGE_TYPES[_neo4j_type.lower()] = EDGE_TYPES[_edge_label.lower()] = _edge_label
+EDGE_TARGETS = {edge_label: target for _, _, edge_label, target in RELATION_SPECS}
+
+SNAPSHOT_FILE = "graph.snap"
+SNAPSHOT_MAGIC = b"MEDGRAPH"
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct('<8sIIIIQQ')
+_SECTION = struct.Struct('<48s8sQQ')
+_ALIGN = 8
+
+class SnapshotFormatError(ValueError):
+    pass
+
+class StringTable:
+    """
+    字符串表：第 i 个字符串为 data[offsets[i]:offsets[i + 1]] 的 UTF-8 解码。
+    data 可以是 bytes 或 mmap 上的数组，取值时只切片需要的部分；find 要求按字节序排好
+    """
+
+    def __init__(self, offsets: np.ndarray, data):
+        self.offsets = offsets
+        self._buf = memoryview(data)
+        # 逐个取偏移时 memoryview 返回 Python int，比 NumPy 标量快数倍 (同样不拷贝)
+        self._off = memoryview(np.ascontiguousarray(offsets, dtype=np.int64)).cast('B').cast('q')
+
+    @classmethod
+    def from_strings(cls, strings: Iterable[str], sort: bool = True) -> Tuple['StringTable', np.ndarray]:
+        """返回 (字符串表, rank)，rank[i] 为输入中第 i 个字符串在表中的编号"""
+        encoded = [s.encode('utf-8') for s in strings]
+        order = sorted(range(len(encoded)), key=encoded.__getitem__) if sort else list(range(len(encoded)))
+        rank = np.empty(len(encoded), dtype=np.int64)
+        rank[order] = np.arange(len(encoded))
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(encoded[i]) for i in order], out=offsets[1:])
+        return cls(offsets, b"".join(encoded[i] for i in order)), rank
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _bytes(self, i: int) -> bytes:
+        return bytes(self._buf[self._off[i]:self._off[i + 1]])
+
+    def get(self, i: int) -> str:
+        return self._bytes(i).decode('utf-8')
+
+    def take(self, ids: Iterable[int]) -> List[str]:
+        buf, off = self._buf, self._off
+        return [bytes(buf[off[i]:off[i + 1]]).decode('utf-8') for i in np.asarray(ids).tolist()]
+
+    def find(self, s: str) -> int:
+        """二分查找，返回编号；不存在时返回 -1"""
+        key = s.encode('utf-8')
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self) and self._bytes(lo) == key else -1
+
+class CSR:
+    """压缩稀疏行邻接表：第 i 个源节点的邻居为 indices[indptr[i]:indptr[i + 1]]"""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_edges(cls, src: np.ndarray, dst: np.ndarray, n_src: int) -> 'CSR':
+        order = np.lexsort((dst, src))
+        indptr = np.zeros(n_src + 1, dtype=np.int32)
+        np.cumsum(np.bincount(src, minlength=n_src), out=indptr[1:])
+        return cls(indptr, dst[order].astype(np.int32))
+
+    def degree(self, ids: np.ndarray) -> np.ndarray:
+        return self.indptr[ids + 1] - self.indptr[ids]
+
+    def gather(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """一次取出多个源节点的全部邻居，返回 (源节点 ID, 邻居 ID) 两个等长数组"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 1:
+            # 单个源节点 (最常见的情况) 直接切片
+            start, end = self.indptr[ids[0]], self.indptr[ids[0] + 1]
+            return np.full(end - start, ids[0], dtype=np.int64), self.indices[start:end]
+        counts = self.degree(ids).astype(np.int64)
+        total = int(counts.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        # 每条边在 indices 中的位置 = 所属源节点的起点 + 在该源节点内的偏移
+        offsets = np.repeat(self.indptr[ids] - np.cumsum(counts) + counts, counts)
+        return np.repeat(ids, counts), self.indices[offsets + np.arange(total)]
+
+    def edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        return np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr)), self.indices
+
+class Relation:
+    def __init__(self, edge_type: str, target: str, forward: CSR, reverse: CSR):
+        self.edge_type = edge_type
+        self.target = target
+        self.forward = forward
+        self.reverse = reverse
+
+class GraphSnapshot:
+    """
+    参数:
+        names: {标签: 按字节序排序的名称表}
+        props: 疾病属性表，第 i 项为第 i 个疾病属性的 JSON
+    """
+
+    def __init__(self, names: Dict[str, StringTable], relations: Dict[str, Relation],
+                 props: Optional[StringTable] = None):
+        self.names = names
+        self.relations = relations
+        self.props = props
+        self._mmap = None
+
+    @classmethod
+    def from_csv(cls, data_dir: str) -> 'GraphSnapshot':
+        def read(filename, columns):
+            path = os.path.join(data_dir, filename)
+            if not os.path.exists(path):
+                return pd.DataFrame(columns=columns)
+            header = pd.read_csv(path, nrows=0, encoding='utf-8-sig').columns
+            return pd.read_csv(path, keep_default_na=False, dtype=str, encoding='utf-8-sig',
+                               usecols=[c for c in columns if c in header])
+
+        disease_rows = read(NODE_FILES[DISEASE_LABEL], ['name'] + DISEASE_PROPS)
+        nodes = {label: read(filename, ['name'])['name'] for label, filename in NODE_FILES.items()}
+        rels = {edge_type: read(f"rel_{edge_type}.csv", ['disease_id', target_col])
+                for target_col, _, edge_type, _ in RELATION_SPECS}
+        return cls.from_frames(disease_rows, nodes, rels)
+
+    @classmethod
+    def from_frames(cls, disease_rows: pd.DataFrame, nodes: Dict[str, pd.Series],
+                    rels: Dict[str, pd.DataFrame]) -> 'GraphSnapshot':
+        """
+        参数:
+            disease_rows: 疾病属性表 (name + DISEASE_PROPS)
+            nodes: {标签: 名称列}，Disease 的名称取自 disease_rows
+            rels: {边类型: 两列 (disease_id, 目标列) 的关系表}，列均为字符串
+        """
+        nodes = {**nodes, DISEASE_LABEL: disease_rows['name']}
+        edges = {}
+        for target_col, _, edge_type, target in RELATION_SPECS:
+            rel = rels[edge_type]
+            edges[edge_type] = (target, rel['disease_id'], rel[target_col])
+            # 关系里出现但节点表里没有的名称也要驻留 (与 MERGE 导入的行为一致)
+            nodes[DISEASE_LABEL] = pd.concat([nodes[DISEASE_LABEL], rel['disease_id']])
+            nodes[target] = pd.concat([nodes[target], rel[target_col]])
+
+        names, index = {}, {}
+        for label, ns in nodes.items():
+            unique = pd.unique(ns.str.strip()[lambda s: s != ''].to_numpy(dtype=object))
+            names[label], rank = StringTable.from_strings(unique)
+            # 表内编号 -> 名称，用来把 CSV 中的名称映射到表内编号
+            index[label] = pd.Index(unique[np.argsort(rank)])
+
+        relations = {}
+        for edge_type, (target, src_names, dst_names) in edges.items():
+            src = index[DISEASE_LABEL].get_indexer(src_names.str.strip())
+            dst = index[target].get_indexer(dst_names.str.strip())
+            keep = (src >= 0) & (dst >= 0)
+            n_src, n_dst = len(names[DISEASE_LABEL]), len(names[target])
+            pairs = np.unique(src[keep].astype(np.int64) * n_dst + dst[keep])
+            src, dst = pairs // n_dst, pairs % n_dst
+            relations[edge_type] = Relation(edge_type, target,
+                                            CSR.from_edges(src, dst, n_src), CSR.from_edges(dst, src, n_dst))
+
+        # 同名疾病取第一条记录的属性，与 import_to_neo4j.py 的 MERGE 一致
+        disease_rows = disease_rows.assign(name=disease_rows['name'].str.strip()).drop_duplicates('name')
+        prop_cols = [c for c in DISEASE_PROPS if c in disease_rows.columns]
+        by_name = dict(zip(disease_rows['name'], disease_rows[prop_cols].to_dict(orient='records')))
+        props, _ = StringTable.from_strings(
+            (json.dumps(by_name.get(n, {}), ensure_ascii=False) for n in index[DISEASE_LABEL]), sort=False)
+        return cls(names, relations, props)
+
+    # ---------- 二进制快照 ----------
+
+    def _sections(self) -> List[Tuple[str, np.ndarray]]:
+        def buf(table):
+            return np.frombuffer(table._buf, dtype=np.uint8)
+
+        sections = []
+        for label, table in self.names.items():
+            sections += [(f"names/{label}/offsets", table.offsets), (f"names/{label}/data", buf(table))]
+        for edge_type, rel in self.relations.items():
+            for side, csr in (('fwd', rel.forward), ('rev', rel.reverse)):
+                sections += [(f"rel/{edge_type}/{side}/indptr", csr.indptr.astype(np.int32)),
+                             (f"rel/{edge_type}/{side}/indices", csr.indices.astype(np.int32))]
+        if self.props is not None:
+            sections += [(f"props/{DISEASE_LABEL}/offsets", self.props.offsets),
+                         (f"props/{DISEASE_LABEL}/data", buf(self.props))]
+        return sections
+
+    def save(self, path: str):
+        """写到临时文件后原子替换：已经 mmap 旧文件的进程继续读旧内容，不受影响"""
+        sections = self._sections()
+        align = lambda n: (n + _ALIGN - 1) // _ALIGN * _ALIGN
+        offset = align(_HEADER.size + _SECTION.size * len(sections))
+        payload_offset = offset
+        directory, layout = [], []
+        for name, arr in sections:
+            arr = np.ascontiguousarray(arr)
+            dtype = arr.dtype.newbyteorder('<').str if arr.dtype.itemsize > 1 else '|u1'
+            directory.append(_SECTION.pack(name.encode('ascii'), dtype.encode('ascii'), offset, len(arr)))
+            layout.append((offset, arr.astype(dtype, copy=False)))
+            offset = align(offset + arr.nbytes)
+        directory = b"".join(directory)
+
+        tmp = f"{path}.tmp"
+        payload_crc = 0
+        with open(tmp, 'wb') as f:
+            f.write(b"\0" * payload_offset)
+            for start, arr in layout:
+                pad = b"\0" * (start - f.tell())
+                data = arr.tobytes()
+                payload_crc = zlib.crc32(data, zlib.crc32(pad, payload_crc))
+                f.write(pad + data)
+            pad = b"\0" * (offset - f.tell())
+            payload_crc = zlib.crc32(pad, payload_crc)
+            f.write(pad)
+            f.seek(0)
+            f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(sections), zlib.crc32(directory),
+                                 payload_crc, payload_offset, offset))
+            f.write(directory)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, verify: bool = False) -> 'GraphSnapshot':
+        """mmap 打开快照，各数组直接指向映射内存；verify=True 时额外校验数据区 CRC"""
+        with open(path, 'rb') as f:
+            # 空文件无法 mmap (ValueError)，与过短的文件一样按格式错误处理，由 open 回退到 CSV
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                raise SnapshotFormatError(f"{path} 不是图快照文件")
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, dir_crc, payload_crc, payload_offset, size = _HEADER.unpack_from(mm, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotFormatError(f"{path} 不是图快照文件")
+        if version != SNAPSHOT_VERSION:
+            raise SnapshotFormatError(f"图快照版本 {version} 与当前代码 ({SNAPSHOT_VERSION}) 不一致，请重新运行 preprocess.py")
+        if size != len(mm):
+            raise SnapshotFormatError(f"图快照大小不符 (应为 {size}，实际 {len(mm)})，文件可能被截断")
+        directory = mm[_HEADER.size:_HEADER.size + _SECTION.size * count]
+        if zlib.crc32(directory) != dir_crc:
+            raise SnapshotFormatError("图快照段目录校验失败")
+        if verify and zlib.crc32(memoryview(mm)[payload_offset:]) != payload_crc:
+            raise SnapshotFormatError("图快照数据区校验失败")
+
+        arrays = {}
+        try:
+            for name, dtype, offset, length in _SECTION.iter_unpack(directory):
+                arrays[name.rstrip(b"\0").decode('ascii')] = np.frombuffer(
+                    mm, dtype=np.dtype(dtype.rstrip(b"\0").decode('ascii')), count=length, offset=offset)
+        except (ValueError, TypeError) as e:
+            raise SnapshotFormatError(f"图快照段目录无效: {e}") from e
+
+        names, relations = {}, {}
+        for key in arrays:
+            kind, label, *rest = key.split('/')
+            if kind == 'names' and rest == ['offsets']:
+                names[label] = StringTable(arrays[key], arrays[f"names/{label}/data"])
+            elif kind == 'rel' and rest == ['fwd', 'indptr'] and label in EDGE_TARGETS:
+                csr = lambda side: CSR(arrays[f"rel/{label}/{side}/indptr"], arrays[f"rel/{label}/{side}/indices"])
+                relations[label] = Relation(label, EDGE_TARGETS[label], csr('fwd'), csr('rev'))
+        props = None
+        if f"props/{DISEASE_LABEL}/offsets" in arrays:
+            props = StringTable(arrays[f"props/{DISEASE_LABEL}/offsets"], arrays[f"props/{DISEASE_LABEL}/data"])
+        snapshot = cls(names, relations, props)
+        snapshot._mmap = mm
+        return snapshot
+
+    @classmethod
+    def open(cls, data_dir: str) -> 'GraphSnapshot':
+        """优先 mmap 加载 graph.snap；文件缺失、损坏或比 CSV 旧时从 CSV 构建"""
+        path = os.path.join(data_dir, SNAPSHOT_FILE)
+        if os.path.exists(path):
+            sources = [os.path.join(data_dir, f) for f in list(NODE_FILES.values()) +
+                       [f"rel_{edge_type}.csv" for edge_type in EDGE_TARGETS]]
+            newest = max((os.path.getmtime(p) for p in sources if os.path.exists(p)), default=0)
+            if os.path.getmtime(path) >= newest:
+                try:
+                    return cls.load(path)
+                except SnapshotFormatError as e:
+                    print(f"⚠️ {e}，改为从 CSV 构建")
+            else:
+                print(f"⚠️ {path} 比 CSV 旧，改为从 CSV 构建")
+        return cls.from_csv(data_dir)
+
+    # ---------- 查询 ----------
+
+    def lookup(self, label: str, names: Iterable[str]) -> np.ndarray:
+        table = self.names.get(label)
+        if table is None:
+            return np.empty(0, dtype=np.int64)
+        ids = [table.find(n) for n in names]
+        return np.array([i for i in ids if i >= 0], dtype=np.int64)
+
+    def neighbors(self, edge_type: str, name: str, reverse: bool = False) -> List[str]:
+        """一跳邻居名称；reverse=True 时从目标节点查疾病"""
+        rel = self.relations[EDGE_TYPES[edge_type.lower()]]
+        src_label, dst_label = (rel.target, DISEASE_LABEL) if reverse else (DISEASE_LABEL, rel.target)
+        csr = rel.reverse if reverse else rel.forward
+        _, dst = csr.gather(self.lookup(src_label, [name]))
+        return self.names[dst_label].take(dst)
+
+    def properties(self, disease_ids: Iterable[int]) -> List[dict]:
+        if self.props is None:
+            return [{} for _ in disease_ids]
+        return [json.loads(self.props.get(i)) for i in disease_ids]
+
+    def values(self, label: str, prop: str, ids: np.ndarray) -> list:
+        """节点的 name 或疾病属性；没有的属性返回 None (与 Cypher 中缺失属性为 null 一致)"""
+        if prop == 'name':
+            return self.names[label].take(ids)
+        if label == DISEASE_LABEL and prop in DISEASE_PROPS:
+            return [p.get(prop) for p in self.properties(ids)]
+        return [None] * len(ids)
+
+    def stats(self) -> Dict[str, int]:
+        stats = {label: len(ns) for label, ns in self.names.items()}
+        stats.update({edge_type: len(rel.forward.indices) for edge_type, rel in self.relations.items()})
+        return stats
+
+# ---------------- 查询形状解析 ----------------
+
+_NODE = r"\(\s*(?P<v{0}>\w+)\s*:\s*(?P<l{0}>\w+)\s*(?:\{{\s*name\s*:\s*(?P<f{0}>[^}}]+?)\s*\}})?\s*\)"
+_VALUE = r"\$\w+|'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|\[[^\]]*\]"
+_TAIL = (rf"(?:\s+WHERE\s+(?P<wvar>\w+)\.name\s*(?:=|IN)\s*(?P<wval>{_VALUE}))?"
+         r"\s+RETURN\s+(?P<distinct>DISTINCT\s+)?(?P<items>.+?)"
+         r"(?:\s+LIMIT\s+(?P<limit>\d+))?\s*;?\s*$")
+_QUERY_RE = re.compile(
+    r"^\s*MATCH\s*" + _NODE.format(1) +
+    r"\s*(?P<left><)?-\s*\[\s*\w*\s*:\s*(?P<rel>\w+)\s*\]\s*-(?P<right>>)?\s*" + _NODE.format(2) + _TAIL,
+    flags=re.I | re.S
+)
+_NODE_QUERY_RE = re.compile(r"^\s*MATCH\s*" + _NODE.format(1) + _TAIL, flags=re.I | re.S)
+_ITEM_RE = re.compile(r"^\s*(\w+)\.(\w+)(?:\s+AS\s+(\w+))?\s*$", flags=re.I)
+_STRING_RE = re.compile(r"'((?:[^'\\]|\\.)*)'|\"((?:[^\"\\]|\\.)*)\"")
+
+class UnsupportedQuery(ValueError):
+    pass
+
+def _unescape(s: str) -> str:
+    return re.sub(r"\\(.)", r"\1", s)
+
+@lru_cache(maxsize=1024)
+def parse_query(cypher: str) -> dict:
+    """
+    把支持的查询解析成执行计划 (按语句文本缓存，参数不同的同一模板只解析一次)
+
+    返回:
+        {'edge_type': 一跳查询的边类型，单节点查询为 None, 'source': 疾病一侧变量, 'target': 目标一侧变量,
+         'labels': {变量: 标签}, 'filters': {变量: 字面值或 $参数}, 'items': [(变量, 属性, 列名)],
+         'distinct', 'limit'}
+    """
+    m = _QUERY_RE.match(cypher)
+    if m:
+        edge_type = EDGE_TYPES.get(m.group('rel').lower())
+        if edge_type is None:
+            raise UnsupportedQuery(f"未知的关系类型: {m.group('rel')}")
+        labels = {m.group('v1'): m.group('l1'), m.group('v2'): m.group('l2')}
+        if len(labels) != 2:
+            raise UnsupportedQuery("两端节点变量不能相同")
+        v1, v2 = m.group('v1'), m.group('v2')
+        if m.group('left') and not m.group('right'):
+            source, target = v2, v1
+        elif m.group('right') and not m.group('left'):
+            source, target = v1, v2
+        else:
+            # 无向写法按标签判断哪一端是疾病
+            source, target = (v1, v2) if labels[v1] == DISEASE_LABEL else (v2, v1)
+        inline = ((1, v1), (2, v2))
+    else:
+        m = _NODE_QUERY_RE.match(cypher)
+        if not m:
+            raise UnsupportedQuery("本地图快照不支持该查询")
+        edge_type, source, target = None, m.group('v1'), None
+        labels = {source: m.group('l1')}
+        inline = ((1, source),)
+
+    filters = {var: m.group(f'f{i}') for i, var in inline if m.group(f'f{i}')}
+    if m.group('wvar'):
+        if m.group('wvar') not in labels or m.group('wvar') in filters:
+            raise UnsupportedQuery("WHERE 条件只能作用于未内联过滤的节点变量")
+        filters[m.group('wvar')] = m.group('wval')
+
+    items = []
+    for item in m.group('items').split(','):
+        im = _ITEM_RE.match(item)
+        if not im or im.group(1) not in labels:
+            raise UnsupportedQuery(f"不支持的返回项: {item.strip()}")
+        var, prop = im.group(1), im.group(2)
+        items.append((var, prop, im.group(3) or f"{var}.{prop}"))
+
+    return {'edge_type': edge_type, 'source': source, 'target': target, 'labels': labels,
+            'filters': filters, 'items': items, 'distinct': bool(m.group('distinct')),
+            'limit': int(m.group('limit')) if m.group('limit') else None}
+
+def _bind(value: str, params: dict) -> List[str]:
+    """把过滤值 ($参数 / 字符串字面量 / 列表字面量) 变成名称列表"""
+    if value.startswith('$'):
+        bound = params.get(value[1:])
+        if bound is None:
+            raise UnsupportedQuery(f"缺少参数 {value}")
+        return [str(v) for v in bound] if isinstance(bound, (list, tuple, set)) else [str(bound)]
+    return [_unescape(a or b) for a, b in _STRING_RE.findall(value)]
+
+def _match_ids(snapshot: GraphSnapshot, plan: dict, params: dict) -> Dict[str, np.ndarray]:
+    """按计划求出各变量的节点编号数组 (等长，每个位置是一条匹配)"""
+    labels, source, target = plan['labels'], plan['source'], plan['target']
+    filters = {var: snapshot.lookup(labels[var], _bind(value, params))
+               for var, value in plan['filters'].items()}
+    if plan['edge_type'] is None:
+        if labels[source] not in snapshot.names:
+            return {source: np.empty(0, dtype=np.int64)}
+        return {source: filters.get(source, np.arange(len(snapshot.names[labels[source]])))}
+
+    rel = snapshot.relations[plan['edge_type']]
+    if labels[source] != DISEASE_LABEL or labels[target] != rel.target:
+        # 标签与关系定义不符 (或箭头方向反了)，图中不会有匹配
+        return {source: np.empty(0, dtype=np.int64), target: np.empty(0, dtype=np.int64)}
+    if source in filters:
+        src, dst = rel.forward.gather(filters[source])
+    elif target in filters:
+        dst, src = rel.reverse.gather(filters[target])
+    else:
+        src, dst = rel.forward.edges()
+    ids = {source: src, target: dst}
+    # 两端都有过滤条件时，另一端再按 ID 过滤
+    for var, allowed in filters.items():
+        if var != (source if source in filters else target):
+            keep = np.isin(ids[var], allowed)
+            ids = {v: a[keep] for v, a in ids.items()}
+    return ids
+
+def execute(snapshot: GraphSnapshot, cypher: str, params: Optional[dict] = None) -> List[dict]:
+    plan = parse_query(cypher.strip())
+    ids = _match_ids(snapshot, plan, params or {})
+    limit = plan['limit']
+    if not plan['distinct'] and limit is not None:
+        ids = {v: a[:limit] for v, a in ids.items()}
+    aliases = [alias for _, _, alias in plan['items']]
+    rows = zip(*(snapshot.values(plan['labels'][var], prop, ids[var]) for var, prop, _ in plan['items']))
+    if plan['distinct']:
+        rows = dict.fromkeys(rows)
+    records = [dict(zip(aliases, row)) for row in rows]
+    return records[:limit] if limit is not None else records
+
+# ---------------- 连接器 ----------------
+
+class SnapshotConnector:
+    """
+    本地图快照连接器，接口与 TuGraphConnector (execute_cypher) 和 Neo4jConnector (data) 兼容
+
+    参数:
+        fallback: 返回远端连接器的零参工厂 (如 tugraph_qa_cli.get_tugraph)，
+                  只在遇到快照不支持的查询时才调用，因此纯一跳查询不会建立远端连接
+    """
+
+    def __init__(self, snapshot: GraphSnapshot, fallback: Optional[Callable] = None):
+        self.snapshot = snapshot
+        self.fallback = fallback
+        self.local_queries = 0
+        self.fallback_queries = 0
+
+    @classmethod
+    def load(cls, data_dir: str, fallback: Optional[Callable] = None) -> 'SnapshotConnector':
+        return cls(GraphSnapshot.open(data_dir), fallback)
+
+    def login(self) -> Dict[str, object]:
+        return {'success': True, 'token': None}
+
+    def _fallback_cypher(self, cypher: str, params: Optional[dict], timeout: Optional[float]) -> Dict[str, object]:
+        self.fallback_queries += 1
+        conn = self.fallback()
+        if hasattr(conn, 'execute_cypher'):
+            return conn.execute_cypher(cypher, params, timeout)
+        try:
+            return {'success': True, 'data': conn.data(cypher, _timeout=timeout, **(params or {}))}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def execute_cypher(self, cypher: str, params: dict = None, timeout: float = None) -> Dict[str, object]:
+        """timeout 只作用于回退到远端连接器的查询，快照上的查询是内存遍历"""
+        try:
+            data = execute(self.snapshot, cypher, params)
+        except UnsupportedQuery as e:
+            if self.fallback is None:
+                return {'success': False, 'error': str(e)}
+            return self._fallback_cypher(cypher, params, timeout)
+        self.local_queries += 1
+        return {'success': True, 'data': data}
+
+    def data(self, cypher: str, _timeout: float = None, **parameters) -> List[dict]:
+        """与 Neo4jConnector.data 相同的接口，超时参数带下划线前缀以免与 Cypher 参数冲突"""
+        result = self.execute_cypher(cypher, parameters, _timeout)
+        if not result['success']:
+            raise RuntimeError(result.get('error'))
+        return result['data']
+
+    def execute_many(self, statements, max_workers: int = None) -> List[Dict[str, object]]:
+        results = []
+        for st in statements:
+            cypher, params = (st, None) if isinstance(st, str) else (st[0], st[1] if len(st) > 1 else None)
+            results.append(self.execute_cypher(cypher, params))
+        return results
+
+    def test_connection(self) -> Dict[str, object]:
+        stats = self.snapshot.stats()
+        summary = "，".join(f"{k} {v}" for k, v in stats.items())
+        return {'success': True, 'message': f"✅ 已加载本地图快照 ({summary})", 'graph': 'snapshot'}
+
+    def get_schema(self) -> Dict[str, object]:
+        return {
+            'success': True,
+            'vertex_labels': list(self.snapshot.names),
+            'edge_labels': list(self.snapshot.relations)
+        }
+
+def run_benchmark(connector: SnapshotConnector, repeat: int = 2000):
+    """用 intent_router 生成的模板查询测本地一跳查询耗时"""
+    from intent_router import INTENTS, IntentRouter
+
+    router = IntentRouter(linker=None, backend='tugraph')
+    snapshot = connector.snapshot
+    rng = np.random.default_rng(0)
+    print(f"{'意图':16s} {'平均(µs)':>10s} {'p99(µs)':>10s} {'平均行数':>8s}")
+    for intent in INTENTS:
+        label = intent[2]
+        if intent[5] == 'peer':
+            # 派生边不在快照中
+            continue
+        pool = snapshot.names.get(label)
+        if pool is None or not len(pool):
+            continue
+        cypher, _ = router.build_cypher(intent, [])
+        timings, rows = [], 0
+        for name in pool.take(rng.integers(0, len(pool), repeat)):
+            start = time.perf_counter()
+            rows += len(connector.execute_cypher(cypher, {'names': [name]})['data'])
+            timings.append((time.perf_counter() - start) * 1e6)
+        timings.sort()
+        print(f"{intent[0]:16s} {sum(timings) / repeat:>10.1f} {timings[int(repeat * 0.99)]:>10.1f} {rows / repeat:>8.1f}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地图快照的生成、校验与一跳查询基准测试")
+    parser.add_argument('--data-dir', default="processed_data")
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--build', action='store_true', help="从 CSV 重新生成 graph.snap")
+    parser.add_argument('--verify', action='store_true', help="校验 graph.snap 数据区的 CRC")
+    args = parser.parse_args()
+
+    path = os.path.join(args.data_dir, SNAPSHOT_FILE)
+    if args.build:
+        start = time.perf_counter()
+        GraphSnapshot.from_csv(args.data_dir).save(path)
+        print(f"已生成 {path} ({os.path.getsize(path) / 1e6:.1f} MB，{time.perf_counter() - start:.2f}s)")
+    if args.verify:
+        start = time.perf_counter()
+        GraphSnapshot.load(path, verify=True)
+        print(f"✅ {path} 校验通过 ({time.perf_counter() - start:.3f}s)")
+
+    start = time.perf_counter()
+    connector = SnapshotConnector.load(args.data_dir)
+    print(f"加载耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+    print(connector.test_connection()['message'])
+    run_benchmark(connector, args.repeat)
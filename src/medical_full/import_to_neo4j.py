@@ -1,23 +1,39 @@
 #!/usr/bin/env python3
 # coding: utf-8
 import os
-import pandas as pd
-from py2neo import Node, Relationship
+import time
+import zlib
+import random
+import argparse
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from config import current_config
 from neo4j_connector import Neo4jConnector
+from lazy import once
 
-# 使用统一的 Neo4j 连接器
-neo4j = Neo4jConnector()
-test_res = neo4j.test_connection()
-if not test_res['success']:
-    print(test_res['message'])
-    exit(1)
-else:
+# pandas / py2neo 在函数内按需导入，数据库在首次使用时才连接，导入本模块没有副作用
+
+@once
+def get_neo4j() -> Neo4jConnector:
+    # 使用统一的 Neo4j 连接器
+    neo4j = Neo4jConnector()
+    test_res = neo4j.test_connection()
+    if not test_res['success']:
+        raise ConnectionError(test_res['message'])
     print(test_res['message'])
+    return neo4j
+
+def get_graph():
+    return get_neo4j().graph
 
-graph = neo4j.graph
+DISEASE_PROPS = ['desc', 'prevent', 'cause', 'easy_get', 'cure_lasttime', 'cured_prob', 'cost_money']
+DEFAULT_BATCH_SIZE = 10000
+MAX_RETRIES = 5
 
 def import_diseases(csv_path):
+    import pandas as pd
+    from py2neo import Node
+    graph = get_graph()
     print(f"开始导入疾病节点: {csv_path}")
     df = pd.read_csv(csv_path)
     count = 0
@@ -38,8 +54,12 @@ def import_diseases(csv_path):
         if count % 1000 == 0:
             print(f"已处理 {count} 个疾病节点...")
     print(f"疾病节点导入完成，共 {count} 条。")
+    return count
 
 def import_related_nodes(csv_path, label):
+    import pandas as pd
+    from py2neo import Node
+    graph = get_graph()
     print(f"开始导入 {label} 节点: {csv_path}")
     df = pd.read_csv(csv_path)
     id_col = df.columns[0]
@@ -51,8 +71,12 @@ def import_related_nodes(csv_path, label):
             graph.merge(node, label, 'name')
             count += 1
     print(f"{label} 节点导入完成，共 {count} 条。")
+    return count
 
 def import_relationships(csv_path, rel_type, start_label, end_label):
+    import pandas as pd
+    from py2neo import Node, Relationship
+    graph = get_graph()
     print(f"开始导入关系 {rel_type}: {csv_path}")
     df = pd.read_csv(csv_path)
     start_col = 'disease_id'
@@ -70,30 +94,315 @@ def import_relationships(csv_path, rel_type, start_label, end_label):
             if count % 2000 == 0:
                 print(f"已建立 {count} 条 {rel_type} 关系...")
     print(f"关系 {rel_type} 导入完成，共 {count} 条。")
+    return count
+
+# ---------------- 批量导入 (UNWIND) ----------------
+
+def create_constraints(labels=("Disease", "Symptom", "Drug", "Check")):
+    """为各标签的 name 属性创建唯一约束，MERGE 时可直接走索引"""
+    for label in labels:
+        try:
+            get_graph().run(f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:{label}) REQUIRE n.name IS UNIQUE")
+        except Exception:
+            # 兼容 Neo4j 4.x 旧语法
+            try:
+                get_graph().run(f"CREATE CONSTRAINT ON (n:{label}) ASSERT n.name IS UNIQUE")
+            except Exception as e:
+                print(f"⚠️ {label}.name 唯一约束创建失败: {e}")
+                continue
+        print(f"{label}.name 唯一约束已就绪")
+
+def create_fulltext_index(labels=("Disease", "Symptom", "Drug", "Check")):
+    """在 name 上建立 CJK 分词的全文索引，供模糊查找使用"""
+    label_expr = "|".join(labels)
+    try:
+        get_graph().run(f"""
+        CREATE FULLTEXT INDEX medical_name_fulltext IF NOT EXISTS
+        FOR (n:{label_expr}) ON EACH [n.name]
+        OPTIONS {{indexConfig: {{`fulltext.analyzer`: 'cjk'}}}}
+        """)
+    except Exception:
+        # 兼容 Neo4j 4.x 的过程调用
+        try:
+            get_graph().run(
+                "CALL db.index.fulltext.createNodeIndex('medical_name_fulltext', $labels, ['name'], {analyzer: 'cjk'})",
+                labels=list(labels)
+            )
+        except Exception as e:
+            print(f"⚠️ 全文索引创建失败: {e}")
+            return
+    print("全文索引 medical_name_fulltext 已就绪")
+
+def _run_batches(query, rows, batch_size, desc):
+    """按 batch_size 切分 rows，每批在一个显式事务中执行 UNWIND 语句"""
+    count = 0
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        tx = get_graph().begin()
+        try:
+            tx.run(query, rows=batch)
+            tx.commit()
+        except Exception:
+            tx.rollback()
+            raise
+        count += len(batch)
+        print(f"已提交 {count}/{len(rows)} 条 {desc}...")
+    return count
+
+def bulk_import_diseases(csv_path, batch_size=DEFAULT_BATCH_SIZE):
+    import pandas as pd
+    print(f"开始批量导入疾病节点: {csv_path}")
+    df = pd.read_csv(csv_path, keep_default_na=False, dtype=str)
+    df['name'] = df['name'].str.strip()
+    df = df[df['name'] != '']
+    rows = df[['name'] + [c for c in DISEASE_PROPS if c in df.columns]].to_dict(orient='records')
+    query = """
+    UNWIND $rows AS row
+    MERGE (d:Disease {name: row.name})
+    SET d += row
+    """
+    count = _run_batches(query, rows, batch_size, "疾病节点")
+    print(f"疾病节点导入完成，共 {count} 条。")
+    return count
+
+def bulk_import_related_nodes(csv_path, label, batch_size=DEFAULT_BATCH_SIZE):
+    import pandas as pd
+    print(f"开始批量导入 {label} 节点: {csv_path}")
+    df = pd.read_csv(csv_path, keep_default_na=False, dtype=str)
+    names = df[df.columns[0]].str.strip()
+    rows = [{'name': n} for n in names[names != ''].unique()]
+    query = f"""
+    UNWIND $rows AS row
+    MERGE (n:{label} {{name: row.name}})
+    """
+    count = _run_batches(query, rows, batch_size, f"{label} 节点")
+    print(f"{label} 节点导入完成，共 {count} 条。")
+    return count
+
+def load_relationship_rows(csv_path):
+    """读取关系 CSV，返回去重后的 [{'start': 疾病名, 'end': 目标名}]"""
+    import pandas as pd
+    df = pd.read_csv(csv_path, keep_default_na=False, dtype=str)
+    df = df[['disease_id', df.columns[1]]].apply(lambda col: col.str.strip())
+    df.columns = ['start', 'end']
+    df = df[(df['start'] != '') & (df['end'] != '')].drop_duplicates()
+    return df.to_dict(orient='records')
+
+def relationship_query(rel_type, start_label, end_label):
+    return f"""
+    UNWIND $rows AS row
+    MATCH (s:{start_label} {{name: row.start}})
+    MATCH (e:{end_label} {{name: row.end}})
+    MERGE (s)-[:{rel_type}]->(e)
+    """
+
+def bulk_import_relationships(csv_path, rel_type, start_label, end_label, batch_size=DEFAULT_BATCH_SIZE):
+    print(f"开始批量导入关系 {rel_type}: {csv_path}")
+    rows = load_relationship_rows(csv_path)
+    count = _run_batches(relationship_query(rel_type, start_label, end_label), rows, batch_size, f"{rel_type} 关系")
+    print(f"关系 {rel_type} 导入完成，共 {count} 条。")
+    return count
+
+# ---------------- 并行关系导入 ----------------
+
+def _is_transient_error(e):
+    """Neo4j 的死锁/锁等待超时都属于 TransientError，可以安全重试"""
+    code = str(getattr(e, 'code', '') or '')
+    return 'TransientError' in code or 'TransientError' in type(e).__name__ or 'Deadlock' in str(e)
+
+def _commit_with_retry(query, batch, max_retries=MAX_RETRIES):
+    for attempt in range(max_retries + 1):
+        tx = get_graph().begin()
+        try:
+            tx.run(query, rows=batch)
+            tx.commit()
+            return len(batch)
+        except Exception as e:
+            tx.rollback()
+            if attempt == max_retries or not _is_transient_error(e):
+                raise
+            # 指数退避 + 抖动，避免冲突的两个事务同时重试
+            delay = 0.1 * (2 ** attempt) * (1 + random.random())
+            print(f"⚠️ 事务冲突，{delay:.2f}s 后重试 ({attempt + 1}/{max_retries}): {e}")
+            time.sleep(delay)
+
+def partition_by_start(rows, workers):
+    """
+    按起点(疾病)名哈希分区，同一疾病的所有关系只会落在一个 worker 中，
+    不同 worker 之间不会竞争同一个起点节点的锁。
+    分区内再按终点名排序，使所有事务以相同顺序锁定共享的终点节点。
+    """
+    parts = [[] for _ in range(workers)]
+    for row in rows:
+        parts[zlib.crc32(row['start'].encode('utf-8')) % workers].append(row)
+    for part in parts:
+        part.sort(key=lambda r: (r['end'], r['start']))
+    return parts
+
+def parallel_import_relationships(csv_path, rel_type, start_label, end_label,
+                                  workers=4, batch_size=DEFAULT_BATCH_SIZE):
+    print(f"开始并行导入关系 {rel_type} ({workers} 个 worker): {csv_path}")
+    rows = load_relationship_rows(csv_path)
+    query = relationship_query(rel_type, start_label, end_label)
+
+    def worker(part):
+        count = 0
+        for i in range(0, len(part), batch_size):
+            count += _commit_with_retry(query, part[i:i + batch_size])
+        return count
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        count = sum(pool.map(worker, partition_by_start(rows, workers)))
+    print(f"关系 {rel_type} 导入完成，共 {count} 条。")
+    return count
+
+# ---------------- 派生边 (similarity.py) ----------------
+
+def load_derived_rows(csv_path, columns):
+    """读取派生边表，返回 [{'start': 起点名, 'end': 终点名, 属性...}]"""
+    import pandas as pd
+    df = pd.read_csv(csv_path, keep_default_na=False, encoding='utf-8-sig',
+                     dtype={columns[0]: str, columns[1]: str})
+    df = df.rename(columns={columns[0]: 'start', columns[1]: 'end'})
+    return df[['start', 'end'] + columns[2:]].to_dict(orient='records')
+
+def _group_by_start(rows, batch_size):
+    """按起点分组后再切批，同一起点的边总在同一批 (同一事务) 中"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(row['start'], []).append(row)
+    batch, size = [], 0
+    for start, edges in groups.items():
+        if batch and size + len(edges) > batch_size:
+            yield batch
+            batch, size = [], 0
+        batch.append({'start': start, 'edges': edges, 'ends': [e['end'] for e in edges]})
+        size += len(edges)
+    if batch:
+        yield batch
+
+def replace_derived_relationships(csv_path, columns, rel_type, start_label, end_label,
+                                  batch_size=DEFAULT_BATCH_SIZE):
+    """
+    派生边每次整体重算。按起点分批，每批在一个事务中先写入新边，再删掉这些起点已不在 top-k 中的旧边，
+    查询看到的每个节点要么是旧边要么是新边，中途失败也不会留下空的派生图；
+    最后删除表中已没有任何边的起点的旧边
+    """
+    print(f"开始批量导入关系 {rel_type}: {csv_path}")
+    rows = load_derived_rows(csv_path, columns)
+    upsert = f"""
+    UNWIND $groups AS g
+    UNWIND g.edges AS row
+    MATCH (s:{start_label} {{name: row.start}})
+    MATCH (e:{end_label} {{name: row.end}})
+    MERGE (s)-[r:{rel_type}]->(e)
+    SET {", ".join(f"r.{c} = row.{c}" for c in columns[2:])}
+    """
+    prune = f"""
+    UNWIND $groups AS g
+    MATCH (s:{start_label} {{name: g.start}})-[r:{rel_type}]->(e)
+    WHERE NOT e.name IN g.ends
+    DELETE r
+    """
+    count = 0
+    for groups in _group_by_start(rows, batch_size):
+        tx = get_graph().begin()
+        try:
+            tx.run(upsert, groups=groups)
+            tx.run(prune, groups=groups)
+            tx.commit()
+        except Exception:
+            tx.rollback()
+            raise
+        count += sum(len(g['edges']) for g in groups)
+        print(f"已提交 {count}/{len(rows)} 条 {rel_type} 关系...")
+
+    starts = list(dict.fromkeys(row['start'] for row in rows))
+    removed = 0
+    while True:
+        deleted = get_graph().run(
+            f"MATCH (s:{start_label})-[r:{rel_type}]->() WHERE NOT s.name IN $starts "
+            f"WITH r LIMIT $limit DELETE r RETURN count(r) AS c", starts=starts, limit=batch_size
+        ).evaluate()
+        if not deleted:
+            break
+        removed += deleted
+    if removed:
+        print(f"已删除不再有 {rel_type} 关系的起点的旧边 {removed} 条")
+    print(f"关系 {rel_type} 导入完成，共 {count} 条。")
+    return count
+
+def timed(phase, func, *args, **kwargs):
+    """执行一个导入阶段并打印吞吐量 (rows/sec)"""
+    start = time.perf_counter()
+    count = func(*args, **kwargs) or 0
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"⏱️ [{phase}] {count} 行, 耗时 {elapsed:.2f}s, {rate:,.0f} rows/sec")
+    return count
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="将 processed_data 中的 CSV 导入 Neo4j")
+    parser.add_argument('--data-dir', default="processed_data", help="预处理输出目录")
+    parser.add_argument('--mode', choices=['bulk', 'merge'], default='bulk',
+                        help="bulk: UNWIND 批量导入; merge: 逐行 merge (旧流程)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="bulk 模式下每个事务的行数")
+    parser.add_argument('--workers', type=int, default=1, help="bulk 模式下并行导入关系的 worker 数")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    DATA_DIR = "processed_data"
-    
+    args = parse_args()
+    DATA_DIR = args.data_dir
+    try:
+        get_neo4j()
+    except ConnectionError as e:
+        print(e)
+        exit(1)
+
+    if args.mode == 'bulk':
+        create_constraints()
+        create_fulltext_index()
+        disease_import = partial(bulk_import_diseases, batch_size=args.batch_size)
+        node_import = partial(bulk_import_related_nodes, batch_size=args.batch_size)
+        if args.workers > 1:
+            rel_import = partial(parallel_import_relationships, workers=args.workers, batch_size=args.batch_size)
+        else:
+            rel_import = partial(bulk_import_relationships, batch_size=args.batch_size)
+    else:
+        node_import, rel_import, disease_import = import_related_nodes, import_relationships, import_diseases
+
     # 1. 导入主要节点
-    import_diseases(os.path.join(DATA_DIR, "node_disease.csv"))
+    timed("Disease", disease_import, os.path.join(DATA_DIR, "node_disease.csv"))
     
     # 2. 导入辅助节点
-    import_related_nodes(os.path.join(DATA_DIR, "node_symptom.csv"), "Symptom")
-    import_related_nodes(os.path.join(DATA_DIR, "node_drug.csv"), "Drug")
-    import_related_nodes(os.path.join(DATA_DIR, "node_check.csv"), "Check")
+    timed("Symptom", node_import, os.path.join(DATA_DIR, "node_symptom.csv"), "Symptom")
+    timed("Drug", node_import, os.path.join(DATA_DIR, "node_drug.csv"), "Drug")
+    timed("Check", node_import, os.path.join(DATA_DIR, "node_check.csv"), "Check")
     
     # 3. 导入关系
-    import_relationships(os.path.join(DATA_DIR, "rel_has_symptom.csv"), "HAS_SYMPTOM", "Disease", "Symptom")
-    import_relationships(os.path.join(DATA_DIR, "rel_common_drug.csv"), "TREATED_BY_DRUG", "Disease", "Drug")
-    import_relationships(os.path.join(DATA_DIR, "rel_need_check.csv"), "DIAGNOSED_BY", "Disease", "Check")
-    
+    timed("HAS_SYMPTOM", rel_import, os.path.join(DATA_DIR, "rel_has_symptom.csv"), "HAS_SYMPTOM", "Disease", "Symptom")
+    timed("TREATED_BY_DRUG", rel_import, os.path.join(DATA_DIR, "rel_common_drug.csv"), "TREATED_BY_DRUG", "Disease", "Drug")
+    timed("DIAGNOSED_BY", rel_import, os.path.join(DATA_DIR, "rel_need_check.csv"), "DIAGNOSED_BY", "Disease", "Check")
+
+    # 4. 导入派生边 (相似疾病、药品共用，由 preprocess.py / similarity.py 生成，文件不存在时跳过)
+    from similarity import DERIVED_RELATIONS
+    derived_types = []
+    for filename, columns, rel_type, _, start_label, end_label in DERIVED_RELATIONS:
+        path = os.path.join(DATA_DIR, filename)
+        if not os.path.exists(path):
+            print(f"⚠️ 未找到 {path}，跳过 {rel_type}")
+            continue
+        timed(rel_type, replace_derived_relationships, path, columns, rel_type, start_label, end_label,
+              batch_size=args.batch_size)
+        derived_types.append(rel_type)
+
     print("\n" + "="*30)
     print("📊 数据导入统计结果：")
     for label in ["Disease", "Symptom", "Drug", "Check"]:
-        count = graph.run(f"MATCH (n:{label}) RETURN count(n) as c").evaluate()
+        count = get_graph().run(f"MATCH (n:{label}) RETURN count(n) as c").evaluate()
         print(f"节点 {label}: {count}")
     
-    for rel in ["HAS_SYMPTOM", "TREATED_BY_DRUG", "DIAGNOSED_BY"]:
-        count = graph.run(f"MATCH ()-[r:{rel}]->() RETURN count(r) as c").evaluate()
+    for rel in ["HAS_SYMPTOM", "TREATED_BY_DRUG", "DIAGNOSED_BY"] + derived_types:
+        count = get_graph().run(f"MATCH ()-[r:{rel}]->() RETURN count(r) as c").evaluate()
         print(f"关系 {rel}: {count}")
     print("="*30)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+基于内容哈希的增量导入
+
+preprocess.py 每次运行都会写出 processed_data/manifest.jsonl。
+本脚本将其与上一次成功导入时保存的清单比较，只对新增/变化的疾病做 upsert，
+删除已消失的关系与疾病，其余数据保持不动。
+
+用法:
+    python incremental_import.py --backend neo4j
+    python incremental_import.py --backend tugraph --dry-run
+"""
+import os
+import json
+import shutil
+import argparse
+import pandas as pd
+from config import current_config
+from preprocess import DISEASE_PROPS, RELATION_SPECS
+
+BATCH_SIZE = 5000
+
+def load_manifest(path):
+    """
+    读取 manifest.jsonl，返回 {疾病名: 条目}；文件不存在时返回空字典
+    同名疾病只保留第一条，与 preprocess.py 两种模式写出的数据一致
+    """
+    manifest = {}
+    if not os.path.exists(path):
+        return manifest
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            manifest.setdefault(entry['name'], entry)
+    return manifest
+
+def diff_manifests(old, new):
+    """
+    比较新旧清单
+
+    返回:
+        {'upsert': [疾病名], 'removed': [疾病名],
+         'rel_added': {目标列: [(疾病, 目标)]}, 'rel_removed': {目标列: [(疾病, 目标)]}}
+    """
+    upsert = [name for name, entry in new.items() if name not in old or old[name]['hash'] != entry['hash']]
+    removed = [name for name in old if name not in new]
+    rel_added, rel_removed = {}, {}
+    for col, *_ in RELATION_SPECS:
+        added, dropped = [], []
+        for name in upsert:
+            before = set(old[name][col]) if name in old else set()
+            after = set(new[name][col])
+            added += [(name, t) for t in sorted(after - before)]
+            dropped += [(name, t) for t in sorted(before - after)]
+        rel_added[col], rel_removed[col] = added, dropped
+    return {'upsert': upsert, 'removed': removed, 'rel_added': rel_added, 'rel_removed': rel_removed}
+
+def _batches(rows, size=BATCH_SIZE):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+def _disease_set_clause(var='d'):
+    return ", ".join(f"{var}.{k} = row.{k}" for k in DISEASE_PROPS)
+
+class Neo4jDeltaWriter:
+    """在 Neo4j 上应用增量，关系类型与 import_to_neo4j.py 一致"""
+
+    def __init__(self, connector):
+        self.graph = connector.graph
+
+    def run(self, query, rows):
+        for batch in _batches(rows):
+            tx = self.graph.begin()
+            try:
+                tx.run(query, rows=batch)
+                tx.commit()
+            except Exception:
+                tx.rollback()
+                raise
+
+    def rel_type(self, spec):
+        return spec[1]
+
+class TuGraphDeltaWriter:
+    """通过 TuGraph REST 接口应用增量，使用小写的边类型"""
+
+    def __init__(self, connector):
+        self.connector = connector
+
+    def run(self, query, rows):
+        for batch in _batches(rows):
+            result = self.connector.execute_cypher(query, {'rows': batch})
+            if not result['success']:
+                raise RuntimeError(result.get('error'))
+
+    def rel_type(self, spec):
+        return spec[2]
+
+def apply_delta(writer, delta, disease_rows):
+    """
+    按 删除关系 -> upsert 疾病 -> 新增关系 -> 删除疾病 的顺序写入
+
+    参数:
+        disease_rows: {疾病名: 属性字典}，来自新的 node_disease.csv
+    """
+    for spec in RELATION_SPECS:
+        col, _, _, target_label = spec
+        rows = [{'start': s, 'end': t} for s, t in delta['rel_removed'][col]]
+        writer.run(f"""
+        UNWIND $rows AS row
+        MATCH (d:Disease {{name: row.start}})-[r:{writer.rel_type(spec)}]->(t:{target_label} {{name: row.end}})
+        DELETE r
+        """, rows)
+
+    rows = [disease_rows[name] for name in delta['upsert'] if name in disease_rows]
+    writer.run(f"""
+    UNWIND $rows AS row
+    MERGE (d:Disease {{name: row.name}})
+    SET {_disease_set_clause()}
+    """, rows)
+
+    for spec in RELATION_SPECS:
+        col, _, _, target_label = spec
+        rows = [{'start': s, 'end': t} for s, t in delta['rel_added'][col]]
+        writer.run(f"""
+        UNWIND $rows AS row
+        MATCH (d:Disease {{name: row.start}})
+        MERGE (t:{target_label} {{name: row.end}})
+        MERGE (d)-[:{writer.rel_type(spec)}]->(t)
+        """, rows)
+
+    writer.run("""
+    UNWIND $rows AS row
+    MATCH (d:Disease {name: row.name})
+    DETACH DELETE d
+    """, [{'name': name} for name in delta['removed']])
+
+def load_disease_rows(csv_path, names):
+    df = pd.read_csv(csv_path, keep_default_na=False, dtype=str)
+    df = df[df['name'].isin(set(names))].drop_duplicates('name')
+    return {row['name']: row for row in df[['name'] + DISEASE_PROPS].to_dict(orient='records')}
+
+def build_writer(backend):
+    if backend == 'neo4j':
+        from neo4j_connector import Neo4jConnector
+        connector = Neo4jConnector()
+        test_res = connector.test_connection()
+        if not test_res['success']:
+            raise ConnectionError(test_res['message'])
+        return Neo4jDeltaWriter(connector)
+
+    from tugraph_connector import TuGraphConnector
+    connector = TuGraphConnector(
+        host=current_config.TUGRAPH_HOST,
+        port=current_config.TUGRAPH_PORT,
+        user=current_config.TUGRAPH_USER,
+        password=current_config.TUGRAPH_PASSWORD,
+        graph_name='medical'
+    )
+    login_res = connector.login()
+    if not login_res['success']:
+        raise ConnectionError(login_res['error'])
+    return TuGraphDeltaWriter(connector)
+
+def incremental_import(data_dir, backend, dry_run=False, baseline=False):
+    """
+    参数:
+        baseline: 只把当前清单记为已应用 (库已通过 import_to_neo4j.py 全量导入时使用)
+    """
+    new_path = os.path.join(data_dir, "manifest.jsonl")
+    # 每个后端单独记录已应用的清单，两个库可以分别刷新
+    applied_path = os.path.join(data_dir, f"manifest.applied.{backend}.jsonl")
+    if not os.path.exists(new_path):
+        raise FileNotFoundError(f"找不到 {new_path}，请先运行 preprocess.py")
+    if baseline:
+        shutil.copyfile(new_path, applied_path)
+        print(f"已将当前清单记为基线: {applied_path}")
+        return None
+
+    delta = diff_manifests(load_manifest(applied_path), load_manifest(new_path))
+    print(f"待更新疾病: {len(delta['upsert'])}，待删除疾病: {len(delta['removed'])}")
+    for col, *_ in RELATION_SPECS:
+        print(f"  {col}: 新增 {len(delta['rel_added'][col])} 条，删除 {len(delta['rel_removed'][col])} 条")
+    if dry_run:
+        return delta
+
+    disease_rows = load_disease_rows(os.path.join(data_dir, "node_disease.csv"), delta['upsert'])
+    apply_delta(build_writer(backend), delta, disease_rows)
+    shutil.copyfile(new_path, applied_path)
+    print(f"✅ 增量导入完成，已记录清单: {applied_path}")
+    return delta
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="根据 manifest 差异增量导入图数据库")
+    parser.add_argument('--data-dir', default="processed_data")
+    parser.add_argument('--backend', choices=['neo4j', 'tugraph'], default='neo4j')
+    parser.add_argument('--dry-run', action='store_true', help="只打印差异，不写数据库")
+    parser.add_argument('--baseline', action='store_true', help="全量导入后记录基线清单，不写数据库")
+    args = parser.parse_args()
+    incremental_import(args.data_dir, args.backend, args.dry_run, args.baseline)
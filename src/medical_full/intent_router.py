@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+常见意图的模板快速通道
+
+“X 有什么症状 / X 吃什么药 / X 要做什么检查 / 出现 Y 是什么病” 这几类问题
+直接用 entity_linker 识别实体并生成参数化 Cypher，未命中时再交给 LLM。
+“和 X 相似的疾病 / 常与 X 一起用的药” 查询 similarity.py 预计算的派生边，只在派生边表存在时启用。
+"""
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from entity_linker import EntityLinker, load_names_from_connector
+
+# 两个后端的关系命名不同
+REL_NAMES = {
+    'neo4j': {'symptom': 'HAS_SYMPTOM', 'drug': 'TREATED_BY_DRUG', 'check': 'DIAGNOSED_BY',
+              'similar': 'SIMILAR_TO', 'co_drug': 'CO_PRESCRIBED'},
+    'tugraph': {'symptom': 'has_symptom', 'drug': 'common_drug', 'check': 'need_check',
+                'similar': 'similar_to', 'co_drug': 'co_prescribed'},
+}
+
+# (意图, 关键词, 实体标签, 关系, 目标标签, 方向)，关键词为子串或正则。
+# peer 为同类节点间的派生边，放在前面 (“哪些病和感冒相似” 同时含有 “哪些病”)，
+# 因此只认明确在问“相似的病 / 一起用的药”的说法，“差不多要吃什么药”“和肺炎类似吗”不算
+INTENTS = [
+    ('disease_similar', ("相似的病", "相似的疾病", "类似的病", "类似的疾病", "相近的病", "相近的疾病",
+                         "差不多的病", "差不多的疾病", "相似疾病", "类似疾病",
+                         re.compile(r"(哪些|什么)(疾病|病)(和|跟|与|像)[^，。？?,]{1,20}(相似|类似|相近|差不多)")),
+     'Disease', 'similar', 'Disease', 'peer'),
+    ('drug_co', ("一起用的药", "一起吃的药", "一起使用的药", "一起服用的药", "同用的药", "合用的药", "联用的药",
+                 "搭配的药", "搭配什么药", "配什么药",
+                 re.compile(r"(哪些|什么)(药|药品|药物)(可以|能|常)?(和|跟|与)[^，。？?,]{1,20}(一起|同时|搭配|合|联)(用|吃|服用|使用)")),
+     'Drug', 'co_drug', 'Drug', 'peer'),
+    ('disease_symptom', ("症状", "表现", "征兆", "症候"), 'Disease', 'symptom', 'Symptom', 'out'),
+    ('disease_drug', ("药", "用药", "服用"), 'Disease', 'drug', 'Drug', 'out'),
+    ('disease_check', ("检查", "化验", "检测", "查什么"), 'Disease', 'check', 'Check', 'out'),
+    ('symptom_disease', ("什么病", "哪些病", "什么疾病", "哪些疾病", "可能是", "怎么回事"), 'Symptom', 'symptom', 'Disease', 'in'),
+]
+
+# 派生边意图依赖的边表 (见 similarity.DERIVED_RELATIONS)，边表不存在说明派生边尚未生成/导入
+DERIVED_INTENT_FILES = {'disease_similar': "rel_similar_to.csv", 'drug_co': "rel_co_prescribed.csv"}
+# 派生边结果的排序属性
+PEER_ORDER = {'similar': 'score', 'co_drug': 'count'}
+
+def matches_keywords(question: str, keywords) -> bool:
+    return any(k.search(question) if isinstance(k, re.Pattern) else k in question for k in keywords)
+
+class IntentRouter:
+    """意图路由：命中模板时返回 (cypher, params)，否则返回 None 交给 LLM"""
+
+    def __init__(self, linker: EntityLinker, backend: str = 'neo4j', intents=None):
+        self.linker = linker
+        self.rels = REL_NAMES[backend]
+        self.intents = INTENTS if intents is None else intents
+        self.hits = 0
+        self.misses = 0
+        self.intent_counts = {intent[0]: 0 for intent in self.intents}
+
+    @classmethod
+    def load(cls, data_dir: str, backend: str = 'neo4j', connector=None) -> 'IntentRouter':
+        """优先从 CSV (及其自动机缓存) 加载实体，CSV 不存在时再从图数据库加载"""
+        linker = EntityLinker.load(data_dir)
+        if not len(linker) and connector is not None:
+            try:
+                linker = EntityLinker(load_names_from_connector(connector))
+            except Exception as e:
+                print(f"⚠️ 实体词典加载失败，快速通道不可用: {e}")
+        intents = [intent for intent in INTENTS if intent[0] not in DERIVED_INTENT_FILES
+                   or os.path.exists(os.path.join(data_dir, DERIVED_INTENT_FILES[intent[0]]))]
+        return cls(linker, backend, intents)
+
+    def build_cypher(self, intent, names: List[str]) -> Tuple[str, dict]:
+        _, _, label, rel, target, direction = intent
+        rel_type = self.rels[rel]
+        if direction == 'peer':
+            prop = PEER_ORDER[rel]
+            cypher = (f"MATCH (a:{label})-[r:{rel_type}]->(t:{target}) WHERE a.name IN $names "
+                      f"RETURN a.name AS {label.lower()}, t.name AS {rel}_name, r.{prop} AS {prop} "
+                      f"ORDER BY {prop} DESC LIMIT 100")
+        elif direction == 'out':
+            cypher = (f"MATCH (d:Disease)-[:{rel_type}]->(t:{target}) WHERE d.name IN $names "
+                      f"RETURN d.name AS disease, t.name AS {rel}_name LIMIT 100")
+        else:
+            cypher = (f"MATCH (d:Disease)-[:{rel_type}]->(s:{label}) WHERE s.name IN $names "
+                      f"RETURN s.name AS symptom, d.name AS disease LIMIT 100")
+        return cypher, {'names': names}
+
+    def route(self, question: str, entities=None) -> Optional[Tuple[str, dict]]:
+        """
+        参数:
+            entities: 已经由 linker.extract 得到的实体，传入可避免重复扫描
+        """
+        if entities is None:
+            entities = self.linker.extract(question)
+        for intent in self.intents:
+            name, keywords, label = intent[0], intent[1], intent[2]
+            if not matches_keywords(question, keywords):
+                continue
+            names = list(dict.fromkeys(e.name for e in entities if label in e.labels))
+            if not names:
+                continue
+            self.hits += 1
+            self.intent_counts[name] += 1
+            return self.build_cypher(intent, names)
+        self.misses += 1
+        return None
+
+    def stats(self) -> Dict[str, object]:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'intents': dict(self.intent_counts),
+        }
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        detail = "，".join(f"{k} {v}" for k, v in stats['intents'].items() if v)
+        return (f"  快速通道命中 {stats['hits']} / 未命中 {stats['misses']} "
+                f"(命中率 {stats['hit_rate']:.1%}){'：' + detail if detail else ''}")
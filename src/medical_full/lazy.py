@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+惰性初始化工具
+
+LLM 客户端、数据库连接、索引等都在第一次使用时才创建，导入模块本身不产生任何副作用。
+"""
+import threading
+from functools import wraps
+
+def once(factory):
+    """
+    线程安全的惰性单例：首次调用时执行 factory 并缓存结果，之后直接返回。
+    factory 抛出异常时不缓存，下次调用会重试。
+    """
+    lock = threading.Lock()
+    cache = []
+
+    @wraps(factory)
+    def wrapper():
+        if not cache:
+            with lock:
+                if not cache:
+                    cache.append(factory())
+        return cache[0]
+
+    wrapper.initialized = lambda: bool(cache)
+    wrapper.reset = cache.clear
+    return wrapper
+
+def lazy_module_attrs(module_name: str, factories: dict):
+    """
+    生成模块级 __getattr__ (PEP 562)，让 `module.llm` 这类旧的属性访问方式按需调用对应工厂
+
+    用法:
+        __getattr__ = lazy_module_attrs(__name__, {'llm': get_llm})
+    """
+    def __getattr__(name):
+        if name in factories:
+            return factories[name]()
+        raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+    return __getattr__
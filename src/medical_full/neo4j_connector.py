@@ -1,8 +1,44 @@
 #!/usr/bin/env python3
 # coding: utf-8
 import os
-from py2neo import Graph
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from config import current_config
+from lazy import once
+
+# 带超时的查询在工作线程中执行；py2neo 的 run 会同步拉取全部结果，等待它即覆盖了整个查询。
+# 线程数不少于 qa_service 的数据库并发上限，避免查询在线程池中排队耗掉超时时间
+@once
+def _timeout_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=max(current_config.QA_DB_CONCURRENCY, 8), thread_name_prefix='neo4j-timeout')
+
+# 按查询中的标记注释终止超时的查询：Neo4j 5 使用 TERMINATE TRANSACTIONS，4.x 使用 dbms.killQuery
+_TERMINATE_QUERIES = [
+    "SHOW TRANSACTIONS YIELD transactionId AS txId, currentQuery WHERE currentQuery CONTAINS $tag "
+    "TERMINATE TRANSACTIONS txId YIELD message RETURN txId",
+    "CALL dbms.listQueries() YIELD queryId, query WHERE query CONTAINS $tag "
+    "CALL dbms.killQuery(queryId) YIELD queryId AS killed RETURN killed",
+]
+
+def plan_to_dict(plan):
+    """
+    把执行计划统一成 {'operatorType', 'args', 'children'} 的 dict，args 中的预估行数为 EstimatedRows
+
+    py2neo 2021.x 的 Cursor.plan() 直接返回 Bolt summary 中的 dict (驼峰键)；
+    更早的版本返回 CypherPlan 对象，属性为 operator_type / args / children，args 的键为 snake_case
+    """
+    if plan is None:
+        return None
+    if isinstance(plan, dict):
+        operator, args, children = plan.get('operatorType'), plan.get('args'), plan.get('children')
+    else:
+        operator = getattr(plan, 'operator_type', None) or getattr(plan, 'operatorType', None)
+        args, children = getattr(plan, 'args', None), getattr(plan, 'children', None)
+    args = dict(args or {})
+    if 'EstimatedRows' not in args and 'estimated_rows' in args:
+        args['EstimatedRows'] = args['estimated_rows']
+    return {'operatorType': str(operator or ''), 'args': args,
+            'children': [plan_to_dict(child) for child in children or []]}
 
 class Neo4jConnector:
     def __init__(self, host=None, port=None, user=None, password=None):
@@ -12,19 +48,22 @@ class Neo4jConnector:
         self.password = password or current_config.NEO4J_PASSWORD
         self.graph = None
         self._initialized = False
-        self.connect()
+        self._message = None
 
     def connect(self):
         """
-        尝试通过 Bolt 和 HTTP 协议连接 Neo4j
+        尝试通过 Bolt 和 HTTP 协议连接 Neo4j；构造时不连接，首次查询或 test_connection 时才调用
         """
+        from py2neo import Graph
+
         # 优先尝试 Bolt
         bolt_uri = f"bolt://{self.host}:7687"
         try:
             self.graph = Graph(bolt_uri, auth=(self.user, self.password))
             self.graph.run("RETURN 1").evaluate()
             self._initialized = True
-            return True, f"✅ 已通过 Bolt 连接到 Neo4j ({bolt_uri})"
+            self._message = f"✅ 已通过 Bolt 连接到 Neo4j ({bolt_uri})"
+            return True, self._message
         except Exception as e_bolt:
             # 失败则尝试 HTTP
             http_uri = f"http://{self.host}:{self.port}"
@@ -32,21 +71,99 @@ class Neo4jConnector:
                 self.graph = Graph(http_uri, auth=(self.user, self.password))
                 self.graph.run("RETURN 1").evaluate()
                 self._initialized = True
-                return True, f"✅ 已通过 HTTP 连接到 Neo4j ({http_uri})"
+                self._message = f"✅ 已通过 HTTP 连接到 Neo4j ({http_uri})"
+                return True, self._message
             except Exception as e_http:
                 self._initialized = False
                 return False, f"❌ Neo4j 连接失败: Bolt({e_bolt}), HTTP({e_http})"
 
-    def test_connection(self):
-        success, message = self.connect()
-        return {"success": success, "message": message}
-
-    def run(self, cypher, **parameters):
+    def _ensure_connected(self):
         if not self._initialized:
             success, msg = self.connect()
             if not success:
                 raise ConnectionError(msg)
-        return self.graph.run(cypher, **parameters)
 
-    def data(self, cypher, **parameters):
-        return self.run(cypher, **parameters).data()
+    def test_connection(self):
+        """已连接时只做一次 RETURN 1 探活，不再重新建立连接"""
+        if self._initialized:
+            try:
+                self.graph.run("RETURN 1").evaluate()
+                return {"success": True, "message": self._message}
+            except Exception:
+                self._initialized = False
+        success, message = self.connect()
+        return {"success": success, "message": message}
+
+    def run(self, cypher, _timeout=None, **parameters):
+        """
+        参数:
+            _timeout: 超时秒数；py2neo 不支持事务超时，超时后按标记注释在服务端终止该查询并抛出 TimeoutError。
+                带下划线前缀，避免与名为 $timeout 的 Cypher 参数冲突
+        """
+        timeout = _timeout
+        self._ensure_connected()
+        if not timeout:
+            return self.graph.run(cypher, **parameters)
+        tag = f"qa-guard {uuid.uuid4().hex}"
+        future = _timeout_pool().submit(self.graph.run, f"{cypher}\n// {tag}", **parameters)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            # 还在排队的查询直接取消，已开始执行的才需要到服务端终止
+            if not future.cancel():
+                self._terminate(tag)
+            raise TimeoutError(f"查询超过 {timeout:g}s 未完成，已终止")
+
+    def _terminate(self, tag):
+        for cypher in _TERMINATE_QUERIES:
+            try:
+                self.graph.run(cypher, tag=tag)
+                return
+            except Exception:
+                continue
+        print(f"⚠️ 超时查询终止失败，将由服务端 dbms.transaction.timeout 回收: {tag}")
+
+    def data(self, cypher, _timeout=None, **parameters):
+        return self.run(cypher, _timeout, **parameters).data()
+
+    def explain(self, cypher, **parameters):
+        """EXPLAIN 的执行计划 (不实际执行)，统一为 Bolt 格式的 dict，见 plan_to_dict"""
+        return plan_to_dict(self.run(f"EXPLAIN {cypher}", **parameters).plan())
+
+    def execute_many(self, statements):
+        """
+        在同一个事务中依次执行多条语句，只需一次提交
+
+        参数:
+            statements: 'cypher' 或 (cypher, params) 的列表
+
+        返回:
+            与输入顺序一致的 [{'success': True, 'data': [...]} | {'success': False, 'error': str}]
+            某条语句失败时当前事务回滚，后续语句在新事务中继续执行；
+            同一事务中失败语句之前的语句 (写操作已被撤销) 也标记为失败，error 注明因回滚失败；
+            最后的提交失败时，该事务中的语句都标记为失败，不抛出异常
+        """
+        self._ensure_connected()
+
+        results = []
+        tx, tx_start = self.graph.begin(), 0
+        for st in statements:
+            cypher, params = (st, None) if isinstance(st, str) else (st[0], st[1] if len(st) > 1 else None)
+            try:
+                results.append({'success': True, 'data': tx.run(cypher, **(params or {})).data()})
+            except Exception as e:
+                for i in range(tx_start, len(results)):
+                    results[i] = {'success': False, 'error': f"同一事务中的第 {len(results) + 1} 条语句失败，已回滚: {e}"}
+                results.append({'success': False, 'error': str(e)})
+                try:
+                    tx.rollback()
+                except Exception:
+                    pass
+                tx, tx_start = self.graph.begin(), len(results)
+        try:
+            tx.commit()
+        except Exception as e:
+            # 最后一个事务没有提交成功，其中的语句都不算执行成功
+            for i in range(tx_start, len(results)):
+                results[i] = {'success': False, 'error': f"事务提交失败: {e}"}
+        return results
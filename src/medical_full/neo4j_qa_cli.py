@@ -1,35 +1,51 @@
 #!/usr/bin/env python3
 # coding: utf-8
 import os
-import re
-import json
+import time
+from typing import Iterator
 from neo4j_connector import Neo4jConnector
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from config import current_config
+from qa_cache import QACache
+from intent_router import IntentRouter
+from fuzzy_index import NgramIndex, FulltextIndex
+from cypher_guard import CypherGuard
+from qa_pipeline import QAPipeline
+from lazy import once, lazy_module_attrs
 
-# 1. 自动连接 Neo4j 和 LLM
-print("正在连接 Neo4j 和 AI 服务 (Kimi)...")
-
-# 使用项目中已有的 Kimi 配置
-llm = ChatOpenAI(
-    model="kimi-k2-turbo-preview",
-    openai_api_key=current_config.KIMI_API_KEY,
-    openai_api_base="https://api.moonshot.cn/v1",
-    temperature=0
-)
-
-# 使用统一的 Neo4j 连接器
-neo4j = Neo4jConnector()
-test_res = neo4j.test_connection()
-if not test_res['success']:
-    print(f"⚠️ {test_res['message']}")
-else:
-    print(f"{test_res['message']}")
+# langchain、numpy 等重依赖以及 LLM/数据库连接都在首次使用时才加载，导入本模块没有副作用
+
+# 1. Neo4j 和 LLM
+@once
+def get_llm():
+    # 使用项目中已有的 Kimi 配置
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model="kimi-k2-turbo-preview",
+        openai_api_key=current_config.KIMI_API_KEY,
+        openai_api_base="https://api.moonshot.cn/v1",
+        temperature=0
+    )
+
+@once
+def get_neo4j() -> Neo4jConnector:
+    # 使用统一的 Neo4j 连接器
+    return Neo4jConnector()
+
+@once
+def get_graph():
+    """查询入口：GRAPH_BACKEND=snapshot 时使用本地图快照，不支持的查询才连接 Neo4j"""
+    if current_config.GRAPH_BACKEND == 'snapshot':
+        from graph_snapshot import SnapshotConnector
+        return SnapshotConnector.load(current_config.PROCESSED_DATA_DIR, fallback=get_neo4j)
+    return get_neo4j()
+
+def _build_chain(messages):
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+    return ChatPromptTemplate.from_messages(messages) | get_llm() | StrOutputParser()
 
 # 2. 将自然语言转化为 cypher 语句的 Prompt 模板
-cypher_prompt = ChatPromptTemplate.from_messages([
+CYPHER_PROMPT = [
     ("system", """你是一名 Neo4j Cypher 专家。
 知识图谱Schema:
 - 节点：Disease、Symptom、Drug、Check、Treatment，属性只有 name:str
@@ -38,67 +54,158 @@ cypher_prompt = ChatPromptTemplate.from_messages([
   (d:Disease)-[:TREATED_BY_DRUG]->(dr:Drug)
   (d:Disease)-[:DIAGNOSED_BY]->(c:Check)
   (d:Disease)-[:TREATED_BY]->(t:Treatment)
+  (d:Disease)-[:SIMILAR_TO {{score, shared}}]->(o:Disease)  预计算的相似疾病 (共享症状/检查)，score 越大越相似
+  (dr:Drug)-[:CO_PRESCRIBED {{count, score}}]->(o:Drug)  预计算的常一起使用的药品，count 为共同出现的疾病数
 
 用户问题会被转化为一条 Cypher 查询，要求：
 1. 仅返回必要的节点或属性，不要返回整个路径
 2. 不得修改/删除数据
 3. 用中文别名返回时，请用 name 属性
-4. 只输出一条可执行的 Cypher 语句，不要解释，不要 Markdown 代码块"""),
-    ("human", "{question}")
-])
-cypher_chain = cypher_prompt | llm | StrOutputParser()
+4. 只输出一条可执行的 Cypher 语句，不要解释，不要 Markdown 代码块
+5. 问相似疾病或一起使用的药品时，直接查询 SIMILAR_TO / CO_PRESCRIBED 一跳关系，不要经由症状或疾病做两跳遍历"""),
+    ("human", "{question}{entity_hint}")
+]
 
-# 3. 执行 Cypher 并处理结果
-def _exec_cypher(cypher: str) -> str:
-    try:
-        # 只允许读语句
-        if re.search(r"\b(delete|remove|set|merge|create|drop)\b", cypher, flags=re.I):
-            return "验证失败：查询语句包含写操作，已拦截。"
-        
-        # 调试信息：打印生成的 Cypher
-        # print(f"DEBUG: 执行 Cypher -> {cypher}")
-        
-        data = neo4j.data(cypher)
-        if not data:
-            return "知识库中目前没有找到相关具体条目。"
-        
-        # 将结果 list[dict] 拼成自然语言描述
-        lines = []
-        for d in data:
-            line_parts = []
-            for k, v in d.items():
-                # 兼容直接返回节点对象的情况
-                val = v.get('name') if hasattr(v, 'get') and 'name' in v else v
-                line_parts.append(f"{k}：{val}")
-            lines.append("；".join(line_parts))
-        
-        return "。".join(lines) + "。"
-    except Exception as e:
-        return f"数据库查询过程中出现问题：{str(e)}"
+@once
+def get_cypher_chain():
+    return _build_chain(CYPHER_PROMPT)
 
-# 4. 生成自然语言回答的 Prompt 模板
-answer_prompt = ChatPromptTemplate.from_messages([
-    ("system", "你是友善的医疗知识助手。请根据查询结果用一句话回答用户问题，尽量简洁。若结果为空，请礼貌说明。"),
-    ("human", "用户问题：{question}\n查询结果：{result}")
-])
-answer_chain = answer_prompt | llm | StrOutputParser()
+# 3. 生成自然语言回答的 Prompt 模板
+ANSWER_PROMPT = [
+    ("system", "你是友善的医疗知识助手。请根据查询结果和参考资料用一句话回答用户问题，尽量简洁。两者都没有相关内容时，请礼貌说明。"),
+    ("human", "用户问题：{question}\n查询结果：{result}\n参考资料：{passages}")
+]
 
-# 5. 完整问诊逻辑
-def chat(question: str) -> str:
+@once
+def get_answer_chain():
+    return _build_chain(ANSWER_PROMPT)
+
+# 问题 -> Cypher -> 查询结果 -> 回答 的分层缓存
+@once
+def get_qa_cache() -> QACache:
+    return QACache(
+        maxsize=current_config.QA_CACHE_SIZE,
+        ttl=current_config.QA_CACHE_TTL,
+        sqlite_path=current_config.QA_CACHE_PATH or None,
+        disk_maxsize=current_config.QA_CACHE_DISK_SIZE
+    )
+
+# 常见意图的模板快速通道，命中时跳过 cypher_chain
+@once
+def get_intent_router() -> IntentRouter:
+    return IntentRouter.load(current_config.PROCESSED_DATA_DIR, backend='neo4j', connector=get_neo4j())
+
+# 直连 Neo4j 时用 CJK 全文索引查候选名称，图快照模式只用本地 n-gram 索引
+@once
+def get_name_index():
+    local = NgramIndex.from_linker(get_intent_router().linker)
+    if current_config.GRAPH_BACKEND == 'snapshot':
+        return local
+    return FulltextIndex(get_neo4j(), fallback=local, timeout=current_config.CYPHER_TIMEOUT)
+
+# 执行前的 Cypher 检查；CYPHER_EXPLAIN_MAX_ROWS 大于 0 且直连 Neo4j 时再检查执行计划
+@once
+def get_cypher_guard() -> CypherGuard:
+    graph = get_graph() if current_config.CYPHER_EXPLAIN_MAX_ROWS > 0 else None
+    explain = None
+    if hasattr(graph, 'explain'):
+        explain = lambda cypher, params: graph.explain(cypher, **params)
+    return CypherGuard(
+        default_limit=current_config.CYPHER_DEFAULT_LIMIT,
+        max_limit=current_config.CYPHER_MAX_LIMIT,
+        max_hops=current_config.CYPHER_MAX_HOPS,
+        timeout=current_config.CYPHER_TIMEOUT,
+        explain=explain,
+        max_estimated_rows=current_config.CYPHER_EXPLAIN_MAX_ROWS,
+        log_path=current_config.CYPHER_REJECT_LOG or None
+    )
+
+# 疾病描述的向量索引，未构建时只根据图查询结果回答
+@once
+def get_vector_index():
+    from vector_index import VectorIndex
+    return VectorIndex.load(current_config.PROCESSED_DATA_DIR, current_config.VECTOR_NPROBE)
+
+# 症状集合鉴别诊断，复用 snapshot 模式已加载的图快照；没有症状关系数据时为 None
+@once
+def get_diagnoser():
+    from diagnosis import DifferentialDiagnoser
+    if current_config.GRAPH_BACKEND == 'snapshot':
+        return DifferentialDiagnoser(get_graph().snapshot)
+    return DifferentialDiagnoser.load(current_config.PROCESSED_DATA_DIR)
+
+# 4. 完整问诊逻辑：检查/改写/执行 Cypher、本地诊断与模板路由、向量检索都由 QAPipeline 完成
+@once
+def get_pipeline() -> QAPipeline:
+    return QAPipeline(
+        get_cypher_chain(), get_answer_chain(), get_graph(), get_intent_router(),
+        guard=get_cypher_guard(),
+        cache=get_qa_cache(),
+        name_index=get_name_index(),
+        vector_index=get_vector_index(),
+        vector_top_k=current_config.VECTOR_TOP_K,
+        diagnoser=get_diagnoser(),
+        diagnosis_top_k=current_config.DIAGNOSIS_TOP_K,
+        diagnosis_min_symptoms=current_config.DIAGNOSIS_MIN_SYMPTOMS
+    )
+
+# 每次请求的 (首字耗时, 总耗时)，单位秒
+stream_timings = []
+
+def chat_stream(question: str) -> Iterator[str]:
+    """流式问答：LLM 每产出一段回答就立即 yield，首字耗时记录到 stream_timings"""
+    start = time.perf_counter()
+    ttft = None
     try:
-        # 生成 Cypher
-        cypher = cypher_chain.invoke({"question": question})
-        cypher = cypher.strip().strip("`").strip(";")  # 移除可能的 markdown 标记和分号
-        
-        # 执行查询
-        result = _exec_cypher(cypher)
-        
-        # 生成回答
-        return answer_chain.invoke({"question": question, "result": result})
+        pipeline = get_pipeline()
+        key, cypher, result, passages = pipeline.prepare(question)
+        for chunk in pipeline.answer(question, key, result, passages):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            yield chunk
     except Exception as e:
-        return f"抱歉，我处理这个问题时遇到了点麻烦：{str(e)}"
+        yield f"抱歉，我处理这个问题时遇到了点麻烦：{str(e)}"
+    finally:
+        total = time.perf_counter() - start
+        stream_timings.append((ttft if ttft is not None else total, total))
+
+def chat(question: str) -> str:
+    return "".join(chat_stream(question))
+
+def format_timing_stats() -> str:
+    if not stream_timings:
+        return "  暂无请求"
+    ttfts = sorted(t for t, _ in stream_timings)
+    totals = sorted(t for _, t in stream_timings)
+    return (f"  {len(stream_timings)} 次请求，首字耗时中位数 {ttfts[len(ttfts) // 2]:.2f}s，"
+            f"总耗时中位数 {totals[len(totals) // 2]:.2f}s")
+
+# 兼容旧的模块属性访问方式 (如 neo4j_qa_cli.cypher_chain)，访问时才初始化
+__getattr__ = lazy_module_attrs(__name__, {
+    'llm': get_llm,
+    'neo4j': get_neo4j,
+    'graph': get_graph,
+    'cypher_chain': get_cypher_chain,
+    'answer_chain': get_answer_chain,
+    'qa_cache': get_qa_cache,
+    'intent_router': get_intent_router,
+    'name_index': get_name_index,
+    'vector_index': get_vector_index,
+    'diagnoser': get_diagnoser,
+    'cypher_guard': get_cypher_guard,
+    'pipeline': get_pipeline,
+})
 
 if __name__ == "__main__":
+    print("正在连接 Neo4j 和 AI 服务 (Kimi)...")
+    test_res = get_graph().test_connection()
+    if not test_res['success']:
+        print(f"⚠️ {test_res['message']}")
+    else:
+        print(f"{test_res['message']}")
+    get_llm()
+    qa_cache, intent_router = get_qa_cache(), get_intent_router()
+
     print("\n" + "="*50)
     print("您好！我是集成 Neo4j 的医疗知识助手。")
     print("我可以基于知识图谱回答：疾病症状、检查项目、用药建议、科室分类等。")
@@ -113,11 +220,19 @@ if __name__ == "__main__":
             lower_text = q.lower()
             if any(k in lower_text for k in {"退出", "exit", "quit", "算了"}):
                 print("\n助手：感谢您的咨询，再见！")
+                print("缓存统计：")
+                print(qa_cache.format_stats())
+                print(intent_router.format_stats())
+                print(get_cypher_guard().format_stats())
+                print("响应耗时：")
+                print(format_timing_stats())
                 break
                 
             print("🤖 助手：", end="", flush=True)
-            res = chat(q)
-            print(res)
+            for chunk in chat_stream(q):
+                print(chunk, end="", flush=True)
+            ttft, total = stream_timings[-1]
+            print(f"\n[首字 {ttft:.2f}s，总计 {total:.2f}s]")
             print("-" * 30)
         except KeyboardInterrupt:
             print("\n对话已终止。")
@@ -3,84 +3,564 @@
 
 import pandas as pd
 import json
+import csv
+import gzip
+import hashlib
 import os
 
-def preprocess_medical_data(input_file, output_dir):
-    print(f"开始预处理数据: {input_file}")
-    
-    diseases = []
-    symptoms = set()
-    drugs = set()
-    checks = set()
-    
-    rel_disease_symptom = []
-    rel_disease_drug = []
-    rel_disease_check = []
+DISEASE_PROPS = ['desc', 'prevent', 'cause', 'easy_get', 'cure_lasttime', 'cured_prob', 'cost_money']
+
+# (关系文件中的目标列, Neo4j 关系类型, TuGraph 边类型, 目标节点标签)
+RELATION_SPECS = [
+    ('symptom_id', 'HAS_SYMPTOM', 'has_symptom', 'Symptom'),
+    ('drug_id', 'TREATED_BY_DRUG', 'common_drug', 'Drug'),
+    ('check_id', 'DIAGNOSED_BY', 'need_check', 'Check'),
+]
+
+OUTPUT_FORMATS = ('csv', 'neo4j-admin', 'tugraph', 'all')
+
+def _clean_text(value):
+    """离线导入工具按行解析，去掉字段中的换行"""
+    return ' '.join(str(value).split()) if value is not None else ''
+
+def _unique_diseases(diseases):
+    seen = {}
+    for d in diseases:
+        seen.setdefault(d['name'], d)
+    return list(seen.values())
+
+def _unique_pairs(rels, target_col):
+    return sorted({(r['disease_id'], r[target_col]) for r in rels})
+
+def _write_rows(path, header, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(header)
+        writer.writerows(rows)
+
+def write_neo4j_admin_files(output_dir, diseases, node_sets, rel_lists, derived=None):
+    """
+    生成 neo4j-admin database import 所需的带表头 CSV
+
+    参数:
+        diseases: 疾病属性字典列表
+        node_sets: {'Symptom': set, 'Drug': set, 'Check': set}
+        rel_lists: 与 RELATION_SPECS 顺序一致的关系列表
+        derived: similarity.build_tables 的派生边表 (SIMILAR_TO / CO_PRESCRIBED)，为 None 时不生成
+    """
+    from similarity import DERIVED_RELATIONS, admin_header
+
+    os.makedirs(output_dir, exist_ok=True)
+    _write_rows(
+        os.path.join(output_dir, "diseases.csv"),
+        ['name:ID(Disease)'] + DISEASE_PROPS + [':LABEL'],
+        ([_clean_text(d['name'])] + [_clean_text(d.get(k, '')) for k in DISEASE_PROPS] + ['Disease']
+         for d in _unique_diseases(diseases))
+    )
+    for label, names in node_sets.items():
+        _write_rows(
+            os.path.join(output_dir, f"{label.lower()}s.csv"),
+            [f'name:ID({label})', ':LABEL'],
+            ([_clean_text(n), label] for n in sorted(names))
+        )
+    for (target_col, rel_type, edge_label, target_label), rels in zip(RELATION_SPECS, rel_lists):
+        _write_rows(
+            os.path.join(output_dir, f"{edge_label}.csv"),
+            [':START_ID(Disease)', f':END_ID({target_label})', ':TYPE'],
+            ([_clean_text(s), _clean_text(t), rel_type] for s, t in _unique_pairs(rels, target_col))
+        )
+    edge_files = [edge_label for _, _, edge_label, _ in RELATION_SPECS]
+    for filename, columns, rel_type, edge_label, start_label, end_label in DERIVED_RELATIONS:
+        if derived is None or filename not in derived:
+            continue
+        df = derived[filename]
+        _write_rows(
+            os.path.join(output_dir, f"{edge_label}.csv"),
+            admin_header(columns, start_label, end_label),
+            ([_clean_text(s), _clean_text(t)] + props + [rel_type]
+             for s, t, *props in df[columns].itertuples(index=False))
+        )
+        edge_files.append(edge_label)
+
+    nodes = " ".join(["--nodes=diseases.csv"] + [f"--nodes={label.lower()}s.csv" for label in node_sets])
+    relationships = " ".join(f"--relationships={edge_label}.csv" for edge_label in edge_files)
+    print(f"neo4j-admin 导入文件已生成: {output_dir}")
+    print(f"  cd {output_dir} && neo4j-admin database import full {nodes} {relationships} neo4j")
+
+def write_tugraph_import_files(output_dir, diseases, node_sets, rel_lists, graph_name='medical', derived=None):
+    """生成 TuGraph lgraph_import 的 JSON 配置以及对应的点/边文件，derived 同 write_neo4j_admin_files"""
+    from similarity import DERIVED_RELATIONS, PROP_TYPES
+    os.makedirs(output_dir, exist_ok=True)
+    schema, files = [], []
+
+    disease_columns = ['name'] + DISEASE_PROPS
+    _write_rows(
+        os.path.join(output_dir, "disease.csv"),
+        disease_columns,
+        ([_clean_text(d.get(k, '')) for k in disease_columns] for d in _unique_diseases(diseases))
+    )
+    schema.append({
+        'label': 'Disease',
+        'type': 'VERTEX',
+        'primary': 'name',
+        'properties': [{'name': 'name', 'type': 'STRING'}] +
+                      [{'name': k, 'type': 'STRING', 'optional': True} for k in DISEASE_PROPS]
+    })
+    files.append({'path': 'disease.csv', 'format': 'CSV', 'header': 1, 'label': 'Disease', 'columns': disease_columns})
+
+    for label, names in node_sets.items():
+        path = f"{label.lower()}.csv"
+        _write_rows(os.path.join(output_dir, path), ['name'], ([_clean_text(n)] for n in sorted(names)))
+        schema.append({
+            'label': label,
+            'type': 'VERTEX',
+            'primary': 'name',
+            'properties': [{'name': 'name', 'type': 'STRING'}]
+        })
+        files.append({'path': path, 'format': 'CSV', 'header': 1, 'label': label, 'columns': ['name']})
+
+    for (target_col, _, edge_label, target_label), rels in zip(RELATION_SPECS, rel_lists):
+        path = f"{edge_label}.csv"
+        _write_rows(
+            os.path.join(output_dir, path),
+            ['SRC_ID', 'DST_ID'],
+            ([_clean_text(s), _clean_text(t)] for s, t in _unique_pairs(rels, target_col))
+        )
+        schema.append({'label': edge_label, 'type': 'EDGE', 'constraints': [['Disease', target_label]]})
+        files.append({
+            'path': path, 'format': 'CSV', 'header': 1, 'label': edge_label,
+            'SRC_ID': 'Disease', 'DST_ID': target_label, 'columns': ['SRC_ID', 'DST_ID']
+        })
+
+    for filename, columns, _, edge_label, start_label, end_label in DERIVED_RELATIONS:
+        if derived is None or filename not in derived:
+            continue
+        path, props = f"{edge_label}.csv", columns[2:]
+        _write_rows(
+            os.path.join(output_dir, path),
+            ['SRC_ID', 'DST_ID'] + props,
+            ([_clean_text(s), _clean_text(t)] + vals for s, t, *vals in derived[filename][columns].itertuples(index=False))
+        )
+        schema.append({
+            'label': edge_label, 'type': 'EDGE', 'constraints': [[start_label, end_label]],
+            'properties': [{'name': c, 'type': PROP_TYPES[c][1]} for c in props]
+        })
+        files.append({
+            'path': path, 'format': 'CSV', 'header': 1, 'label': edge_label,
+            'SRC_ID': start_label, 'DST_ID': end_label, 'columns': ['SRC_ID', 'DST_ID'] + props
+        })
+
+    with open(os.path.join(output_dir, "import.json"), 'w', encoding='utf-8') as f:
+        json.dump({'schema': schema, 'files': files}, f, ensure_ascii=False, indent=2)
+
+    print(f"TuGraph 导入文件已生成: {output_dir}")
+    print(f"  cd {output_dir} && lgraph_import -c import.json --dir /var/lib/lgraph/data --graph {graph_name} --overwrite 1")
+
+def _open_input(input_file):
+    """支持 .gz 压缩的 medical.json"""
+    if input_file.endswith('.gz'):
+        return gzip.open(input_file, 'rt', encoding='utf-8')
+    return open(input_file, 'r', encoding='utf-8')
+
+# 记录中的关联名单字段，与 RELATION_SPECS 顺序一致
+TARGET_FIELDS = ('symptom', 'common_drug', 'check')
+
+def _extract_record(data):
+    """
+    把一行 JSON 转成 (疾病属性, 症状列表, 药品列表, 检查列表)，没有名称时返回 None
+    名称不是字符串、名单不是非空字符串列表时抛 ValueError，调用方把该行写入 reject 文件后继续
+    """
+    if not isinstance(data, dict):
+        raise ValueError("记录不是 JSON 对象")
+    disease_name = data.get('name')
+    if not disease_name:
+        return None
+    if not isinstance(disease_name, str):
+        raise ValueError("name 不是字符串")
+    targets = []
+    for field in TARGET_FIELDS:
+        names = data.get(field)
+        if names is None:
+            names = []
+        if not isinstance(names, list) or not all(isinstance(n, str) and n.strip() for n in names):
+            raise ValueError(f"{field} 不是非空字符串列表")
+        targets.append(names)
+    disease = {'disease_id': disease_name, 'name': disease_name}
+    disease.update({k: data.get(k, '') for k in DISEASE_PROPS})
+    return (disease, *targets)
+
+def _manifest_entry(disease, targets):
+    """
+    单个疾病的清单条目：属性与关联名单的内容哈希，供增量导入比较差异
+
+    参数:
+        targets: 与 RELATION_SPECS 顺序一致的 [症状列表, 药品列表, 检查列表]
+    """
+    entry = {'name': disease['name']}
+    for (target_col, *_), names in zip(RELATION_SPECS, targets):
+        entry[target_col] = sorted(set(names))
+    content = [str(disease.get(k, '')) for k in DISEASE_PROPS] + [entry[col] for col, *_ in RELATION_SPECS]
+    entry['hash'] = hashlib.sha1(json.dumps(content, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return entry
+
+def write_graph_snapshot(output_dir):
+    """
+    根据刚写出的 CSV 生成二进制图快照 graph.snap，问答进程可直接 mmap 加载 (见 graph_snapshot.py)
+    快照只是加速用的派生文件，生成失败不影响预处理结果
+    """
+    from graph_snapshot import GraphSnapshot, SNAPSHOT_FILE
+
+    path = os.path.join(output_dir, SNAPSHOT_FILE)
+    try:
+        snapshot = GraphSnapshot.from_csv(output_dir)
+        snapshot.save(path)
+        print(f"图快照: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+        return snapshot
+    except Exception as e:
+        print(f"⚠️ 图快照生成失败: {e}")
+        return None
+
+def _snapshot_from_parsed(diseases, node_sets, rel_lists):
+    """不输出 CSV 时 (只生成离线导入文件) 直接用解析结果构建内存中的图快照"""
+    from graph_snapshot import GraphSnapshot
+
+    disease_rows = pd.DataFrame(_unique_diseases(diseases), columns=['name'] + DISEASE_PROPS).astype(str)
+    nodes = {label: pd.Series(list(names), dtype=str) for label, names in node_sets.items()}
+    rels = {edge_label: pd.DataFrame(rels, columns=['disease_id', target_col]).astype(str)
+            for (target_col, _, edge_label, _), rels in zip(RELATION_SPECS, rel_lists)}
+    return GraphSnapshot.from_frames(disease_rows, nodes, rels)
+
+def derive_similarity_tables(snapshot, output_dir=None):
+    """
+    计算相似疾病 / 药品共用的派生边表 (见 similarity.py)，传入 output_dir 时同时写出 rel_similar_to.csv 等文件。
+    同样只是派生数据，失败时返回 None
+    """
+    from similarity import build_tables, write_tables
+
+    if snapshot is None:
+        return None
+    try:
+        tables = build_tables(snapshot)
+        if output_dir:
+            write_tables(output_dir, tables)
+        print("派生边: " + "，".join(f"{name} {len(df)} 条" for name, df in tables.items()))
+        return tables
+    except Exception as e:
+        print(f"⚠️ 派生边生成失败: {e}")
+        return None
+
+def write_manifest(path, diseases, rel_lists):
+    """写出 manifest.jsonl，每行一个疾病"""
+    grouped = {}
+    for (target_col, *_), rels in zip(RELATION_SPECS, rel_lists):
+        for r in rels:
+            grouped.setdefault((r['disease_id'], target_col), []).append(r[target_col])
+    with open(path, 'w', encoding='utf-8') as f:
+        for d in _unique_diseases(diseases):
+            targets = [grouped.get((d['name'], col), []) for col, *_ in RELATION_SPECS]
+            f.write(json.dumps(_manifest_entry(d, targets), ensure_ascii=False) + "\n")
+
+def _compact_key(name):
+    """去重只保留 8 字节摘要，集合大小与名称长度无关"""
+    return hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest()
+
+def preprocess_medical_data_streaming(input_file, output_dir, reject_file=None, snapshot=False):
+    """
+    流式预处理：边解析边写 CSV，内存占用不随语料增长。
+    解析失败的行写入 reject 文件 (JSONL) 后继续处理，不会中断整个任务。
+    同名疾病只保留第一条记录，与批处理模式相同。
+
+    参数:
+        snapshot: 结束后再生成图快照与派生边。这一步要把 CSV 全部读入内存，默认关闭，
+            也可以之后单独运行 graph_snapshot.py --build 与 similarity.py
+    """
+    print(f"开始流式预处理数据: {input_file}")
+    os.makedirs(output_dir, exist_ok=True)
+    reject_file = reject_file or os.path.join(output_dir, "rejects.jsonl")
+
+    node_files = {
+        'Symptom': "node_symptom.csv",
+        'Drug': "node_drug.csv",
+        'Check': "node_check.csv",
+    }
+    rel_files = ["rel_has_symptom.csv", "rel_common_drug.csv", "rel_need_check.csv"]
+    seen = {label: set() for label in node_files}
+    seen_diseases = set()
+    stats = {'diseases': 0, 'rejects': 0, 'duplicates': 0, 'Symptom': 0, 'Drug': 0, 'Check': 0}
+
+    handles = []
+    def open_csv(name, header):
+        f = open(os.path.join(output_dir, name), 'w', encoding='utf-8-sig', newline='')
+        handles.append(f)
+        writer = csv.writer(f)
+        writer.writerow(header)
+        return writer
 
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                data = json.loads(line)
-                disease_name = data.get('name')
-                if not disease_name:
+        disease_writer = open_csv("node_disease.csv", ['disease_id', 'name'] + DISEASE_PROPS)
+        node_writers = {label: open_csv(name, ['name']) for label, name in node_files.items()}
+        rel_writers = [
+            open_csv(name, ['disease_id', target_col])
+            for name, (target_col, *_) in zip(rel_files, RELATION_SPECS)
+        ]
+        reject_out = open(reject_file, 'w', encoding='utf-8')
+        handles.append(reject_out)
+        manifest_out = open(os.path.join(output_dir, "manifest.jsonl"), 'w', encoding='utf-8')
+        handles.append(manifest_out)
+
+        with _open_input(input_file) as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = _extract_record(json.loads(line))
+                except Exception as e:
+                    stats['rejects'] += 1
+                    reject_out.write(json.dumps(_reject_entry(line, e, line_no), ensure_ascii=False) + "\n")
+                    continue
+                if record is None:
+                    continue
+
+                disease, *targets = record
+                # 同名疾病只保留第一条记录，与批处理模式的 manifest 一致
+                disease_key = _compact_key(disease['name'])
+                if disease_key in seen_diseases:
+                    stats['duplicates'] += 1
                     continue
-                
-                # 提取疾病属性 (Node: Disease)
-                diseases.append({
-                    'disease_id': disease_name, # 使用名称作为ID保证唯一性
-                    'name': disease_name,
-                    'desc': data.get('desc', ''),
-                    'prevent': data.get('prevent', ''),
-                    'cause': data.get('cause', ''),
-                    'easy_get': data.get('easy_get', ''),
-                    'cure_lasttime': data.get('cure_lasttime', ''),
-                    'cured_prob': data.get('cured_prob', ''),
-                    'cost_money': data.get('cost_money', '')
-                })
-
-                # 提取症状并建立关系 (Node: Symptom, Rel: has_symptom)
-                for s in data.get('symptom', []):
-                    symptoms.add(s)
-                    rel_disease_symptom.append({'disease_id': disease_name, 'symptom_id': s})
-                
-                # 提取常用药品并建立关系 (Node: Drug, Rel: common_drug)
-                for d in data.get('common_drug', []):
-                    drugs.add(d)
-                    rel_disease_drug.append({'disease_id': disease_name, 'drug_id': d})
-                
-                # 提取检查项并建立关系 (Node: Check, Rel: need_check)
-                for c in data.get('check', []):
-                    checks.add(c)
-                    rel_disease_check.append({'disease_id': disease_name, 'check_id': c})
+                seen_diseases.add(disease_key)
+                disease_writer.writerow([disease['disease_id'], disease['name']] + [disease[k] for k in DISEASE_PROPS])
+                manifest_out.write(json.dumps(_manifest_entry(disease, targets), ensure_ascii=False) + "\n")
+                stats['diseases'] += 1
 
+                for label, rel_writer, names in zip(node_files, rel_writers, targets):
+                    for name in names:
+                        rel_writer.writerow([disease['name'], name])
+                        key = _compact_key(name)
+                        if key not in seen[label]:
+                            seen[label].add(key)
+                            node_writers[label].writerow([name])
+                            stats[label] += 1
+    except Exception as e:
+        print(f"文件读取失败: {e}")
+        return None
+    finally:
+        for h in handles:
+            h.close()
+
+    if snapshot:
+        derive_similarity_tables(write_graph_snapshot(output_dir), output_dir)
+    print(f"数据处理完成！输出目录: {output_dir}")
+    print(f"疾病数量: {stats['diseases']}")
+    print(f"症状数量: {stats['Symptom']}")
+    print(f"药品数量: {stats['Drug']}")
+    print(f"检查项数量: {stats['Check']}")
+    if stats['duplicates']:
+        print(f"⚠️ 重复疾病 {stats['duplicates']} 行，只保留了首次出现的记录")
+    if stats['rejects']:
+        print(f"⚠️ 解析失败 {stats['rejects']} 行，详见: {reject_file}")
+    if not snapshot:
+        print(f"未生成图快照与派生边，需要时运行: python graph_snapshot.py --build --data-dir {output_dir} "
+              f"&& python similarity.py --data-dir {output_dir}")
+    return stats
+
+def _reject_entry(line, error, line_no=None):
+    """reject 文件中的一行：出错原因与原始内容；多进程分片解析时行号未知，省略 line"""
+    entry = {'line': line_no} if line_no is not None else {}
+    entry.update({'error': str(error), 'raw': line.rstrip('\n')})
+    return entry
+
+def _parse_lines(lines):
+    """
+    解析若干行 JSON (可以是 (行号, 行) 二元组)，
+    返回 (diseases, (rel_disease_symptom, rel_disease_drug, rel_disease_check), counts, rejects)
+    同名疾病只保留第一条记录 (属性与关联名单都取第一条，与流式模式一致)；
+    counts 为每个疾病在三个关系列表中的条数，多进程合并时据此去掉跨分片的重复疾病；
+    无法解析的行跳过并记入 rejects，不中断整个任务
+    """
+    diseases = []
+    counts = []
+    rels = ([], [], [])
+    seen = set()
+    rejects = []
+
+    for line in lines:
+        line_no = None
+        if isinstance(line, tuple):
+            line_no, line = line
+        try:
+            record = _extract_record(json.loads(line))
+        except ValueError as e:
+            # json.JSONDecodeError 也是 ValueError
+            rejects.append(_reject_entry(line, e, line_no))
+            continue
+        if record is None:
+            continue
+        # 提取疾病属性 (Node: Disease)，使用名称作为ID保证唯一性
+        disease, *targets = record
+        if disease['name'] in seen:
+            continue
+        seen.add(disease['name'])
+        diseases.append(disease)
+        counts.append(tuple(len(names) for names in targets))
+
+        # 症状 / 常用药品 / 检查项的关系 (Rel: has_symptom / common_drug / need_check)
+        for (target_col, *_), rel_list, names in zip(RELATION_SPECS, rels, targets):
+            rel_list.extend({'disease_id': disease['name'], target_col: name} for name in names)
+
+    return diseases, rels, counts, rejects
+
+def _merge_parsed(parts):
+    """
+    按顺序合并各分片的解析结果，
+    返回 (diseases, symptoms, drugs, checks, rel_disease_symptom, rel_disease_drug, rel_disease_check, rejects)
+    跨分片的同名疾病只保留最早的一条；节点集合使用 dict 按关系中首次出现的顺序生成，
+    因此结果与单进程顺序解析完全一致，输出可复现
+    """
+    diseases, rels, seen, rejects = [], ([], [], []), set(), []
+    for part_diseases, part_rels, counts, part_rejects in parts:
+        rejects.extend(part_rejects)
+        offsets = [0] * len(rels)
+        for disease, count in zip(part_diseases, counts):
+            keep = disease['name'] not in seen
+            if keep:
+                seen.add(disease['name'])
+                diseases.append(disease)
+            for i, n in enumerate(count):
+                if keep:
+                    rels[i].extend(part_rels[i][offsets[i]:offsets[i] + n])
+                offsets[i] += n
+    node_sets = [dict.fromkeys(r[target_col] for r in rel_list)
+                 for (target_col, *_), rel_list in zip(RELATION_SPECS, rels)]
+    return (diseases, *node_sets, *rels, rejects)
+
+def _shard_ranges(input_file, workers):
+    """按字节把文件切成 workers 段，每段边界对齐到下一行行首"""
+    size = os.path.getsize(input_file)
+    bounds = [0]
+    with open(input_file, 'rb') as f:
+        for i in range(1, workers):
+            f.seek(max(size * i // workers, bounds[-1]))
+            f.readline()
+            bounds.append(f.tell())
+    bounds.append(size)
+    return [(st, ed) for st, ed in zip(bounds, bounds[1:]) if ed > st]
+
+def _iter_shard(input_file, start, end):
+    with open(input_file, 'rb') as f:
+        f.seek(start)
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                yield line.decode('utf-8')
+
+def _parse_shard(shard):
+    input_file, start, end = shard
+    return _parse_lines(_iter_shard(input_file, start, end))
+
+def _parse_parallel(input_file, workers):
+    """多进程解析各分片，再按分片顺序合并，结果与单进程顺序解析完全一致"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    shards = [(input_file, st, ed) for st, ed in _shard_ranges(input_file, workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return _merge_parsed(list(pool.map(_parse_shard, shards)))
+
+def preprocess_medical_data(input_file, output_dir, output_format='csv', workers=1, reject_file=None):
+    """
+    参数:
+        output_format: csv (供 import_to_neo4j.py 使用的 CSV)、neo4j-admin、tugraph 或 all
+        workers: 大于 1 时按字节分片多进程解析 (gzip 输入无法分片，仍为单进程)
+        reject_file: 解析失败行的输出文件 (JSONL，与流式模式格式相同)，默认 output_dir/rejects.jsonl
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output_format}")
+    print(f"开始预处理数据: {input_file}")
+
+    try:
+        if workers > 1 and not input_file.endswith('.gz'):
+            parsed = _parse_parallel(input_file, workers)
+        else:
+            with _open_input(input_file) as f:
+                parsed = _merge_parsed([_parse_lines((i, line) for i, line in enumerate(f, 1) if line.strip())])
     except Exception as e:
         print(f"文件读取失败: {e}")
         return
 
+    (diseases, symptoms, drugs, checks,
+     rel_disease_symptom, rel_disease_drug, rel_disease_check, rejects) = parsed
+
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
+    reject_file = reject_file or os.path.join(output_dir, "rejects.jsonl")
+    with open(reject_file, 'w', encoding='utf-8') as f:
+        for entry in rejects:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
 
-    # 保存节点文件
-    pd.DataFrame(diseases).to_csv(f"{output_dir}/node_disease.csv", index=False, encoding='utf-8-sig')
-    pd.DataFrame([{'name': s} for s in symptoms]).to_csv(f"{output_dir}/node_symptom.csv", index=False, encoding='utf-8-sig')
-    pd.DataFrame([{'name': d} for d in drugs]).to_csv(f"{output_dir}/node_drug.csv", index=False, encoding='utf-8-sig')
-    pd.DataFrame([{'name': c} for c in checks]).to_csv(f"{output_dir}/node_check.csv", index=False, encoding='utf-8-sig')
+    if output_format in ('csv', 'all'):
+        # 保存节点文件
+        pd.DataFrame(diseases).to_csv(f"{output_dir}/node_disease.csv", index=False, encoding='utf-8-sig')
+        pd.DataFrame([{'name': s} for s in symptoms]).to_csv(f"{output_dir}/node_symptom.csv", index=False, encoding='utf-8-sig')
+        pd.DataFrame([{'name': d} for d in drugs]).to_csv(f"{output_dir}/node_drug.csv", index=False, encoding='utf-8-sig')
+        pd.DataFrame([{'name': c} for c in checks]).to_csv(f"{output_dir}/node_check.csv", index=False, encoding='utf-8-sig')
 
-    # 保存关系文件
-    pd.DataFrame(rel_disease_symptom).to_csv(f"{output_dir}/rel_has_symptom.csv", index=False, encoding='utf-8-sig')
-    pd.DataFrame(rel_disease_drug).to_csv(f"{output_dir}/rel_common_drug.csv", index=False, encoding='utf-8-sig')
-    pd.DataFrame(rel_disease_check).to_csv(f"{output_dir}/rel_need_check.csv", index=False, encoding='utf-8-sig')
+        # 保存关系文件
+        pd.DataFrame(rel_disease_symptom).to_csv(f"{output_dir}/rel_has_symptom.csv", index=False, encoding='utf-8-sig')
+        pd.DataFrame(rel_disease_drug).to_csv(f"{output_dir}/rel_common_drug.csv", index=False, encoding='utf-8-sig')
+        pd.DataFrame(rel_disease_check).to_csv(f"{output_dir}/rel_need_check.csv", index=False, encoding='utf-8-sig')
+
+        # 保存内容哈希清单，供 incremental_import.py 做增量导入
+        write_manifest(f"{output_dir}/manifest.jsonl", diseases,
+                       [rel_disease_symptom, rel_disease_drug, rel_disease_check])
+    node_sets = {'Symptom': symptoms, 'Drug': drugs, 'Check': checks}
+    rel_lists = [rel_disease_symptom, rel_disease_drug, rel_disease_check]
+    if output_format in ('csv', 'all'):
+        snapshot = write_graph_snapshot(output_dir)
+        derived = derive_similarity_tables(snapshot, output_dir)
+    else:
+        try:
+            derived = derive_similarity_tables(_snapshot_from_parsed(diseases, node_sets, rel_lists))
+        except Exception as e:
+            print(f"⚠️ 派生边生成失败: {e}")
+            derived = None
+
+    if output_format in ('neo4j-admin', 'all'):
+        write_neo4j_admin_files(os.path.join(output_dir, "neo4j_admin"), diseases, node_sets, rel_lists,
+                                derived=derived)
+    if output_format in ('tugraph', 'all'):
+        write_tugraph_import_files(os.path.join(output_dir, "tugraph"), diseases, node_sets, rel_lists,
+                                   derived=derived)
 
     print(f"数据处理完成！输出目录: {output_dir}")
     print(f"疾病数量: {len(diseases)}")
     print(f"症状数量: {len(symptoms)}")
     print(f"药品数量: {len(drugs)}")
     print(f"检查项数量: {len(checks)}")
+    if rejects:
+        print(f"⚠️ 解析失败 {len(rejects)} 行，详见: {reject_file}")
 
 if __name__ == "__main__":
+    import argparse
+
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    input_json = os.path.join(current_dir, "data", "medical.json")
-    output_path = os.path.join(current_dir, "processed_data")
-    
+    parser = argparse.ArgumentParser(description="预处理 medical.json")
+    parser.add_argument('--input', default=os.path.join(current_dir, "data", "medical.json"))
+    parser.add_argument('--output', default=os.path.join(current_dir, "processed_data"))
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv',
+                        help="csv: Cypher 导入用; neo4j-admin / tugraph: 离线批量导入文件; all: 全部生成")
+    parser.add_argument('--stream', action='store_true', help="流式处理，内存占用恒定 (仅支持 csv 格式)")
+    parser.add_argument('--reject-file', default=None, help="解析失败行的输出文件，默认为输出目录下的 rejects.jsonl")
+    parser.add_argument('--workers', type=int, default=1, help="多进程分片解析的进程数")
+    parser.add_argument('--snapshot', action='store_true',
+                        help="流式模式下也生成图快照与派生边 (需要把 CSV 全部读入内存；批处理模式总是生成)")
+    args = parser.parse_args()
+
     # 执行预处理
-    preprocess_medical_data(input_json, output_path)
+    if args.stream:
+        if args.format != 'csv':
+            parser.error("--stream 仅支持 --format csv")
+        preprocess_medical_data_streaming(args.input, args.output, args.reject_file, args.snapshot)
+    else:
+        preprocess_medical_data(args.input, args.output, args.format, args.workers, args.reject_file)
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+问答链路的分层缓存
+
+三层缓存:
+    cypher: 归一化问题 -> 生成的 Cypher
+    result: Cypher -> QAPipeline.execute 格式化后的查询结果
+    answer: (归一化问题, 查询结果, 参考资料) -> 最终回答 (支持流式产出)
+
+每层都是带 TTL 的有界 LRU，可选用 SQLite 持久化，重启后缓存仍然有效。
+"""
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, Optional
+
+_MISS = object()
+_PUNCT_RE = re.compile(r"[\s\W_]+", flags=re.UNICODE)
+
+def normalize_question(question: str) -> str:
+    """全角转半角、转小写并去掉空白与标点，使 “感冒有什么症状？” 与 “感冒有什么症状” 命中同一条缓存"""
+    return _PUNCT_RE.sub("", unicodedata.normalize('NFKC', question).lower())
+
+class LRUCache:
+    """线程安全的内存 LRU，条目超过 ttl 秒后失效"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISS)
+            if item is _MISS:
+                return default
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class SQLiteCache:
+    """
+    SQLite 持久化缓存，接口与 LRUCache 一致，按最近访问时间淘汰
+
+    条目数超过 maxsize 时才淘汰，一次删掉最久未访问的 evict_batch 条 (走 (namespace, accessed_at) 索引)；
+    读命中只在内存中记下访问时间，攒够 touch_batch 条或写入/淘汰前再批量写回，读不产生提交
+    """
+
+    def __init__(self, path: str, namespace: str = 'default', maxsize: int = 100000, ttl: float = 86400,
+                 evict_batch: int = None, touch_batch: int = 256):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evict_batch = evict_batch or max(1, maxsize // 10)
+        self.touch_batch = touch_batch
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 下 NORMAL 只在检查点时 fsync，进程崩溃不丢数据，断电最多丢最近几次写入，对缓存足够
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (namespace, accessed_at)")
+        self._conn.commit()
+        # 条目数的上界 (覆盖已有键时也会加一)，超过 maxsize 时再查询准确值
+        self._count = self._count_rows()
+
+    @staticmethod
+    def _encode(key) -> str:
+        return json.dumps(key, ensure_ascii=False, sort_keys=True)
+
+    def _count_rows(self) -> int:
+        return self._conn.execute("SELECT count(*) FROM cache WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+
+    def _flush_touches(self):
+        """把内存中记下的访问时间写回 (调用方持有锁并负责提交)"""
+        if self._touched:
+            self._conn.executemany("UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                                   [(t, self.namespace, k) for k, t in self._touched.items()])
+            self._touched.clear()
+
+    def _evict(self, now: float):
+        """先删过期条目，仍超过 maxsize 时删掉最久未访问的条目，降到 maxsize - evict_batch"""
+        self._conn.execute("DELETE FROM cache WHERE namespace = ? AND expires_at < ?", (self.namespace, now))
+        count = self._count_rows()
+        if count > self.maxsize:
+            excess = count - max(self.maxsize - self.evict_batch, 0)
+            self._conn.execute("""
+                DELETE FROM cache WHERE rowid IN (
+                    SELECT rowid FROM cache WHERE namespace = ? ORDER BY accessed_at LIMIT ?
+                )
+            """, (self.namespace, excess))
+            count -= excess
+        self._count = count
+
+    def get(self, key, default=None):
+        now = time.time()
+        encoded = self._encode(key)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, encoded)
+            ).fetchone()
+            if row is None:
+                return default
+            if row[1] < now:
+                self._touched.pop(encoded, None)
+                self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, encoded))
+                self._conn.commit()
+                return default
+            self._touched[encoded] = now
+            if len(self._touched) >= self.touch_batch:
+                self._flush_touches()
+                self._conn.commit()
+            return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        encoded = self._encode(key)
+        with self._lock:
+            self._touched.pop(encoded, None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, encoded, json.dumps(value, ensure_ascii=False), now + self.ttl, now)
+            )
+            self._count += 1
+            if self._count > self.maxsize:
+                self._flush_touches()
+                self._evict(now)
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+            self._conn.commit()
+            self._count = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._count_rows()
+
+    def close(self):
+        """写回尚未保存的访问时间并关闭连接"""
+        with self._lock:
+            self._flush_touches()
+            self._conn.commit()
+            self._conn.close()
+
+class CacheLayer:
+    """一层缓存：内存 LRU 在前，可选 SQLite 在后；同时统计命中率和节省的耗时"""
+
+    def __init__(self, name: str, maxsize: int, ttl: float, sqlite_path: Optional[str] = None,
+                 disk_maxsize: Optional[int] = None):
+        """disk_maxsize 为 SQLite 层的条目上限，为 None 时与内存层相同"""
+        self.name = name
+        self.memory = LRUCache(maxsize, ttl)
+        self.disk = None
+        if sqlite_path:
+            self.disk = SQLiteCache(sqlite_path, namespace=name, maxsize=disk_maxsize or maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+
+    def get(self, key):
+        value = self.memory.get(key, _MISS)
+        if value is _MISS and self.disk is not None:
+            value = self.disk.get(key, _MISS)
+            if value is not _MISS:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    async def aget(self, key):
+        """get 的异步版本：内存 LRU 直接查，SQLite 的读 (及过期删除的提交) 放到线程中，不阻塞事件循环"""
+        value = self.memory.get(key, _MISS)
+        if value is _MISS and self.disk is not None:
+            value = await asyncio.to_thread(self.disk.get, key, _MISS)
+            if value is not _MISS:
+                self.memory.set(key, value)
+        return value
+
+    async def aset(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value)
+
+    def get_or_compute(self, key, compute: Callable[[], Any], cacheable: Callable[[Any], bool] = None):
+        value = self.get(key)
+        if value is not _MISS:
+            self.hits += 1
+            return value
+        self.misses += 1
+        start = time.perf_counter()
+        value = compute()
+        self.miss_seconds += time.perf_counter() - start
+        if cacheable is None or cacheable(value):
+            self.set(key, value)
+        return value
+
+    def stream_or_compute(self, key, compute: Callable[[], Iterable[str]],
+                          cacheable: Callable[[Any], bool] = None) -> Iterator[str]:
+        """流式版本：命中时一次性产出缓存值，未命中时边产出边拼接，结束后整体写入缓存"""
+        value = self.get(key)
+        if value is not _MISS:
+            self.hits += 1
+            yield value
+            return
+        self.misses += 1
+        start = time.perf_counter()
+        chunks = []
+        for chunk in compute():
+            chunks.append(chunk)
+            yield chunk
+        self.miss_seconds += time.perf_counter() - start
+        value = "".join(chunks)
+        if cacheable is None or cacheable(value):
+            self.set(key, value)
+
+    async def aget_or_compute(self, key, compute: Callable[[], Awaitable[Any]],
+                              cacheable: Callable[[Any], bool] = None):
+        """异步版本，compute 返回协程"""
+        value = await self.aget(key)
+        if value is not _MISS:
+            self.hits += 1
+            return value
+        self.misses += 1
+        start = time.perf_counter()
+        value = await compute()
+        self.miss_seconds += time.perf_counter() - start
+        if cacheable is None or cacheable(value):
+            await self.aset(key, value)
+        return value
+
+    async def astream_or_compute(self, key, compute: Callable[[], AsyncIterable[str]],
+                                 cacheable: Callable[[Any], bool] = None) -> AsyncIterator[str]:
+        """stream_or_compute 的异步版本"""
+        value = await self.aget(key)
+        if value is not _MISS:
+            self.hits += 1
+            yield value
+            return
+        self.misses += 1
+        start = time.perf_counter()
+        chunks = []
+        async for chunk in compute():
+            chunks.append(chunk)
+            yield chunk
+        self.miss_seconds += time.perf_counter() - start
+        value = "".join(chunks)
+        if cacheable is None or cacheable(value):
+            await self.aset(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'avg_miss_seconds': avg_miss,
+            # 以未命中时的平均耗时估算命中节省的时间
+            'saved_seconds': self.hits * avg_miss,
+        }
+
+class QACache:
+    """问答三层缓存"""
+
+    LAYERS = ('cypher', 'result', 'answer')
+    # 命中后可省掉一次 LLM 调用的层
+    LLM_LAYERS = ('cypher', 'answer')
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600, sqlite_path: Optional[str] = None,
+                 disk_maxsize: Optional[int] = None):
+        self.layers = {name: CacheLayer(name, maxsize, ttl, sqlite_path, disk_maxsize) for name in self.LAYERS}
+
+    def get_or_compute(self, layer: str, key, compute: Callable[[], Any], cacheable: Callable[[Any], bool] = None):
+        return self.layers[layer].get_or_compute(key, compute, cacheable)
+
+    def stream_or_compute(self, layer: str, key, compute: Callable[[], Iterable[str]],
+                          cacheable: Callable[[Any], bool] = None) -> Iterator[str]:
+        return self.layers[layer].stream_or_compute(key, compute, cacheable)
+
+    async def aget_or_compute(self, layer: str, key, compute: Callable[[], Awaitable[Any]],
+                              cacheable: Callable[[Any], bool] = None):
+        return await self.layers[layer].aget_or_compute(key, compute, cacheable)
+
+    def astream_or_compute(self, layer: str, key, compute: Callable[[], AsyncIterable[str]],
+                           cacheable: Callable[[Any], bool] = None) -> AsyncIterator[str]:
+        return self.layers[layer].astream_or_compute(key, compute, cacheable)
+
+    def clear(self):
+        for layer in self.layers.values():
+            layer.memory.clear()
+            if layer.disk is not None:
+                layer.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {name: layer.stats() for name, layer in self.layers.items()}
+        stats['saved_llm_calls'] = sum(stats[name]['hits'] for name in self.LLM_LAYERS)
+        stats['saved_seconds'] = sum(stats[name]['saved_seconds'] for name in self.LAYERS)
+        return stats
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        lines = [
+            f"  {name:7s} 命中 {stats[name]['hits']:>5d} / 未命中 {stats[name]['misses']:>5d} "
+            f"(命中率 {stats[name]['hit_rate']:.1%}，节省约 {stats[name]['saved_seconds']:.1f}s)"
+            for name in self.LAYERS
+        ]
+        lines.append(f"  共节省 LLM 调用 {stats['saved_llm_calls']} 次，约 {stats['saved_seconds']:.1f}s")
+        return "\n".join(lines)
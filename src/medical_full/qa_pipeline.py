@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+问答流水线，neo4j_qa_cli / tugraph_qa_cli 与 qa_service 共用
+
+    问题 -> 实体识别 -> 本地鉴别诊断 | 模板路由 | LLM 生成 Cypher
+         -> Cypher 检查 -> CONTAINS 改写 -> 带超时执行 -> 拼成自然语言
+         -> 与向量检索的参考资料一起交给 answer_chain 生成回答
+
+CLI 调用同步的 prepare / answer，qa_service 调用异步的 aprepare / aanswer；
+两者共用路由、查询与结果格式化，只在 LLM/数据库调用和缓存读写上分别走同步或异步接口。
+"""
+import json
+import asyncio
+import inspect
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, Optional, Tuple
+
+from qa_cache import normalize_question
+from entity_linker import format_entity_hint
+from cypher_guard import CypherGuard, CypherRejected
+
+NO_RESULT = "知识库中目前没有找到相关具体条目。"
+# 以这些前缀开头的查询结果是临时错误，不写入缓存
+ERROR_PREFIXES = ("图数据库查询失败", "查询过程中出现问题")
+
+# 向量检索与 Cypher 生成/图查询并行执行
+_executor = ThreadPoolExecutor(max_workers=4)
+
+def format_rows(data) -> str:
+    """把查询结果 list[dict] 拼成自然语言描述，兼容直接返回节点对象与列表行的情况"""
+    lines = []
+    for item in data:
+        if isinstance(item, dict):
+            lines.append("；".join(f"{k}：{v.get('name') if hasattr(v, 'get') and 'name' in v else v}"
+                                  for k, v in item.items()))
+        elif isinstance(item, list):
+            lines.append("；".join(str(x) for x in item))
+        else:
+            lines.append(str(item))
+    return "。".join(lines) + "。"
+
+def describe_result(result) -> str:
+    """execute_cypher 的返回字典或 data() 的行列表 -> 自然语言描述"""
+    if isinstance(result, dict):
+        if not result['success']:
+            return f"图数据库查询失败: {result.get('error')}"
+        result = result.get('data', [])
+    if not result:
+        return NO_RESULT
+    return format_rows(result)
+
+def is_cacheable_result(result: str) -> bool:
+    """数据库异常属于临时错误，不写入缓存"""
+    return not result.startswith(ERROR_PREFIXES)
+
+def clean_cypher(text: str) -> str:
+    """移除 LLM 输出中可能的 markdown 标记和分号"""
+    return text.strip().strip("`").strip(";")
+
+def result_key(cypher: str, params: dict):
+    return cypher, json.dumps(params, ensure_ascii=False, sort_keys=True)
+
+class QAPipeline:
+    def __init__(self, cypher_chain, answer_chain, connector, router, guard: CypherGuard = None, cache=None,
+                 name_index=None, vector_index=None, vector_top_k: int = 3, diagnoser=None,
+                 diagnosis_top_k: int = 5, diagnosis_min_symptoms: int = 2,
+                 llm_semaphore: asyncio.Semaphore = None, db_semaphore: asyncio.Semaphore = None):
+        """
+        参数:
+            connector: 有 execute_cypher (TuGraph 连接器、图快照，可为协程) 或 data (Neo4jConnector) 的连接器
+            router: IntentRouter，命中模板时跳过 cypher_chain
+            guard: CypherGuard，执行前检查/改写 Cypher 并提供单条查询超时；为 None 时使用默认配置
+            cache: QACache，为 None 时不缓存
+            name_index: NgramIndex / FulltextIndex，把 CONTAINS 改写为候选名称列表；为 None 时不改写
+            diagnoser: DifferentialDiagnoser，多症状问“可能是什么病”时直接排序，不生成 Cypher；为 None 时关闭
+            llm_semaphore, db_semaphore: 仅异步接口使用的并发上限，为 None 时不限制
+        """
+        self.cypher_chain = cypher_chain
+        self.answer_chain = answer_chain
+        self.connector = connector
+        self.router = router
+        self.guard = guard if guard is not None else CypherGuard()
+        self.cache = cache
+        self.name_index = name_index
+        self.vector_index = vector_index
+        self.vector_top_k = vector_top_k
+        self.diagnoser = diagnoser
+        self.diagnosis_top_k = diagnosis_top_k
+        self.diagnosis_min_symptoms = diagnosis_min_symptoms
+        self.llm_semaphore = llm_semaphore or contextlib.nullcontext()
+        self.db_semaphore = db_semaphore or contextlib.nullcontext()
+
+    # ---- 各步骤 (同步，不访问 LLM) ----
+
+    def diagnose(self, question: str, entities) -> Optional[str]:
+        """多个症状问“可能是什么病”时在本地按症状重合度给疾病排序，不生成 Cypher"""
+        if self.diagnoser is None:
+            return None
+        return self.diagnoser.answer(question, entities, self.diagnosis_min_symptoms, self.diagnosis_top_k)
+
+    def retrieve_passages(self, question: str, entities) -> str:
+        """识别出疾病时只在这些疾病的段落中检索，否则全库检索"""
+        from vector_index import format_passages
+        if self.vector_index is None or self.vector_top_k <= 0:
+            return format_passages([])
+        diseases = [e.name for e in entities if 'Disease' in e.labels]
+        return format_passages(self.vector_index.search(question, self.vector_top_k, diseases=diseases))
+
+    def check(self, cypher: str, params: dict = None) -> str:
+        """
+        只允许有界的读语句：拦截写操作/笛卡尔积/全图扫描，补充 LIMIT，截断变长路径；
+        再把 CONTAINS 换成候选名称列表。不通过时抛出 CypherRejected
+        """
+        cypher = self.guard.check(cypher, params)
+        if self.name_index is not None:
+            cypher = self.name_index.rewrite_contains(cypher)
+        return cypher
+
+    def execute(self, cypher: str, params: dict = None) -> str:
+        """检查并执行 Cypher，返回自然语言描述；错误也以文字返回"""
+        try:
+            try:
+                cypher = self.check(cypher, params)
+            except CypherRejected as e:
+                return f"验证失败：{e.reason}，已拦截。"
+            if hasattr(self.connector, 'execute_cypher'):
+                result = self.connector.execute_cypher(cypher, params or None, self.guard.timeout)
+            else:
+                result = self.connector.data(cypher, _timeout=self.guard.timeout, **(params or {}))
+            return describe_result(result)
+        except Exception as e:
+            return f"查询过程中出现问题：{str(e)}"
+
+    # ---- 同步接口 (CLI) ----
+
+    def _cached(self, layer: str, key, compute, cacheable=None):
+        if self.cache is None:
+            return compute()
+        return self.cache.get_or_compute(layer, key, compute, cacheable)
+
+    def generate_cypher(self, question: str, entities) -> str:
+        return clean_cypher(self.cypher_chain.invoke({
+            "question": question,
+            "entity_hint": format_entity_hint(entities)
+        }))
+
+    def prepare(self, question: str) -> Tuple[str, Optional[str], str, str]:
+        """问题 -> (缓存键, Cypher, 查询结果, 参考资料)；本地诊断命中时 Cypher 为 None"""
+        key = normalize_question(question)
+        entities = self.router.linker.extract(question)
+        passages = _executor.submit(self.retrieve_passages, question, entities)
+        try:
+            result = self.diagnose(question, entities)
+            if result is not None:
+                return key, None, result, passages.result()
+            # 优先走模板，未命中再调用 LLM
+            cypher, params = self.router.route(question, entities) or (None, {})
+            if cypher is None:
+                cypher = self._cached('cypher', key, lambda: self.generate_cypher(question, entities))
+            result = self._cached('result', result_key(cypher, params),
+                                  lambda: self.execute(cypher, params), is_cacheable_result)
+            return key, cypher, result, passages.result()
+        finally:
+            passages.cancel()
+
+    def answer(self, question: str, key: str, result: str, passages: str) -> Iterator[str]:
+        compute = lambda: self.answer_chain.stream({"question": question, "result": result, "passages": passages})
+        if self.cache is None:
+            return compute()
+        return self.cache.stream_or_compute('answer', (key, result, passages), compute)
+
+    # ---- 异步接口 (qa_service)，LLM/数据库调用受信号量限制 ----
+
+    async def _acached(self, layer: str, key, compute, cacheable=None):
+        if self.cache is None:
+            return await compute()
+        return await self.cache.aget_or_compute(layer, key, compute, cacheable)
+
+    async def agenerate_cypher(self, question: str, entities) -> str:
+        async with self.llm_semaphore:
+            text = await self.cypher_chain.ainvoke({
+                "question": question,
+                "entity_hint": format_entity_hint(entities)
+            })
+        return clean_cypher(text)
+
+    async def aexecute(self, cypher: str, params: dict = None) -> str:
+        """execute 的异步版本；检查可能包含 EXPLAIN 或全文索引往返，与同步连接器一样放到线程中"""
+        execute_cypher = getattr(self.connector, 'execute_cypher', None)
+        async with self.db_semaphore:
+            if not inspect.iscoroutinefunction(execute_cypher):
+                return await asyncio.to_thread(self.execute, cypher, params)
+            try:
+                try:
+                    cypher = await asyncio.to_thread(self.check, cypher, params)
+                except CypherRejected as e:
+                    return f"验证失败：{e.reason}，已拦截。"
+                return describe_result(await execute_cypher(cypher, params or None, self.guard.timeout))
+            except Exception as e:
+                return f"查询过程中出现问题：{str(e)}"
+
+    async def aprepare(self, question: str) -> Tuple[str, Optional[str], str, str]:
+        """prepare 的异步版本，向量检索在线程池中与 Cypher 生成并行"""
+        key = normalize_question(question)
+        entities = self.router.linker.extract(question)
+        passages = asyncio.create_task(asyncio.to_thread(self.retrieve_passages, question, entities))
+        try:
+            result = self.diagnose(question, entities)
+            if result is not None:
+                return key, None, result, await passages
+            cypher, params = self.router.route(question, entities) or (None, {})
+            if cypher is None:
+                cypher = await self._acached('cypher', key, lambda: self.agenerate_cypher(question, entities))
+            result = await self._acached('result', result_key(cypher, params),
+                                         lambda: self.aexecute(cypher, params), is_cacheable_result)
+            return key, cypher, result, await passages
+        finally:
+            passages.cancel()
+
+    async def _answer_chunks(self, question: str, result: str, passages: str) -> AsyncIterator[str]:
+        async with self.llm_semaphore:
+            async for chunk in self.answer_chain.astream(
+                    {"question": question, "result": result, "passages": passages}):
+                yield chunk
+
+    def aanswer(self, question: str, key: str, result: str, passages: str) -> AsyncIterator[str]:
+        if self.cache is None:
+            return self._answer_chunks(question, result, passages)
+        return self.cache.astream_or_compute(
+            'answer', (key, result, passages), lambda: self._answer_chunks(question, result, passages))
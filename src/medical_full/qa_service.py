@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+异步 HTTP 问答服务
+
+与 QA CLI 共用 qa_pipeline.QAPipeline 以及 cypher_chain / answer_chain / 连接器 / 意图路由 / 缓存，对外提供:
+    POST /ask      {"question": "..."}，返回 JSON；带 ?stream=1 或 Accept: text/event-stream 时以 SSE 逐段推送
+    POST /diagnose {"symptoms": ["发热", "咳嗽"], "k": 5}，按症状重合度返回最可能的疾病 (需要图快照数据)
+    GET  /health   并发、缓存与 Cypher 检查统计
+
+LLM 与数据库调用各有独立的并发上限；排队请求数超过 max_pending 时直接返回 429，
+单个请求超过 request_timeout 秒返回 504 (SSE 模式下推送 error 事件)。
+
+用法:
+    python qa_service.py --backend tugraph --port 8000
+    python qa_service.py --mock          # TuGraphConnectorMock + 假 LLM，本地联调与压测用
+"""
+import re
+import json
+import time
+import asyncio
+from functools import partial
+from typing import AsyncIterator, Callable, Union
+
+from aiohttp import web
+
+from qa_pipeline import QAPipeline
+
+# 中文直接输出，不转义成 \u 序列
+_json_response = partial(web.json_response, dumps=partial(json.dumps, ensure_ascii=False))
+
+class StubChain:
+    """
+    假 LLM 链，提供与 LangChain Runnable 相同的 invoke/stream/ainvoke/astream，
+    按固定延迟返回 reply(inputs) 的结果，用于不连接 Kimi 的本地测试
+    """
+
+    def __init__(self, reply: Union[str, Callable[[dict], str]], delay: float = 0.2,
+                 chunk_size: int = 4, chunk_delay: float = 0.01):
+        self.reply = reply
+        self.delay = delay
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+
+    def _text(self, inputs: dict) -> str:
+        return self.reply(inputs) if callable(self.reply) else self.reply
+
+    def _chunks(self, text: str):
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+    def invoke(self, inputs: dict) -> str:
+        time.sleep(self.delay)
+        return self._text(inputs)
+
+    def stream(self, inputs: dict):
+        time.sleep(self.delay)
+        for chunk in self._chunks(self._text(inputs)):
+            time.sleep(self.chunk_delay)
+            yield chunk
+
+    async def ainvoke(self, inputs: dict) -> str:
+        await asyncio.sleep(self.delay)
+        return self._text(inputs)
+
+    async def astream(self, inputs: dict):
+        await asyncio.sleep(self.delay)
+        for chunk in self._chunks(self._text(inputs)):
+            await asyncio.sleep(self.chunk_delay)
+            yield chunk
+
+class QAService:
+    """HTTP 层：请求排队上限、超时与 SSE 推送；问答流水线见 qa_pipeline.QAPipeline"""
+
+    def __init__(self, cypher_chain, answer_chain, connector, router, cache=None, vector_index=None,
+                 name_index=None, vector_top_k: int = 3, llm_concurrency: int = 8,
+                 db_concurrency: int = 16, max_pending: int = 64, request_timeout: float = 60,
+                 diagnoser=None, diagnosis_top_k: int = 5, diagnosis_min_symptoms: int = 2, guard=None):
+        """
+        参数:
+            connector: TuGraphConnector / AsyncTuGraphConnector / TuGraphConnectorMock / Neo4jConnector
+            llm_concurrency, db_concurrency: LLM 与数据库调用各自的并发上限
+            max_pending: 同时在处理(含排队)的请求上限，超过即返回 429
+            其余参数见 QAPipeline
+        """
+        self.pipeline = QAPipeline(
+            cypher_chain, answer_chain, connector, router, guard=guard, cache=cache,
+            name_index=name_index, vector_index=vector_index, vector_top_k=vector_top_k, diagnoser=diagnoser,
+            diagnosis_top_k=diagnosis_top_k, diagnosis_min_symptoms=diagnosis_min_symptoms,
+            llm_semaphore=asyncio.Semaphore(llm_concurrency), db_semaphore=asyncio.Semaphore(db_concurrency))
+        self.max_pending = max_pending
+        self.request_timeout = request_timeout
+
+        self.pending = 0
+        self.served = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    async def answer_stream(self, question: str, deadline: float) -> AsyncIterator[Union[dict, str]]:
+        """先产出 {'cypher': ...} 元信息，再逐段产出回答；超过 deadline 抛 asyncio.TimeoutError"""
+        loop = asyncio.get_running_loop()
+        key, cypher, result, passages = await asyncio.wait_for(self.pipeline.aprepare(question), deadline - loop.time())
+        yield {'cypher': cypher}
+
+        chunks = self.pipeline.aanswer(question, key, result, passages)
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    async def handle_ask(self, request: web.Request) -> web.StreamResponse:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return _json_response({'error': "服务繁忙，请稍后重试"}, status=429, headers={'Retry-After': '1'})
+        # 检查与计数之间不能有 await，否则并发请求会同时通过检查
+        self.pending += 1
+        try:
+            try:
+                body = await request.json()
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                return _json_response({'error': "请求体必须是 JSON"}, status=400)
+            question = str(body.get('question', '')).strip() if isinstance(body, dict) else ''
+            if not question:
+                return _json_response({'error': "缺少 question"}, status=400)
+
+            stream = request.query.get('stream') in ('1', 'true') or 'text/event-stream' in request.headers.get('Accept', '')
+            if stream:
+                return await self._respond_sse(request, question)
+            return await self._respond_json(question)
+        finally:
+            self.pending -= 1
+
+    async def _respond_json(self, question: str) -> web.Response:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        cypher, ttft, chunks = None, None, []
+        try:
+            async for item in self.answer_stream(question, start + self.request_timeout):
+                if isinstance(item, dict):
+                    cypher = item['cypher']
+                    continue
+                if ttft is None:
+                    ttft = loop.time() - start
+                chunks.append(item)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return _json_response({'error': "请求超时"}, status=504)
+        except Exception as e:
+            return _json_response({'error': f"处理问题时出错：{e}"}, status=500)
+        self.served += 1
+        return _json_response({
+            'answer': "".join(chunks),
+            'cypher': cypher,
+            'ttft': ttft,
+            'elapsed': loop.time() - start,
+        })
+
+    async def _respond_sse(self, request: web.Request, question: str) -> web.StreamResponse:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream; charset=utf-8',
+            'Cache-Control': 'no-cache',
+        })
+        await response.prepare(request)
+
+        async def send(event: str, data: dict):
+            await response.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+        ttft = None
+        try:
+            async for item in self.answer_stream(question, start + self.request_timeout):
+                if isinstance(item, dict):
+                    await send('meta', item)
+                    continue
+                if ttft is None:
+                    ttft = loop.time() - start
+                await send('delta', {'text': item})
+            self.served += 1
+            await send('done', {'ttft': ttft, 'elapsed': loop.time() - start})
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            await send('error', {'error': "请求超时"})
+        except ConnectionResetError:
+            # 客户端已断开，无需再回写
+            pass
+        except Exception as e:
+            await send('error', {'error': f"处理问题时出错：{e}"})
+        await response.write_eof()
+        return response
+
+    async def handle_diagnose(self, request: web.Request) -> web.Response:
+        diagnoser = self.pipeline.diagnoser
+        if diagnoser is None:
+            return _json_response({'error': "未加载症状关系数据"}, status=503)
+        try:
+            body = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return _json_response({'error': "请求体必须是 JSON"}, status=400)
+        symptoms = body.get('symptoms') if isinstance(body, dict) else None
+        if isinstance(symptoms, str):
+            symptoms = re.split(r"[\s,，、;；]+", symptoms)
+        if not isinstance(symptoms, list):
+            return _json_response({'error': "缺少 symptoms"}, status=400)
+        symptoms = list(dict.fromkeys(str(s).strip() for s in symptoms if str(s).strip()))
+        try:
+            k = int(body.get('k', self.pipeline.diagnosis_top_k))
+        except (TypeError, ValueError):
+            return _json_response({'error': "k 必须是整数"}, status=400)
+
+        # 纯内存计算，毫秒级，直接在事件循环中完成
+        start = time.perf_counter()
+        results = diagnoser.rank(symptoms, k)
+        return _json_response({
+            'results': results,
+            'unknown': diagnoser.unknown(symptoms),
+            'elapsed': time.perf_counter() - start,
+        })
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        stats = {
+            'pending': self.pending,
+            'served': self.served,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+        }
+        if self.pipeline.cache is not None:
+            stats['cache'] = self.pipeline.cache.stats()
+        stats['cypher_guard'] = self.pipeline.guard.stats()
+        return _json_response(stats)
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/ask', self.handle_ask)
+        app.router.add_post('/diagnose', self.handle_diagnose)
+        app.router.add_get('/health', self.handle_health)
+        return app
+
+def build_mock_service(data_dir: str = "processed_data", llm_delay: float = 0.2, **kwargs) -> QAService:
+    """TuGraphConnectorMock + StubChain，不依赖数据库和 Kimi"""
+    from tugraph_connector import TuGraphConnectorMock
+    from intent_router import IntentRouter
+    from diagnosis import DifferentialDiagnoser
+
+    connector = TuGraphConnectorMock()
+    cypher_chain = StubChain("MATCH (d:Disease)-[:has_symptom]->(s:Symptom) RETURN s.name AS name LIMIT 10",
+                             delay=llm_delay)
+    answer_chain = StubChain(lambda inputs: f"根据知识图谱，{inputs['result']}", delay=llm_delay)
+    router = IntentRouter.load(data_dir, backend='tugraph', connector=connector)
+    kwargs.setdefault('diagnoser', DifferentialDiagnoser.load(data_dir))
+    return QAService(cypher_chain, answer_chain, connector, router, **kwargs)
+
+def build_service(backend: str = 'tugraph', **kwargs) -> QAService:
+    """复用 CLI 模块中的链、连接器、路由、缓存与索引 (通过其惰性工厂创建，与 CLI 共享同一份实例)"""
+    if backend == 'neo4j':
+        import neo4j_qa_cli as cli
+    else:
+        import tugraph_qa_cli as cli
+    # GRAPH_BACKEND=snapshot 时为本地图快照
+    connector = cli.get_graph()
+    kwargs.setdefault('vector_top_k', cli.current_config.VECTOR_TOP_K)
+    kwargs.setdefault('diagnoser', cli.get_diagnoser())
+    kwargs.setdefault('diagnosis_top_k', cli.current_config.DIAGNOSIS_TOP_K)
+    kwargs.setdefault('diagnosis_min_symptoms', cli.current_config.DIAGNOSIS_MIN_SYMPTOMS)
+    kwargs.setdefault('guard', cli.get_cypher_guard())
+    return QAService(cli.get_cypher_chain(), cli.get_answer_chain(), connector, cli.get_intent_router(),
+                     cli.get_qa_cache(), cli.get_vector_index(), cli.get_name_index(), **kwargs)
+
+if __name__ == "__main__":
+    import argparse
+    from config import current_config
+
+    parser = argparse.ArgumentParser(description="异步 HTTP 医疗问答服务")
+    parser.add_argument('--backend', choices=['tugraph', 'neo4j'], default='tugraph')
+    parser.add_argument('--mock', action='store_true', help="使用模拟连接器与假 LLM")
+    parser.add_argument('--host', default=current_config.QA_SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=current_config.QA_SERVICE_PORT)
+    parser.add_argument('--llm-concurrency', type=int, default=current_config.QA_LLM_CONCURRENCY)
+    parser.add_argument('--db-concurrency', type=int, default=current_config.QA_DB_CONCURRENCY)
+    parser.add_argument('--max-pending', type=int, default=current_config.QA_MAX_PENDING)
+    parser.add_argument('--timeout', type=float, default=current_config.QA_REQUEST_TIMEOUT, help="单个请求的超时秒数")
+    args = parser.parse_args()
+
+    options = dict(llm_concurrency=args.llm_concurrency, db_concurrency=args.db_concurrency,
+                   max_pending=args.max_pending, request_timeout=args.timeout)
+    if args.mock:
+        service = build_mock_service(current_config.PROCESSED_DATA_DIR, **options)
+    else:
+        service = build_service(args.backend, **options)
+    web.run_app(service.make_app(), host=args.host, port=args.port)
@@ -2,14 +2,16 @@
 # coding: utf-8
 import os
 import json
+import time
+import hashlib
 import random
+import asyncio
+import argparse
 from itertools import product
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import pandas as pd
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from config import current_config
+from qa_cache import SQLiteCache
 
 # 配置参数
 DATA_PATH      = "data/medQA_mock.csv"  
@@ -22,6 +24,23 @@ OPENAI_API_KEY  = current_config.KIMI_API_KEY
 OPENAI_BASE_URL = "https://api.moonshot.cn/v1"
 MODEL_NAME      = "kimi-k2-turbo-preview"
 
+# 并发与限流 (0 表示不限)
+MAX_IN_FLIGHT   = 8
+RATE_LIMIT_RPM  = 0
+RATE_LIMIT_TPM  = 0
+MAX_RETRIES     = 5
+# 限流时按 提示词字符数 + 该值 估算一次调用的 token 数
+EST_OUTPUT_TOKENS = 512
+
+# 断点续跑：每完成一次调用追加一行；T=0.0 的回复写入持久缓存，重复实验不再计费
+CHECKPOINT_FILE     = "checkpoint.jsonl"
+RESPONSE_CACHE_FILE = "response_cache.sqlite"
+RESPONSE_CACHE_TTL  = 10 * 365 * 86400
+
+# 计费 (元 / 百万 tokens)，按实际价格表调整
+PRICE_INPUT_PER_M  = float(os.getenv('KIMI_PRICE_INPUT_PER_M', '8'))
+PRICE_OUTPUT_PER_M = float(os.getenv('KIMI_PRICE_OUTPUT_PER_M', '58'))
+
 # 三种医疗Prompt模板
 PROMPT_TEMPLATES: Dict[str, str] = {
     "详细结构版": """
@@ -114,6 +133,9 @@ PROMPT_TEMPLATES: Dict[str, str] = {
 # 三种 temperature
 TEMP_LIST = [0.0, 0.5, 0.8]
 
+# 输出 CSV 中的抽取字段
+EXTRACT_FIELDS = ("diseases", "symptoms", "drugs", "checks", "treatments")
+
 # 随机取数据测试
 def load_data(path: str, n: int = None) -> pd.DataFrame:
     df = pd.read_csv(path)
@@ -121,16 +143,92 @@ def load_data(path: str, n: int = None) -> pd.DataFrame:
         df = df.sample(n=n, random_state=RANDOM_SEED)
     return df
 
-# 大模型调用
+# 大模型调用；返回 AIMessage 以便读取 token 用量，重试由 _invoke_with_retry 统一处理
 def build_chain(tpl: str, temp: float):
+    from langchain_openai import ChatOpenAI
+    from langchain_core.prompts import ChatPromptTemplate
+
     prompt = ChatPromptTemplate.from_template(tpl)
     llm = ChatOpenAI(
         openai_api_key=OPENAI_API_KEY,
         openai_api_base=OPENAI_BASE_URL,
         model=MODEL_NAME,
         temperature=temp,
+        max_retries=0,
     )
-    return prompt | llm | StrOutputParser()
+    return prompt | llm
+
+class RateLimiter:
+    """请求数/分钟 与 token 数/分钟 两个令牌桶，acquire 在额度不足时等待"""
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int = 0):
+        if not self.rpm and not self.tpm:
+            return
+        # 单次请求超过整桶容量时按整桶计，避免永远等不到
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = 0.0
+                if self.rpm and self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+                if self.tpm and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+
+def _is_retryable(e: Exception) -> bool:
+    """429、5xx、连接错误与超时可以重试，其余 (如 400/401) 直接失败"""
+    status = getattr(e, 'status_code', None) or getattr(getattr(e, 'response', None), 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(e).__name__ in ('RateLimitError', 'APIConnectionError', 'APITimeoutError',
+                                'InternalServerError', 'TimeoutError')
+
+def _token_usage(message) -> Tuple[int, int]:
+    """从 AIMessage 读取 (输入 tokens, 输出 tokens)，取不到时返回 (0, 0)"""
+    usage = getattr(message, 'usage_metadata', None) or {}
+    if usage:
+        return usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+    usage = (getattr(message, 'response_metadata', None) or {}).get('token_usage') or {}
+    return usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+
+async def _invoke_with_retry(chain, inputs: Dict, limiter: RateLimiter, est_tokens: int,
+                             max_retries: int = MAX_RETRIES) -> Tuple[str, int, int]:
+    """返回 (回复文本, 输入 tokens, 输出 tokens)；可重试错误按指数退避 + 抖动重试"""
+    for attempt in range(max_retries + 1):
+        await limiter.acquire(est_tokens)
+        try:
+            message = await chain.ainvoke(inputs)
+            return (message.content, *_token_usage(message))
+        except Exception as e:
+            if attempt == max_retries or not _is_retryable(e):
+                raise
+            delay = min(60.0, 2 ** attempt) * (1 + random.random())
+            print(f"⚠️ 调用失败，{delay:.1f}s 后重试 ({attempt + 1}/{max_retries}): {e}")
+            await asyncio.sleep(delay)
 
 # 提取json文件中文本
 def safe_parse_json(text: str) -> Dict:
@@ -146,61 +244,215 @@ def safe_parse_json(text: str) -> Dict:
                 pass
         return {}
 
-def run_experiment(df: pd.DataFrame):
+def template_hash(tpl: str) -> str:
+    return hashlib.sha1(tpl.encode('utf-8')).hexdigest()[:12]
+
+def row_id(item: Dict) -> str:
+    """按行内容生成编号，抽样或数据文件顺序变化后仍能对上已完成的调用"""
+    content = f"{item['question']}\0{item['answer']}"
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+class Checkpoint:
+    """JSONL 断点文件，键为 (模板哈希, temperature, 行编号)，值为模型原始回复"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 进程在写入中途崩溃时，最后一行可能不完整
+                        continue
+                    self.done[(rec['template'], rec['temperature'], rec['row_id'])] = rec['raw']
+        self._f = open(path, 'a', encoding='utf-8')
+
+    def get(self, key: Tuple[str, float, str]):
+        return self.done.get(key)
+
+    def append(self, key: Tuple[str, float, str], raw: str, input_tokens: int = 0, output_tokens: int = 0):
+        tpl_hash, temp, rid = key
+        self._f.write(json.dumps({
+            'template': tpl_hash, 'temperature': temp, 'row_id': rid, 'raw': raw,
+            'input_tokens': input_tokens, 'output_tokens': output_tokens,
+        }, ensure_ascii=False) + "\n")
+        self._f.flush()
+        self.done[key] = raw
+
+    def close(self):
+        self._f.close()
+
+# 把 list[dict] 或 list[str] 转成「空格分隔」字符串
+def to_row(js: Dict) -> Dict[str, str]:
+    def join_field(key):
+        val = js.get(key, [])
+        if not isinstance(val, list):
+            return ""
+        items = [
+            str(entry).strip()
+            for v in val
+            if v and (entry := (v.get("name") if isinstance(v, dict) else v))
+        ]
+        return " ".join(items)
+
+    return {key: join_field(key) for key in EXTRACT_FIELDS}
+
+async def run_experiment_async(df: pd.DataFrame, max_in_flight: int = MAX_IN_FLIGHT,
+                               rpm: int = RATE_LIMIT_RPM, tpm: int = RATE_LIMIT_TPM,
+                               resume: bool = True, use_cache: bool = True) -> Dict[Tuple[str, float], Dict]:
+    """
+    所有 (模板, temperature, 行) 调用放进同一个队列，由 max_in_flight 个 worker 并发消费，
+    共享同一个限流器。每个配置的结果按原始行序写出；
+    配置的吞吐按其第一条调用开始到最后一条完成的时间计算。
+
+    参数:
+        resume: 为 False 时清空断点文件从头开始
+        use_cache: T=0.0 的调用是否读写持久化回复缓存
+    """
     os.makedirs(OUT_DIR, exist_ok=True)
     records: List[Dict] = df.to_dict(orient="records")
-    
-    for (st_name, st_tpl), temp in product(PROMPT_TEMPLATES.items(), TEMP_LIST):
-        chain = build_chain(st_tpl, temp)
-        csv_file = os.path.join(OUT_DIR, f"{st_name}_T{temp}.csv")
-        print(f"[+] Running {st_name} + T={temp} -> {csv_file}")
-        
-        rows = []
-        for item in records:
-            question = item["question"]
-            answer   = item["answer"]
+    row_ids = [row_id(item) for item in records]
+    configs = list(product(PROMPT_TEMPLATES.items(), TEMP_LIST))
+    limiter = RateLimiter(rpm, tpm)
+
+    checkpoint_path = os.path.join(OUT_DIR, CHECKPOINT_FILE)
+    if not resume and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = Checkpoint(checkpoint_path)
+    response_cache = SQLiteCache(os.path.join(OUT_DIR, RESPONSE_CACHE_FILE), namespace=MODEL_NAME,
+                                 maxsize=1000000, ttl=RESPONSE_CACHE_TTL) if use_cache else None
+
+    stats = {}
+    queue = asyncio.Queue()
+    for (st_name, st_tpl), temp in configs:
+        key = (st_name, temp)
+        st = stats[key] = {
+            'chain': build_chain(st_tpl, temp),
+            'template': st_tpl,
+            'template_hash': template_hash(st_tpl),
+            'rows': [None] * len(records),
+            'remaining': len(records),
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'errors': 0,
+            'resumed': 0,
+            'cache_hits': 0,
+            'start': None,
+        }
+        for idx, item in enumerate(records):
+            raw = checkpoint.get((st['template_hash'], temp, row_ids[idx]))
+            if raw is None:
+                queue.put_nowait((key, idx, item))
+                continue
+            st['rows'][idx] = to_row(safe_parse_json(raw))
+            st['remaining'] -= 1
+            st['resumed'] += 1
+        print(f"[+] Queued {st_name} + T={temp} ({st['remaining']} rows, {st['resumed']} resumed)")
+        if st['remaining'] == 0:
+            st['elapsed'] = 0.0
+            write_result(key, st['rows'], row_ids)
+
+    async def worker():
+        while True:
+            try:
+                key, idx, item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            st = stats[key]
+            if st['start'] is None:
+                st['start'] = time.perf_counter()
+            inputs = {"question": item["question"], "answer": item["answer"]}
+            est_tokens = len(st['template']) + len(str(inputs["question"])) + len(str(inputs["answer"])) + EST_OUTPUT_TOKENS
+            # 只有 T=0.0 的回复是确定的，可以跨实验复用
+            cache_key = ([st['template_hash'], str(inputs["question"]), str(inputs["answer"])]
+                         if response_cache is not None and key[1] == 0.0 else None)
             try:
-                raw = chain.invoke({"question": question, "answer": answer})
-                js  = safe_parse_json(raw)
+                # SQLite 读写在线程池中执行，不阻塞事件循环
+                raw = await asyncio.to_thread(response_cache.get, cache_key) if cache_key else None
+                if raw is not None:
+                    st['cache_hits'] += 1
+                    in_tokens = out_tokens = 0
+                else:
+                    raw, in_tokens, out_tokens = await _invoke_with_retry(st['chain'], inputs, limiter, est_tokens)
+                    if cache_key:
+                        await asyncio.to_thread(response_cache.set, cache_key, raw)
+                checkpoint.append((st['template_hash'], key[1], row_ids[idx]), raw, in_tokens, out_tokens)
+                js = safe_parse_json(raw)
+                st['input_tokens'] += in_tokens
+                st['output_tokens'] += out_tokens
             except Exception as e:
                 print(f"Error invoking chain: {e}")
+                st['errors'] += 1
                 js = {}
-                
-            # 把 list[dict] 或 list[str] 转成「空格分隔」字符串
-            def join_field(key):
-                val = js.get(key, [])
-                if not isinstance(val, list):
-                    return ""
-                items = [
-                    str(entry).strip()
-                    for v in val
-                    if v and (entry := (v.get("name") if isinstance(v, dict) else v))
-                ]
-                return " ".join(items)
-            
-            rows.append({
-                "diseases"  : join_field("diseases"),
-                "symptoms"  : join_field("symptoms"),
-                "drugs"     : join_field("drugs"),
-                "checks"    : join_field("checks"),
-                "treatments": join_field("treatments")
-            })
-            
-        pd.DataFrame(rows).to_csv(csv_file, index=False, encoding="utf-8-sig")
-        print(f"[-] Done {csv_file}")
-        
-        # 输出转化结果示例
-        print(f"------------ 转化结果 - {st_name} T={temp} ------------")
-        top3 = pd.read_csv(csv_file, keep_default_na=False).head(3)
-        for idx, row in top3.iterrows():
-            print(f"Row{idx + 1} | ds:{row['diseases']} | sy:{row['symptoms']} | dr:{row['drugs']} | ch:{row['checks']} | tr:{row['treatments']}")
-        print("-" * 80)
+            st['rows'][idx] = to_row(js)
+            st['remaining'] -= 1
+            if st['remaining'] == 0:
+                st['elapsed'] = time.perf_counter() - st['start']
+                write_result(key, st['rows'], row_ids)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, max_in_flight))))
+    finally:
+        checkpoint.close()
+        if response_cache is not None:
+            response_cache.close()
+    return stats
+
+def write_result(key: Tuple[str, float], rows: List[Dict], row_ids: List[str]):
+    st_name, temp = key
+    csv_file = os.path.join(OUT_DIR, f"{st_name}_T{temp}.csv")
+    # row_id 供 evaluate_experiment.py 与标注数据对齐
+    pd.DataFrame(rows, columns=list(EXTRACT_FIELDS)).assign(row_id=row_ids)[["row_id", *EXTRACT_FIELDS]].to_csv(
+        csv_file, index=False, encoding="utf-8-sig")
+    print(f"[-] Done {csv_file}")
+
+    # 输出转化结果示例
+    print(f"------------ 转化结果 - {st_name} T={temp} ------------")
+    for idx, row in enumerate(rows[:3]):
+        print(f"Row{idx + 1} | ds:{row['diseases']} | sy:{row['symptoms']} | dr:{row['drugs']} | ch:{row['checks']} | tr:{row['treatments']}")
+    print("-" * 80)
+
+def print_summary(stats: Dict[Tuple[str, float], Dict], wall: float):
+    print(f"{'配置':18s} {'行数':>6s} {'续跑':>6s} {'缓存':>6s} {'失败':>4s} {'rows/s':>8s} "
+          f"{'输入tok':>9s} {'输出tok':>9s} {'费用(元)':>9s}")
+    total_rows = total_cost = 0
+    for (st_name, temp), st in stats.items():
+        # 续跑的行不计入本次吞吐
+        n = len(st['rows']) - st['resumed']
+        cost = (st['input_tokens'] * PRICE_INPUT_PER_M + st['output_tokens'] * PRICE_OUTPUT_PER_M) / 1e6
+        rate = n / st['elapsed'] if st.get('elapsed') else 0.0
+        total_rows += n
+        total_cost += cost
+        print(f"{st_name + ' T=' + str(temp):18s} {n:>6d} {st['resumed']:>6d} {st['cache_hits']:>6d} "
+              f"{st['errors']:>4d} {rate:>8.2f} "
+              f"{st['input_tokens']:>9d} {st['output_tokens']:>9d} {cost:>9.4f}")
+    print(f"合计 {total_rows} 行, 耗时 {wall:.1f}s, {total_rows / wall if wall else 0:.2f} rows/s, 费用 {total_cost:.4f} 元")
+
+def run_experiment(df: pd.DataFrame, max_in_flight: int = MAX_IN_FLIGHT,
+                   rpm: int = RATE_LIMIT_RPM, tpm: int = RATE_LIMIT_TPM,
+                   resume: bool = True, use_cache: bool = True):
+    start = time.perf_counter()
+    stats = asyncio.run(run_experiment_async(df, max_in_flight, rpm, tpm, resume, use_cache))
+    print_summary(stats, time.perf_counter() - start)
+    return stats
 
 if __name__ == "__main__":
-    if not os.path.exists(DATA_PATH):
-        print(f"错误：找不到数据文件 {DATA_PATH}")
+    parser = argparse.ArgumentParser(description="三种模板 × 三种 temperature 的抽取实验")
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--sample-n', type=int, default=SAMPLE_N)
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT, help="同时进行的 LLM 调用数")
+    parser.add_argument('--rpm', type=int, default=RATE_LIMIT_RPM, help="每分钟请求数上限，0 为不限")
+    parser.add_argument('--tpm', type=int, default=RATE_LIMIT_TPM, help="每分钟 token 数上限 (估算)，0 为不限")
+    parser.add_argument('--fresh', action='store_true', help="忽略并清空断点文件，从头开始")
+    parser.add_argument('--no-cache', action='store_true', help="不读写 T=0.0 的持久化回复缓存")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data):
+        print(f"错误：找不到数据文件 {args.data}")
         exit(1)
         
-    df = load_data(DATA_PATH, SAMPLE_N)
+    df = load_data(args.data, args.sample_n)
     print("数据载入完成，数量 =", len(df))
-    run_experiment(df)
+    run_experiment(df, args.max_in_flight, args.rpm, args.tpm, resume=not args.fresh, use_cache=not args.no_cache)
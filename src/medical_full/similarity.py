@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+预计算的相似疾病与药品共用关系
+
+“和糖尿病相似的疾病”“常与阿莫西林一起用的药”在查询时都是两跳遍历 (疾病-症状-疾病、药品-疾病-药品)，
+常见症状/药品的扇出很大。这里离线算好每个节点的 top-k，写成一跳的派生边:
+    (d:Disease)-[:SIMILAR_TO {score, shared}]->(o:Disease)     共享症状/检查的 IDF 加权 Jaccard
+    (a:Drug)-[:CO_PRESCRIBED {count, score}]->(b:Drug)        同一疾病下同时出现的次数及其 Jaccard
+TuGraph 中使用小写的 similar_to / co_prescribed。
+
+共现矩阵 A·Aᵀ 按行分块计算 (A 为 物品×特征 的关联矩阵，即图快照中的 CSR)：
+每块物品先取出特征，再沿反向 CSR 取出共享这些特征的物品，bincount 累加成 块×物品 的稠密矩阵，
+逐块取 top-k，内存占用与块大小成正比。
+
+结果写入 processed_data/rel_similar_to.csv、rel_co_prescribed.csv，
+由 import_to_neo4j.py 与 preprocess.py 生成的 neo4j-admin / lgraph_import 文件导入。
+incremental_import.py 不更新派生边，数据变化较多时重新运行本脚本与 import_to_neo4j.py。
+
+用法:
+    python similarity.py --data-dir processed_data -k 10
+"""
+import os
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from graph_snapshot import CSR, DISEASE_LABEL, GraphSnapshot
+
+DEFAULT_TOP_K = 10
+# 至少共享 MIN_SHARED 个症状/检查 (药品至少在 MIN_SHARED 个疾病中同时出现) 才建边
+MIN_SHARED = 2
+# 每块稠密矩阵的元素个数上限 (float64，约 32MB)
+BLOCK_CELLS = 1 << 22
+
+# (文件名, 列, Neo4j 关系类型, TuGraph 边类型, 起点标签, 终点标签)，列中前两个为起点、终点名称，其余为边属性
+DERIVED_RELATIONS = [
+    ('rel_similar_to.csv', ['disease_id', 'similar_disease_id', 'score', 'shared'],
+     'SIMILAR_TO', 'similar_to', DISEASE_LABEL, DISEASE_LABEL),
+    ('rel_co_prescribed.csv', ['drug_id', 'co_drug_id', 'count', 'score'],
+     'CO_PRESCRIBED', 'co_prescribed', 'Drug', 'Drug'),
+]
+# 边属性在 neo4j-admin 表头与 TuGraph schema 中的类型
+PROP_TYPES = {'score': ('double', 'DOUBLE'), 'shared': ('int', 'INT32'), 'count': ('int', 'INT32')}
+
+def top_k_overlap(relations: Sequence[Tuple[CSR, CSR, np.ndarray]], n_items: int, k: int = DEFAULT_TOP_K,
+                  min_shared: int = MIN_SHARED, by_count: bool = False,
+                  block_cells: int = BLOCK_CELLS) -> Tuple[np.ndarray, ...]:
+    """
+    按共享特征给每个物品找 top-k 个其他物品
+
+    参数:
+        relations: [(物品->特征 CSR, 特征->物品 CSR, 特征权重)]，多种特征 (症状、检查) 的交集权重相加
+        by_count: True 时按共享个数排序 (同数再按 Jaccard)，否则按加权 Jaccard 排序
+    返回:
+        (起点, 终点, 加权 Jaccard, 共享个数)，按起点升序、同一起点内按排序键降序
+    """
+    empty = (np.empty(0, dtype=np.int64),) * 2 + (np.empty(0), np.empty(0, dtype=np.int64))
+    k = min(k, n_items - 1)
+    if k <= 0:
+        return empty
+    # 每个物品全部特征的权重之和，用于 Jaccard 的分母
+    totals = np.zeros(n_items)
+    for forward, _, weight in relations:
+        src, dst = forward.edges()
+        totals += np.bincount(src, weights=weight[dst], minlength=n_items)
+
+    block = max(1, block_cells // n_items)
+    parts = []
+    for start in range(0, n_items, block):
+        ids = np.arange(start, min(start + block, n_items))
+        shape = (len(ids), n_items)
+        inter, shared = np.zeros(shape), np.zeros(shape, dtype=np.int64)
+        for forward, reverse, weight in relations:
+            item, feature = forward.gather(ids)
+            fanout = reverse.degree(feature)
+            _, other = reverse.gather(feature)
+            cell = np.repeat(item - start, fanout) * n_items + other
+            inter += np.bincount(cell, weights=np.repeat(weight[feature], fanout), minlength=inter.size).reshape(shape)
+            shared += np.bincount(cell, minlength=shared.size).reshape(shape)
+
+        rows = np.arange(len(ids))
+        shared[rows, ids] = 0
+        union = totals[ids, None] + totals[None, :] - inter
+        score = np.divide(inter, union, out=np.zeros(shape), where=shared >= max(min_shared, 1))
+        # 共享个数为整数、Jaccard 不超过 1，相加后排序等价于先按个数再按 Jaccard
+        key = shared + score / 2 if by_count else score
+        key[score == 0] = 0
+        top = np.argpartition(-key, k - 1, axis=1)[:, :k]
+        keep = np.take_along_axis(key, top, axis=1) > 0
+        src, dst = np.repeat(ids, k)[keep.ravel()], top[keep]
+        parts.append((src, dst, score[src - start, dst], shared[src - start, dst],
+                      key[src - start, dst]))
+
+    src, dst, score, shared, key = (np.concatenate(cols) for cols in zip(*parts))
+    order = np.lexsort((dst, -key, src))
+    return src[order], dst[order], score[order], shared[order]
+
+def similar_diseases(snapshot: GraphSnapshot, k: int = DEFAULT_TOP_K, min_shared: int = MIN_SHARED) -> pd.DataFrame:
+    """共享症状与检查的 IDF 加权 Jaccard，常见症状/检查 (发热、血常规) 的贡献被压低"""
+    from diagnosis import idf_weights
+
+    relations = [(rel.forward, rel.reverse, idf_weights(rel))
+                 for edge_type, rel in snapshot.relations.items() if edge_type in ('has_symptom', 'need_check')]
+    names = snapshot.names[DISEASE_LABEL]
+    src, dst, score, shared = top_k_overlap(relations, len(names), k, min_shared)
+    columns = DERIVED_RELATIONS[0][1]
+    return pd.DataFrame({columns[0]: names.take(src), columns[1]: names.take(dst),
+                         'score': score.round(4), 'shared': shared})
+
+def co_prescribed_drugs(snapshot: GraphSnapshot, k: int = DEFAULT_TOP_K, min_count: int = MIN_SHARED) -> pd.DataFrame:
+    """两个药品同时作为常用药出现的疾病数，按次数排序；数据中没有药品关系时返回空表"""
+    columns = DERIVED_RELATIONS[1][1]
+    rel = snapshot.relations.get('common_drug')
+    names = snapshot.names.get('Drug')
+    if rel is None or names is None:
+        return pd.DataFrame(columns=columns)
+    relations = [(rel.reverse, rel.forward, np.ones(len(rel.forward.indptr) - 1))]
+    src, dst, score, count = top_k_overlap(relations, len(names), k, min_count, by_count=True)
+    return pd.DataFrame({columns[0]: names.take(src), columns[1]: names.take(dst),
+                         'count': count, 'score': score.round(4)})
+
+def build_tables(snapshot: GraphSnapshot, k: int = DEFAULT_TOP_K) -> Dict[str, pd.DataFrame]:
+    """{文件名: 边表}，与 DERIVED_RELATIONS 顺序一致"""
+    return {DERIVED_RELATIONS[0][0]: similar_diseases(snapshot, k),
+            DERIVED_RELATIONS[1][0]: co_prescribed_drugs(snapshot, k)}
+
+def write_tables(output_dir: str, tables: Dict[str, pd.DataFrame]):
+    for filename, df in tables.items():
+        df.to_csv(os.path.join(output_dir, filename), index=False, encoding='utf-8-sig')
+
+def admin_header(columns: List[str], start_label: str, end_label: str) -> List[str]:
+    """neo4j-admin 关系文件表头"""
+    return ([f':START_ID({start_label})', f':END_ID({end_label})'] +
+            [f"{c}:{PROP_TYPES[c][0]}" for c in columns[2:]] + [':TYPE'])
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="预计算相似疾病与药品共用关系")
+    parser.add_argument('--data-dir', default="processed_data")
+    parser.add_argument('-k', type=int, default=DEFAULT_TOP_K, help="每个节点保留的边数")
+    args = parser.parse_args()
+
+    snapshot = GraphSnapshot.open(args.data_dir)
+    start = time.perf_counter()
+    tables = build_tables(snapshot, args.k)
+    elapsed = time.perf_counter() - start
+    write_tables(args.data_dir, tables)
+    for (filename, _, rel_type, *_), df in zip(DERIVED_RELATIONS, tables.values()):
+        print(f"{rel_type}: {len(df)} 条 -> {os.path.join(args.data_dir, filename)}")
+        print(df.head(5).to_string(index=False))
+    print(f"计算耗时 {elapsed:.2f}s，重新运行 import_to_neo4j.py 或 lgraph_import 即可导入")
@@ -0,0 +1,29 @@
+import json
+import os
+import sys
+
+import pytest
+
+# 模块以脚本方式互相导入 (from config import ...)，测试时把模块目录加入 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 小型 medical.json 语料：三种疾病共享部分症状、药品与检查
+MEDICAL_RECORDS = [
+    {'name': "感冒", 'desc': "上呼吸道感染", 'symptom': ["发热", "咳嗽", "头痛"],
+     'common_drug': ["布洛芬", "对乙酰氨基酚"], 'check': ["血常规"]},
+    {'name': "流感", 'desc': "流感病毒感染", 'symptom': ["发热", "咳嗽", "肌肉酸痛"],
+     'common_drug': ["奥司他韦", "布洛芬"], 'check': ["血常规"]},
+    {'name': "肺炎", 'symptom': ["发热", "胸痛"], 'common_drug': ["阿莫西林"], 'check': ["胸片", "血常规"]},
+]
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """MEDICAL_RECORDS 经 preprocess.py 批处理后的输出目录 (CSV、manifest.jsonl 与 graph.snap)"""
+    from preprocess import preprocess_medical_data
+
+    source = tmp_path / "medical.json"
+    source.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in MEDICAL_RECORDS) + "\n",
+                      encoding='utf-8')
+    out = tmp_path / "processed"
+    preprocess_medical_data(str(source), str(out))
+    return str(out)
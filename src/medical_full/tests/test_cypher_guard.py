@@ -0,0 +1,156 @@
+import time
+import types
+
+import pytest
+
+from cypher_guard import CypherGuard, CypherRejected
+from neo4j_connector import Neo4jConnector, plan_to_dict
+
+@pytest.fixture
+def guard():
+    return CypherGuard(default_limit=100, max_limit=1000, max_hops=3)
+
+def rewrite(guard, cypher):
+    return guard.analyze(cypher)[0]
+
+def rejected(guard, cypher):
+    with pytest.raises(CypherRejected) as info:
+        guard.analyze(cypher)
+    return info.value.reason
+
+@pytest.mark.parametrize('cypher', [
+    "MATCH (n:Disease) DETACH DELETE n",
+    "MATCH (d:Disease) SET d.x = 1",
+    "MERGE (d:Disease {name: 'x'})",
+    "LOAD CSV FROM 'file:///a.csv' AS row RETURN row",
+])
+def test_write_rejected(guard, cypher):
+    assert rejected(guard, cypher) == "查询语句包含写操作"
+
+def test_keywords_in_literals_and_properties_allowed(guard):
+    cypher = "MATCH (d:Disease) WHERE d.name = 'create set delete' RETURN d.name, d.offset LIMIT 5"
+    assert rewrite(guard, cypher) == cypher
+
+def test_multiple_statements_and_procedures(guard):
+    assert rejected(guard, "MATCH (d:Disease {name:'a'}) RETURN d.name; MATCH (n) DELETE n") == "包含多条语句"
+    assert rejected(guard, "CALL apoc.periodic.iterate('a', 'b', {})").startswith("不允许调用过程")
+    assert rewrite(guard, "CALL db.labels()") == "CALL db.labels()"
+
+def test_cartesian_product(guard):
+    assert "笛卡尔积" in rejected(guard, "MATCH (a:Disease), (b:Drug) RETURN a.name, b.name")
+    # 一侧有锚点时只是逐行展开，允许
+    rewrite(guard, "MATCH (a:Disease {name: '感冒'}), (b:Drug) RETURN a.name, b.name")
+    # 通过共享变量相连的模式不是笛卡尔积
+    rewrite(guard, "MATCH (a:Disease)-[:HAS_SYMPTOM]->(s:Symptom), (b:Disease)-[:HAS_SYMPTOM]->(s) "
+                   "RETURN a.name, b.name")
+    assert rejected(guard, "MATCH (n) RETURN n") == "未指定标签的全图扫描"
+
+def test_var_length(guard):
+    assert "[:HAS_SYMPTOM*1..3]" in rewrite(guard, "MATCH (d:Disease {name:'a'})-[:HAS_SYMPTOM*]->(s) RETURN s.name")
+    assert "[*2..3]" in rewrite(guard, "MATCH (d:Disease {name:'a'})-[*2..10]-(x) RETURN x.name")
+    assert "[*1..2]" in rewrite(guard, "MATCH (d:Disease {name:'a'})-[*1..2]-(x) RETURN x.name")
+    assert rejected(guard, "MATCH (d:Disease {name:'a'})-[*5..]->(x) RETURN x").startswith("变长路径至少 5 跳")
+    assert rejected(guard, "MATCH (d:Disease {name:'a'})-[*4]->(x) RETURN x").startswith("变长路径至少 4 跳")
+
+def test_limit(guard):
+    assert rewrite(guard, "MATCH (d:Disease) RETURN d.name").endswith("RETURN d.name LIMIT 100")
+    assert rewrite(guard, "MATCH (d:Disease) RETURN d.name LIMIT 5000").endswith("LIMIT 1000")
+    assert rewrite(guard, "MATCH (d:Disease) RETURN d.name LIMIT 10").endswith("LIMIT 10")
+    assert rewrite(guard, "MATCH (d:Disease) RETURN d.name LIMIT $k").endswith("LIMIT $k")
+
+def test_limit_before_trailing_comment(guard):
+    result = rewrite(guard, "MATCH (d:Disease {name:'感冒'}) RETURN d.name // trailing comment")
+    assert result == "MATCH (d:Disease {name:'感冒'}) RETURN d.name LIMIT 100 // trailing comment"
+    result = rewrite(guard, "MATCH (d:Disease) RETURN d.name /* 注释 */")
+    assert result == "MATCH (d:Disease) RETURN d.name LIMIT 100 /* 注释 */"
+
+def test_union_branches(guard):
+    result = rewrite(guard, "MATCH (d:Disease) RETURN d.name AS n UNION MATCH (s:Symptom) RETURN s.name AS n")
+    assert result == ("MATCH (d:Disease) RETURN d.name AS n LIMIT 100 "
+                      "UNION MATCH (s:Symptom) RETURN s.name AS n LIMIT 100")
+    result = rewrite(guard, "MATCH (d:Disease) RETURN d.name AS n LIMIT 5000 "
+                            "UNION ALL MATCH (s:Symptom) RETURN s.name AS n LIMIT 5")
+    assert "LIMIT 1000 UNION ALL" in result and result.endswith("LIMIT 5")
+    assert "笛卡尔积" in rejected(guard, "MATCH (a:Disease), (b:Drug) RETURN a.name AS n "
+                                        "UNION MATCH (s:Symptom) RETURN s.name AS n")
+
+def test_check_records_stats_and_log(tmp_path):
+    log = tmp_path / "rejects.jsonl"
+    guard = CypherGuard(log_path=str(log))
+    guard.check("MATCH (d:Disease {name:'a'}) RETURN d.name")
+    with pytest.raises(CypherRejected):
+        guard.check("MATCH (n) DETACH DELETE n")
+    assert guard.stats() == {'checked': 2, 'rewritten': 1, 'rejected': 1, 'reasons': {"查询语句包含写操作": 1}}
+    assert "DETACH DELETE" in log.read_text(encoding='utf-8')
+
+class FakeCypherPlan:
+    """旧版 py2neo 的 CypherPlan：snake_case 属性"""
+
+    def __init__(self, operator_type, args=None, children=()):
+        self.operator_type = operator_type
+        self.args = args or {}
+        self.children = list(children)
+
+class FakeGraph:
+    def __init__(self, plan=None, delay=0.0):
+        self.plan = plan
+        self.delay = delay
+        self.queries = []
+        self.parameters = []
+
+    def run(self, cypher, **parameters):
+        self.queries.append(cypher)
+        self.parameters.append(parameters)
+        if 'SLOW' in cypher:
+            time.sleep(self.delay)
+        return types.SimpleNamespace(plan=lambda: self.plan, data=lambda: [{'x': 1}])
+
+def fake_connector(graph):
+    conn = Neo4jConnector()
+    conn.graph, conn._initialized = graph, True
+    return conn
+
+@pytest.mark.parametrize('plan', [
+    {'operatorType': 'ProduceResults@neo4j', 'args': {'EstimatedRows': 10.0},
+     'children': [{'operatorType': 'CartesianProduct@neo4j', 'args': {'EstimatedRows': 10.0}, 'children': []}]},
+    FakeCypherPlan('ProduceResults', {'estimated_rows': 10.0},
+                   [FakeCypherPlan('CartesianProduct', {'estimated_rows': 10.0})]),
+])
+def test_explain_plan_rejected(plan):
+    conn = fake_connector(FakeGraph(plan))
+    assert plan_to_dict(plan)['children'][0]['args']['EstimatedRows'] == 10.0
+    guard = CypherGuard(explain=lambda cypher, params: conn.explain(cypher, **params))
+    with pytest.raises(CypherRejected) as info:
+        guard.check("MATCH (d:Disease {name:'a'}) RETURN d.name")
+    assert info.value.reason == "执行计划包含 CartesianProduct"
+    assert conn.graph.queries[0].startswith("EXPLAIN ")
+
+def test_explain_estimated_rows():
+    plan = FakeCypherPlan('ProduceResults', {'estimated_rows': 5e6}, [FakeCypherPlan('NodeByLabelScan')])
+    conn = fake_connector(FakeGraph(plan))
+    guard = CypherGuard(explain=lambda cypher, params: conn.explain(cypher, **params), max_estimated_rows=10000)
+    with pytest.raises(CypherRejected):
+        guard.check("MATCH (d:Disease) RETURN d.name")
+    guard.max_estimated_rows = 0
+    guard.check("MATCH (d:Disease) RETURN d.name")
+
+def test_explain_failure_is_ignored():
+    def explain(cypher, params):
+        raise RuntimeError("syntax error")
+    assert CypherGuard(explain=explain).check("MATCH (d:Disease) RETURN d.name").endswith("LIMIT 100")
+
+def test_neo4j_timeout_terminates_query():
+    graph = FakeGraph(delay=0.5)
+    conn = fake_connector(graph)
+    assert conn.data("RETURN 1", _timeout=1) == [{'x': 1}]
+    with pytest.raises(TimeoutError):
+        conn.data("SLOW", _timeout=0.05)
+    assert graph.queries[1].startswith("SLOW\n// qa-guard ")
+    # 超时后按标记注释在服务端终止
+    assert graph.queries[2].startswith("SHOW TRANSACTIONS")
+
+def test_neo4j_timeout_parameter_reaches_cypher():
+    graph = FakeGraph()
+    conn = fake_connector(graph)
+    conn.data("MATCH (d:Disease) WHERE d.timeout = $timeout RETURN d.name", timeout=5)
+    assert graph.parameters == [{'timeout': 5}]
@@ -0,0 +1,35 @@
+import math
+
+import pytest
+
+from diagnosis import DifferentialDiagnoser
+from entity_linker import Entity
+
+def symptoms(*names):
+    return [Entity(n, n, ('Symptom',), 0, len(n)) for n in names]
+
+@pytest.fixture
+def diagnoser(data_dir):
+    return DifferentialDiagnoser.load(data_dir)
+
+def test_rank_idf_weighted_jaccard(diagnoser):
+    # 3 种疾病：发热 df=3，咳嗽 df=2，其余症状 df=1；idf = ln(4 / (df + 1)) + 1
+    cough, rare = math.log(4 / 3) + 1, math.log(2) + 1
+    ranked = diagnoser.rank(["发热", "咳嗽"])
+    assert {r['disease'] for r in ranked[:2]} == {"感冒", "流感"}
+    # 感冒/流感 各有 1 个未被查询的罕见症状；肺炎只命中发热
+    assert ranked[0]['score'] == pytest.approx((1 + cough) / (1 + cough + rare), abs=1e-4)
+    assert ranked[2]['disease'] == "肺炎" and ranked[2]['matched'] == ["发热"] and ranked[2]['symptom_count'] == 2
+    assert ranked[2]['score'] == pytest.approx(1 / (1 + cough + rare), abs=1e-4)
+    assert [r['disease'] for r in diagnoser.rank(["发热", "咳嗽"], k=1)] in (["感冒"], ["流感"])
+
+def test_rank_ignores_unknown_symptoms(diagnoser):
+    ranked = diagnoser.rank(["胸痛", "发热", "不存在"])
+    assert ranked[0]['disease'] == "肺炎" and ranked[0]['score'] == 1.0
+    assert diagnoser.unknown(["胸痛", "不存在"]) == ["不存在"]
+    assert diagnoser.rank(["不存在"]) == [] and diagnoser.rank(["发热"], k=0) == []
+
+def test_answer_needs_keyword_and_enough_symptoms(diagnoser):
+    assert diagnoser.answer("发热胸痛可能是什么病", symptoms("发热", "胸痛")).startswith("按症状重合度排序的可能疾病：disease：肺炎")
+    assert diagnoser.answer("发热胸痛怎么治疗", symptoms("发热", "胸痛")) is None
+    assert diagnoser.answer("发热是什么病", symptoms("发热")) is None
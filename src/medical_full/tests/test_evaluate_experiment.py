@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from evaluate_experiment import Gold, evaluate, evaluate_output, load_vocab, row_id, tokenize_column
+
+GOLD = pd.DataFrame([
+    {'question': "发烧咳嗽", 'answer': "感冒", 'diseases': "感冒", 'symptoms': "发热 咳嗽", 'drugs': "abc"},
+    {'question': "胸痛", 'answer': "肺炎", 'diseases': "肺炎", 'symptoms': "胸痛", 'drugs': ""},
+    # 没有对应预测的行，不计入召回率
+    {'question': "肌肉酸痛", 'answer': "流感", 'diseases': "流感", 'symptoms': "肌肉酸痛", 'drugs': ""},
+])
+GOLD['row_id'] = [row_id(q, a) for q, a in zip(GOLD['question'], GOLD['answer'])]
+
+PRED = pd.DataFrame([
+    {'row_id': GOLD['row_id'][0], 'diseases': "感冒 感冒", 'symptoms': "发热 头晕", 'drugs': "ＡＢＣ"},
+    {'row_id': GOLD['row_id'][1], 'diseases': "肺炎 流感", 'symptoms': "", 'drugs': ""},
+    {'row_id': "unknown", 'diseases': "感冒", 'symptoms': "", 'drugs': ""},
+])
+
+def test_tokenize_column_keeps_row_numbers():
+    rows, tokens = tokenize_column(pd.Series(["Ａ b", "", None, "c"]))
+    assert list(rows) == [0, 0, 3] and list(tokens) == ["a", "b", "c"]
+
+def test_evaluate_output_on_hand_checked_rows(data_dir):
+    result = evaluate_output(PRED, Gold(GOLD), load_vocab(data_dir))
+    assert result['rows'] == 3 and result['aligned'] == 2
+    # 重复实体只算一次；未对齐的行计入 _n 但不参与精确率/召回率
+    assert result['diseases_n'] == 4
+    assert result['diseases_precision'] == pytest.approx(2 / 3)
+    assert result['diseases_recall'] == 1.0
+    assert result['symptoms_precision'] == 0.5
+    assert result['symptoms_recall'] == pytest.approx(1 / 3)
+    # NFKC + 小写后全角 ＡＢＣ 与标注 abc 一致
+    assert result['drugs_f1'] == 1.0
+    assert result['diseases_vocab'] == 1.0 and result['symptoms_vocab'] == 0.5
+
+def test_evaluate_aligns_outputs_by_row_id_or_position(tmp_path, data_dir):
+    gold_path = tmp_path / "gold.csv"
+    GOLD.drop(columns='row_id').to_csv(gold_path, index=False)
+    out = tmp_path / "out"
+    out.mkdir()
+    PRED.to_csv(out / "简洁版_T0.0.csv", index=False)
+    # 旧版输出没有 row_id：行数与标注一致时按位置对齐，否则跳过
+    GOLD[['diseases']].to_csv(out / "旧版_T0.5.csv", index=False)
+    PRED[['diseases']].iloc[:2].to_csv(out / "旧版_T0.8.csv", index=False)
+    (out / "notes.csv").write_text("x\n1\n", encoding='utf-8')
+
+    summary = evaluate(str(out), str(gold_path), data_dir)
+    assert list(zip(summary['template'], summary['temperature'])) == [("旧版", 0.5), ("简洁版", 0.0)]
+    old = summary.iloc[0]
+    assert old['diseases_f1'] == 1.0 and old['aligned'] == 3
@@ -0,0 +1,46 @@
+from fuzzy_index import NgramIndex, FulltextIndex
+
+NAMES = {'Disease': ["偏头痛", "紧张性头痛", "胃炎", "肺炎"]}
+
+class FakeNeo4j:
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+
+    def data(self, cypher, _timeout=None, **params):
+        self.calls.append((cypher, params))
+        if self.error:
+            raise self.error
+        return [{'name': n} for n in NAMES[params['label']] if params['keyword'] in n]
+
+def test_ngram_rewrite_contains():
+    index = NgramIndex(NAMES)
+    cypher = "MATCH (d:Disease) WHERE d.name CONTAINS '头痛' RETURN d.name"
+    assert index.rewrite_contains(cypher) == "MATCH (d:Disease) WHERE d.name IN ['偏头痛', '紧张性头痛'] RETURN d.name"
+
+def test_fulltext_rewrite_queries_index():
+    conn = FakeNeo4j()
+    index = FulltextIndex(conn, fallback=NgramIndex(NAMES))
+    cypher = "MATCH (d:Disease) WHERE d.name CONTAINS '头痛' RETURN d.name"
+    assert index.rewrite_contains(cypher) == "MATCH (d:Disease) WHERE d.name IN ['偏头痛', '紧张性头痛'] RETURN d.name"
+    query, params = conn.calls[0]
+    assert "db.index.fulltext.queryNodes" in query
+    assert params['index'] == 'medical_name_fulltext' and params['query'] == '"头痛"'
+
+def test_fulltext_single_char_and_failure_use_local_index():
+    conn = FakeNeo4j(RuntimeError("There is no such fulltext schema index: medical_name_fulltext"))
+    index = FulltextIndex(conn, fallback=NgramIndex(NAMES))
+    assert sorted(index.contains('Disease', '炎')) == ["肺炎", "胃炎"]
+    assert conn.calls == []
+    assert index.contains('Disease', '头痛') == ["偏头痛", "紧张性头痛"]
+    assert index.contains('Disease', '胃炎') == ["胃炎"]
+    assert len(conn.calls) == 1 and not index.available
+
+def test_fulltext_transient_error_falls_back_once():
+    conn = FakeNeo4j(TimeoutError("查询超过 10s 未完成，已终止"))
+    index = FulltextIndex(conn, fallback=NgramIndex(NAMES))
+    assert index.contains('Disease', '头痛') == ["偏头痛", "紧张性头痛"]
+    assert index.available
+    conn.error = None
+    assert index.contains('Disease', '胃炎') == ["胃炎"]
+    assert len(conn.calls) == 2
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pytest
+
+from graph_snapshot import SNAPSHOT_FILE, GraphSnapshot, SnapshotFormatError
+
+def assert_same(a, b):
+    assert a.stats() == b.stats()
+    for label, table in a.names.items():
+        assert table.take(range(len(table))) == b.names[label].take(range(len(table)))
+    for edge_type, rel in a.relations.items():
+        other = b.relations[edge_type]
+        for side in ('forward', 'reverse'):
+            assert np.array_equal(getattr(rel, side).indptr, getattr(other, side).indptr)
+            assert np.array_equal(getattr(rel, side).indices, getattr(other, side).indices)
+
+def test_save_load_round_trip(data_dir, tmp_path):
+    built = GraphSnapshot.from_csv(data_dir)
+    path = str(tmp_path / "copy.snap")
+    built.save(path)
+    loaded = GraphSnapshot.load(path, verify=True)
+    assert loaded._mmap is not None
+    assert_same(built, loaded)
+
+def test_corrupted_header(data_dir):
+    path = os.path.join(data_dir, SNAPSHOT_FILE)
+    with open(path, 'r+b') as f:
+        f.write(b"NOTASNAP")
+    with pytest.raises(SnapshotFormatError):
+        GraphSnapshot.load(path)
+    snapshot = GraphSnapshot.open(data_dir)
+    assert snapshot._mmap is None
+    assert_same(snapshot, GraphSnapshot.from_csv(data_dir))
+
+def test_empty_file_falls_back_to_csv(data_dir):
+    path = os.path.join(data_dir, SNAPSHOT_FILE)
+    open(path, 'wb').close()
+    with pytest.raises(SnapshotFormatError):
+        GraphSnapshot.load(path)
+    assert GraphSnapshot.open(data_dir)._mmap is None
+
+def test_stale_snapshot_is_ignored(data_dir):
+    path = os.path.join(data_dir, SNAPSHOT_FILE)
+    assert GraphSnapshot.open(data_dir)._mmap is not None
+    csv_mtime = os.path.getmtime(os.path.join(data_dir, "rel_has_symptom.csv"))
+    os.utime(path, (csv_mtime - 60, csv_mtime - 60))
+    assert GraphSnapshot.open(data_dir)._mmap is None
@@ -0,0 +1,45 @@
+import types
+
+import import_to_neo4j
+from import_to_neo4j import replace_derived_relationships
+
+class FakeTx:
+    def __init__(self, graph):
+        self.graph, self.statements = graph, []
+
+    def run(self, query, **params):
+        self.statements.append((query, params))
+
+    def commit(self):
+        self.graph.committed.append(self.statements)
+
+    def rollback(self):
+        pass
+
+class FakeGraph:
+    def __init__(self):
+        self.committed, self.cleanup = [], []
+
+    def begin(self):
+        return FakeTx(self)
+
+    def run(self, query, **params):
+        self.cleanup.append(params)
+        return types.SimpleNamespace(evaluate=lambda: 0)
+
+def test_derived_edges_replaced_per_start_node(tmp_path, monkeypatch):
+    path = tmp_path / "rel_similar_to.csv"
+    path.write_text("disease_id,similar_disease_id,score,shared\n"
+                    "感冒,流感,0.8,3\n感冒,肺炎,0.5,2\n肺炎,支气管炎,0.6,2\n", encoding='utf-8-sig')
+    graph = FakeGraph()
+    monkeypatch.setattr(import_to_neo4j, 'get_graph', lambda: graph)
+    count = replace_derived_relationships(str(path), ['disease_id', 'similar_disease_id', 'score', 'shared'],
+                                          'SIMILAR_TO', 'Disease', 'Disease', batch_size=2)
+    assert count == 3
+    # 感冒 的两条边不会被拆到两个事务中；每个事务先写新边再删同一批起点的旧边
+    assert len(graph.committed) == 2
+    for (upsert, params), (prune, prune_params) in graph.committed:
+        assert "MERGE" in upsert and "DELETE" in prune and params == prune_params
+    assert [g['ends'] for g in graph.committed[0][0][1]['groups']] == [["流感", "肺炎"]]
+    # 表中已没有边的起点最后再清理
+    assert graph.cleanup[0]['starts'] == ["感冒", "肺炎"]
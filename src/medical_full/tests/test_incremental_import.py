@@ -0,0 +1,21 @@
+import json
+
+from incremental_import import diff_manifests, load_manifest
+
+def entry(name, symptoms, digest):
+    return {'name': name, 'symptom_id': symptoms, 'drug_id': [], 'check_id': [], 'hash': digest}
+
+def test_duplicate_manifest_entries_first_wins(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    rows = [entry("感冒", ["发热"], "h1"), entry("肺炎", ["胸痛"], "h2"), entry("感冒", ["头痛"], "h3")]
+    path.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in rows) + "\n", encoding='utf-8')
+    manifest = load_manifest(str(path))
+    assert manifest["感冒"] == rows[0] and list(manifest) == ["感冒", "肺炎"]
+
+def test_diff_manifests():
+    old = {"感冒": entry("感冒", ["发热"], "h1"), "肺炎": entry("肺炎", ["胸痛"], "h2")}
+    new = {"感冒": entry("感冒", ["咳嗽"], "h3")}
+    diff = diff_manifests(old, new)
+    assert diff['upsert'] == ["感冒"] and diff['removed'] == ["肺炎"]
+    assert diff['rel_added']['symptom_id'] == [("感冒", "咳嗽")]
+    assert diff['rel_removed']['symptom_id'] == [("感冒", "发热")]
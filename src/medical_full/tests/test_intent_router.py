@@ -0,0 +1,26 @@
+import pytest
+
+from entity_linker import EntityLinker
+from intent_router import IntentRouter
+
+@pytest.fixture
+def router():
+    linker = EntityLinker({'Disease': ["感冒", "肺炎"], 'Symptom': ["发热", "咳嗽"], 'Drug': ["阿莫西林", "布洛芬"]})
+    return IntentRouter(linker, backend='neo4j')
+
+@pytest.mark.parametrize('question, relation', [
+    ("和感冒相似的疾病有哪些", "SIMILAR_TO"),
+    ("哪些病和感冒类似", "SIMILAR_TO"),
+    ("常和阿莫西林一起用的药", "CO_PRESCRIBED"),
+    ("什么药可以和布洛芬一起吃", "CO_PRESCRIBED"),
+    ("感冒差不多要吃什么药", "TREATED_BY_DRUG"),
+    ("感冒有什么症状，和肺炎类似吗", "HAS_SYMPTOM"),
+    ("发热咳嗽是什么病", "HAS_SYMPTOM"),
+])
+def test_route(router, question, relation):
+    cypher, _ = router.route(question)
+    assert f"[r:{relation}]" in cypher or f"[:{relation}]" in cypher
+
+def test_miss(router):
+    assert router.route("今天天气怎么样") is None
+    assert router.stats()['misses'] == 1
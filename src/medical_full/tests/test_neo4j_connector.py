@@ -0,0 +1,43 @@
+import types
+
+from neo4j_connector import Neo4jConnector
+
+class FakeTransaction:
+    def __init__(self, log, commit_error=None):
+        self.log = log
+        self.commit_error = commit_error
+
+    def run(self, cypher, **parameters):
+        if cypher == "BAD":
+            raise RuntimeError("syntax error")
+        self.log.append(cypher)
+        return types.SimpleNamespace(data=lambda: [{'q': cypher}])
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+
+    def commit(self):
+        if self.commit_error:
+            raise self.commit_error
+        self.log.append("COMMIT")
+
+def test_execute_many_marks_rolled_back_statements_failed():
+    log = []
+    conn = Neo4jConnector()
+    conn.graph = types.SimpleNamespace(begin=lambda: FakeTransaction(log))
+    conn._initialized = True
+    results = conn.execute_many(["A", ("B", {}), "BAD", "C"])
+    assert [r['success'] for r in results] == [False, False, False, True]
+    assert "已回滚" in results[0]['error'] and results[2]['error'] == "syntax error"
+    assert results[3]['data'] == [{'q': "C"}]
+    assert log == ["A", "B", "ROLLBACK", "C", "COMMIT"]
+
+def test_execute_many_reports_commit_failure():
+    log = []
+    conn = Neo4jConnector()
+    transactions = iter([FakeTransaction(log), FakeTransaction(log, RuntimeError("leader switched"))])
+    conn.graph = types.SimpleNamespace(begin=lambda: next(transactions))
+    conn._initialized = True
+    results = conn.execute_many(["BAD", "A", "B"])
+    assert [r['success'] for r in results] == [False, False, False]
+    assert results[1]['error'] == results[2]['error'] == "事务提交失败: leader switched"
@@ -0,0 +1,62 @@
+import json
+
+from preprocess import preprocess_medical_data_streaming
+
+RECORDS = [
+    '{"name": "病a", "symptom": ["发热", "咳嗽"], "common_drug": ["药1"], "check": []}',
+    '{"name": "病x", "symptom": [1, null]}',
+    '{"name": "病y", "symptom": "发热"}',
+    '{"name": "病z", "check": ["", "血常规"]}',
+    'not json',
+    '{"name": "病b", "symptom": ["发热"]}',
+]
+
+def test_streaming_rejects_bad_lines(tmp_path):
+    source = tmp_path / "medical.json"
+    source.write_text("\n".join(RECORDS) + "\n", encoding='utf-8')
+    out = tmp_path / "out"
+    stats = preprocess_medical_data_streaming(str(source), str(out))
+    assert stats['diseases'] == 2 and stats['rejects'] == 4
+    rejects = [json.loads(line) for line in (out / "rejects.jsonl").read_text(encoding='utf-8').splitlines()]
+    assert [r['line'] for r in rejects] == [2, 3, 4, 5]
+    manifest = (out / "manifest.jsonl").read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line)['name'] for line in manifest] == ["病a", "病b"]
+
+def test_duplicate_diseases_first_record_wins(tmp_path):
+    from preprocess import preprocess_medical_data
+
+    source = tmp_path / "medical.json"
+    records = [{'name': "病a", 'desc': "第一条", 'symptom': ["发热"]},
+               {'name': "病b", 'symptom': ["咳嗽"]},
+               {'name': "病a", 'desc': "第二条", 'symptom': ["头痛"]}]
+    source.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in records) + "\n", encoding='utf-8')
+    batch, stream = tmp_path / "batch", tmp_path / "stream"
+    preprocess_medical_data(str(source), str(batch))
+    preprocess_medical_data_streaming(str(source), str(stream))
+    manifest = (batch / "manifest.jsonl").read_text(encoding='utf-8')
+    assert manifest == (stream / "manifest.jsonl").read_text(encoding='utf-8')
+    assert json.loads(manifest.splitlines()[0])['symptom_id'] == ["发热"]
+
+def test_batch_rejects_bad_lines(tmp_path):
+    from preprocess import preprocess_medical_data
+
+    source = tmp_path / "medical.json"
+    source.write_text("\n".join(RECORDS) + "\n", encoding='utf-8')
+    for workers in (1, 2):
+        out = tmp_path / f"out{workers}"
+        preprocess_medical_data(str(source), str(out), workers=workers)
+        manifest = (out / "manifest.jsonl").read_text(encoding='utf-8').splitlines()
+        assert [json.loads(line)['name'] for line in manifest] == ["病a", "病b"]
+        rejects = [json.loads(line) for line in (out / "rejects.jsonl").read_text(encoding='utf-8').splitlines()]
+        assert [r['raw'] for r in rejects] == RECORDS[1:5]
+        if workers == 1:
+            assert [r['line'] for r in rejects] == [2, 3, 4, 5]
+
+def test_streaming_snapshot_is_opt_in(tmp_path):
+    source = tmp_path / "medical.json"
+    source.write_text("\n".join(RECORDS) + "\n", encoding='utf-8')
+    plain, full = tmp_path / "plain", tmp_path / "full"
+    preprocess_medical_data_streaming(str(source), str(plain))
+    assert not (plain / "graph.snap").exists()
+    preprocess_medical_data_streaming(str(source), str(full), snapshot=True)
+    assert (full / "graph.snap").exists()
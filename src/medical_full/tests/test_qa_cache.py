@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+
+from qa_cache import CacheLayer, SQLiteCache
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), maxsize=10, evict_batch=2)
+    for i in range(10):
+        cache.set(i, i)
+        time.sleep(0.002)
+    # 读命中的访问时间先记在内存中，淘汰前写回
+    assert cache.get(0) == 0
+    time.sleep(0.002)
+    cache.set(10, 10)
+    assert len(cache) == 8
+    assert cache.get(0) == 0
+    assert [cache.get(i) for i in range(1, 5)] == [None, None, None, 4]
+
+def test_sqlite_cache_size_stays_bounded(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteCache(path, maxsize=100)
+    for i in range(1000):
+        cache.set(f"k{i}", i)
+    assert 90 <= len(cache) <= 100
+    assert cache.get("k999") == 999
+    # 重新打开时从库中恢复条目数
+    assert len(SQLiteCache(path, maxsize=100)) == len(cache)
+
+def test_sqlite_cache_expired_and_clear(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), ttl=-1)
+    cache.set("a", 1)
+    assert cache.get("a", "miss") == "miss"
+    cache.ttl = 60
+    cache.set("b", [1, 2])
+    assert cache.get("b") == [1, 2]
+    cache.clear()
+    assert len(cache) == 0
+
+def test_sqlite_cache_close_flushes_access_times(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteCache(path)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    time.sleep(0.002)
+    cache.get("a")
+    cache.close()
+    reopened = SQLiteCache(path)
+    order = [row[0] for row in reopened._conn.execute("SELECT key FROM cache ORDER BY accessed_at")]
+    assert order == ['"b"', '"a"']
+
+def test_async_layer_keeps_disk_io_off_event_loop(tmp_path):
+    layer = CacheLayer('answer', 10, 60, str(tmp_path / "cache.db"))
+    disk_threads = []
+    for name in ('get', 'set'):
+        method = getattr(layer.disk, name)
+        setattr(layer.disk, name, lambda *args, method=method: (disk_threads.append(threading.get_ident()), method(*args))[1])
+
+    async def compute():
+        return "回答"
+
+    async def chunks():
+        yield "不应"
+        yield "调用"
+
+    async def run():
+        assert await layer.aget_or_compute("q", compute) == "回答"
+        layer.memory.clear()
+        # 内存未命中时从 SQLite 读回
+        return threading.get_ident(), [c async for c in layer.astream_or_compute("q", chunks)]
+
+    loop_thread, streamed = asyncio.run(run())
+    assert streamed == ["回答"] and layer.hits == 1 and layer.misses == 1
+    assert len(disk_threads) == 3 and loop_thread not in disk_threads
+
+def test_qa_cache_passes_disk_size(tmp_path):
+    from qa_cache import QACache
+
+    path = str(tmp_path / "cache.db")
+    assert QACache(maxsize=8, sqlite_path=path).layers['answer'].disk.maxsize == 8
+    assert QACache(maxsize=8, sqlite_path=path, disk_maxsize=500).layers['cypher'].disk.maxsize == 500
@@ -0,0 +1,44 @@
+from entity_linker import EntityLinker
+from intent_router import IntentRouter
+from qa_pipeline import NO_RESULT, QAPipeline, is_cacheable_result
+from qa_service import StubChain
+
+class DataConnector:
+    """只有 data() 的连接器 (同 Neo4jConnector)"""
+    def __init__(self, rows=None, error=None):
+        self.rows, self.error, self.calls = rows or [], error, []
+
+    def data(self, cypher, _timeout=None, **params):
+        self.calls.append((cypher, params, _timeout))
+        if self.error:
+            raise self.error
+        return self.rows
+
+def make_pipeline(connector, cypher="MATCH (d:Disease) RETURN d.name AS name"):
+    router = IntentRouter(EntityLinker({'Disease': ["感冒"], 'Symptom': ["发热"]}), backend='neo4j')
+    return QAPipeline(StubChain(cypher, delay=0), StubChain(lambda i: i['result'], delay=0), connector, router)
+
+def test_execute_formats_rows_and_adds_limit():
+    conn = DataConnector([{'name': "感冒", 'd': {'name': "发热"}}])
+    pipeline = make_pipeline(conn)
+    assert pipeline.execute("MATCH (d:Disease) RETURN d.name AS name") == "name：感冒；d：发热。"
+    cypher, _, timeout = conn.calls[0]
+    assert "LIMIT" in cypher and timeout == pipeline.guard.timeout
+
+def test_execute_errors_are_not_cacheable():
+    pipeline = make_pipeline(DataConnector(error=RuntimeError("连接断开")))
+    result = pipeline.execute("MATCH (d:Disease) RETURN d.name")
+    assert result.startswith("查询过程中出现问题") and not is_cacheable_result(result)
+    assert make_pipeline(DataConnector()).execute("MATCH (d:Disease) RETURN d.name") == NO_RESULT
+
+def test_execute_rejects_writes():
+    conn = DataConnector()
+    assert make_pipeline(conn).execute("MATCH (d:Disease) DETACH DELETE d").startswith("验证失败")
+    assert conn.calls == []
+
+def test_prepare_routes_template_before_llm():
+    conn = DataConnector([{'name': "发热"}])
+    pipeline = make_pipeline(conn, cypher="MATCH (x) RETURN x")
+    key, cypher, result, _ = pipeline.prepare("感冒有什么症状")
+    assert "Symptom" in cypher and result == "name：发热。"
+    assert "".join(pipeline.answer("感冒有什么症状", key, result, "")) == result
@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from qa_service import build_mock_service
+
+def ask(service, questions):
+    """启动测试服务器，并发提交问题，返回 [(状态码, JSON)]"""
+    async def run():
+        async with TestClient(TestServer(service.make_app())) as client:
+            async def one(q):
+                resp = await client.post('/ask', json={'question': q})
+                return resp.status, await resp.json()
+            return await asyncio.gather(*(one(q) for q in questions))
+    return asyncio.run(run())
+
+def test_ask_ok(data_dir):
+    service = build_mock_service(data_dir, llm_delay=0)
+    [(status, body)] = ask(service, ["感冒有什么症状"])
+    assert status == 200
+    assert body['answer'].startswith("根据知识图谱") and "Symptom" in body['cypher']
+    assert service.served == 1
+
+def test_ask_rejects_when_busy(data_dir):
+    service = build_mock_service(data_dir, llm_delay=0.3, max_pending=1)
+    statuses = sorted(status for status, _ in ask(service, ["感冒有什么症状", "肺炎有什么症状"]))
+    assert statuses == [200, 429] and service.rejected == 1
+
+def test_ask_timeout(data_dir):
+    service = build_mock_service(data_dir, llm_delay=0.5, request_timeout=0.1)
+    [(status, body)] = ask(service, ["感冒有什么症状"])
+    assert status == 504 and body['error'] == "请求超时" and service.timeouts == 1
+
+def post(service, path, body, params=None):
+    """单个请求，返回 (状态码, 响应文本)"""
+    async def run():
+        async with TestClient(TestServer(service.make_app())) as client:
+            resp = await client.post(path, json=body, params=params)
+            return resp.status, await resp.text()
+    return asyncio.run(run())
+
+def sse_events(text):
+    return [(block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+            for block in text.strip().split("\n\n")]
+
+def test_ask_stream_events(data_dir):
+    service = build_mock_service(data_dir, llm_delay=0)
+    status, text = post(service, '/ask', {'question': "感冒有什么症状"}, params={'stream': '1'})
+    events = sse_events(text)
+    assert status == 200 and events[0][0] == 'meta' and events[-1][0] == 'done'
+    assert "".join(data['text'] for event, data in events if event == 'delta').startswith("根据知识图谱")
+
+def test_ask_stream_timeout(data_dir):
+    service = build_mock_service(data_dir, llm_delay=0.5, request_timeout=0.1)
+    status, text = post(service, '/ask', {'question': "感冒有什么症状"}, params={'stream': '1'})
+    # 响应头已发出，超时以 error 事件告知；模板命中时 meta 事件已先发出
+    events = sse_events(text)
+    assert status == 200 and events[-1] == ('error', {'error': "请求超时"})
+    assert not any(event in ('delta', 'done') for event, _ in events)
+    assert service.timeouts == 1 and service.served == 0
+
+def test_ask_diagnosis_skips_cypher(data_dir):
+    service = build_mock_service(data_dir, llm_delay=0)
+    [(status, body)] = ask(service, ["发热胸痛可能是什么病"])
+    assert status == 200 and body['cypher'] is None and "肺炎" in body['answer']
+
+def test_diagnose_endpoint(data_dir):
+    service = build_mock_service(data_dir, llm_delay=0)
+    status, text = post(service, '/diagnose', {'symptoms': "胸痛，发热 不存在", 'k': 2})
+    body = json.loads(text)
+    assert status == 200 and [r['disease'] for r in body['results']][0] == "肺炎" and len(body['results']) == 2
+    assert body['unknown'] == ["不存在"]
+    assert post(service, '/diagnose', {'symptoms': ["发热"], 'k': "多个"})[0] == 400
+    assert post(service, '/diagnose', {})[0] == 400
+    assert post(build_mock_service(data_dir, diagnoser=None), '/diagnose', {'symptoms': ["发热"]})[0] == 503
@@ -0,0 +1,71 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import run_kimi_experiment as rke
+
+ROWS = pd.DataFrame([
+    {'question': "发烧咳嗽怎么办", 'answer': "可能是感冒，可服用布洛芬"},
+    {'question': "胸痛发热", 'answer': "建议拍胸片排查肺炎"},
+])
+CONFIGS = len(rke.PROMPT_TEMPLATES) * len(rke.TEMP_LIST)
+
+class FakeChain:
+    """记录调用次数的假 LLM；fail 中的问题抛出不可重试的错误"""
+    def __init__(self, calls, fail=()):
+        self.calls, self.fail = calls, fail
+
+    async def ainvoke(self, inputs):
+        self.calls.append(inputs['question'])
+        if inputs['question'] in self.fail:
+            raise ValueError("400 bad request")
+        content = json.dumps({'diseases': [{'name': "感冒"}], 'symptoms': ["发热"]}, ensure_ascii=False)
+        return SimpleNamespace(content=content, usage_metadata={'input_tokens': 10, 'output_tokens': 5})
+
+@pytest.fixture
+def experiment(tmp_path, monkeypatch):
+    monkeypatch.setattr(rke, 'OUT_DIR', str(tmp_path))
+    calls = []
+
+    def run(fail=(), **kwargs):
+        monkeypatch.setattr(rke, 'build_chain', lambda tpl, temp: FakeChain(calls, fail))
+        del calls[:]
+        return asyncio.run(rke.run_experiment_async(ROWS, max_in_flight=4, **kwargs)), list(calls)
+    return run
+
+def test_first_run_writes_results_and_checkpoint(experiment, tmp_path):
+    stats, calls = experiment()
+    assert len(calls) == CONFIGS * len(ROWS)
+    assert all(st['errors'] == 0 and st['input_tokens'] == 10 * len(ROWS) for st in stats.values())
+    checkpoint = (tmp_path / rke.CHECKPOINT_FILE).read_text(encoding='utf-8').splitlines()
+    assert len(checkpoint) == CONFIGS * len(ROWS)
+    df = pd.read_csv(tmp_path / "简洁高效版_T0.0.csv", encoding='utf-8-sig')
+    assert list(df['row_id']) == [rke.row_id(r) for r in ROWS.to_dict(orient='records')]
+    assert list(df['diseases']) == ["感冒", "感冒"]
+
+def test_resume_skips_finished_calls(experiment):
+    experiment()
+    stats, calls = experiment()
+    assert calls == []
+    assert all(st['resumed'] == len(ROWS) and st['elapsed'] == 0.0 for st in stats.values())
+
+def test_failed_calls_are_retried_on_resume(experiment):
+    stats, _ = experiment(fail=("胸痛发热",))
+    assert all(st['errors'] == 1 for st in stats.values())
+    stats, calls = experiment()
+    assert calls == ["胸痛发热"] * CONFIGS
+    assert all(st['resumed'] == 1 and st['errors'] == 0 for st in stats.values())
+
+def test_fresh_run_reuses_only_deterministic_responses(experiment):
+    experiment()
+    stats, calls = experiment(resume=False)
+    # 只有 T=0.0 的回复进入持久缓存，其余 temperature 重新调用
+    zero = [st for (_, temp), st in stats.items() if temp == 0.0]
+    assert all(st['cache_hits'] == len(ROWS) for st in zero)
+    assert len(calls) == (CONFIGS - len(zero)) * len(ROWS)
+    stats, calls = experiment(resume=False, use_cache=False)
+    assert len(calls) == CONFIGS * len(ROWS)
+    assert all(st['cache_hits'] == 0 for st in stats.values())
@@ -0,0 +1,39 @@
+import numpy as np
+
+from graph_snapshot import CSR, GraphSnapshot
+from similarity import DERIVED_RELATIONS, build_tables, co_prescribed_drugs, top_k_overlap
+
+def test_co_prescribed_without_drug_relations(data_dir):
+    snapshot = GraphSnapshot.from_csv(data_dir)
+    del snapshot.relations['common_drug']
+    df = co_prescribed_drugs(snapshot)
+    assert df.empty and list(df.columns) == DERIVED_RELATIONS[1][1]
+    tables = build_tables(snapshot)
+    assert len(tables[DERIVED_RELATIONS[0][0]]) > 0
+
+def small_relations():
+    # 物品 0: 特征 {0, 1}；物品 1: {0}；物品 2: {0, 1, 2, 3, 4, 5}，权重均为 1
+    # Jaccard: (0,1) = 1/2 共享 1，(0,2) = 2/6 共享 2，(1,2) = 1/6 共享 1
+    item = np.array([0, 0, 1, 2, 2, 2, 2, 2, 2])
+    feature = np.array([0, 1, 0, 0, 1, 2, 3, 4, 5])
+    return [(CSR.from_edges(item, feature, 3), CSR.from_edges(feature, item, 6), np.ones(6))]
+
+def overlap(k, **kwargs):
+    src, dst, score, shared = top_k_overlap(small_relations(), 3, k, **kwargs)
+    return list(zip(src.tolist(), dst.tolist(), np.round(score, 4).tolist(), shared.tolist()))
+
+def test_top_k_overlap_by_jaccard():
+    assert overlap(1, min_shared=1) == [(0, 1, 0.5, 1), (1, 0, 0.5, 1), (2, 0, 0.3333, 2)]
+    assert overlap(2, min_shared=1) == [(0, 1, 0.5, 1), (0, 2, 0.3333, 2), (1, 0, 0.5, 1), (1, 2, 0.1667, 1),
+                                        (2, 0, 0.3333, 2), (2, 1, 0.1667, 1)]
+
+def test_top_k_overlap_min_shared_and_by_count():
+    assert overlap(2, min_shared=2) == [(0, 2, 0.3333, 2), (2, 0, 0.3333, 2)]
+    # 按共享个数排序时物品 0 选共享 2 个特征的物品 2，而不是 Jaccard 更高的物品 1
+    assert overlap(1, min_shared=1, by_count=True) == [(0, 2, 0.3333, 2), (1, 0, 0.5, 1), (2, 0, 0.3333, 2)]
+
+def test_top_k_overlap_small_blocks_match():
+    relations = small_relations()
+    whole = top_k_overlap(relations, 3, 2, min_shared=1)
+    blocked = top_k_overlap(relations, 3, 2, min_shared=1, block_cells=3)
+    assert all(np.array_equal(a, b) for a, b in zip(whole, blocked))
@@ -0,0 +1,64 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tugraph_connector import AsyncTuGraphConnector, TuGraphConnector
+
+class FakeTuGraph(BaseHTTPRequestHandler):
+    statuses = []
+    cypher_calls = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path == '/login':
+            status, body = 200, {'jwt': 'token'}
+        else:
+            type(self).cypher_calls += 1
+            status = self.statuses.pop(0) if self.statuses else 200
+            body = {'result': [[1]]}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), FakeTuGraph)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+
+def reset(statuses):
+    FakeTuGraph.statuses = list(statuses)
+    FakeTuGraph.cypher_calls = 0
+
+@pytest.mark.parametrize('statuses, success, calls', [
+    ([502], False, 1),
+    ([504], False, 1),
+    ([503, 200], True, 2),
+])
+def test_sync_retries_only_503(server, statuses, success, calls):
+    conn = TuGraphConnector(host='127.0.0.1', port=server, backoff_factor=0)
+    reset(statuses)
+    assert conn.execute_cypher("RETURN 1", timeout=5)['success'] is success
+    assert FakeTuGraph.cypher_calls == calls
+
+@pytest.mark.parametrize('statuses, success, calls', [
+    ([502], False, 1),
+    ([503, 503, 200], True, 3),
+])
+def test_async_retries_only_503(server, statuses, success, calls):
+    async def run():
+        async with AsyncTuGraphConnector(host='127.0.0.1', port=server, backoff_factor=0) as conn:
+            return await conn.execute_cypher("RETURN 1", timeout=5)
+    reset(statuses)
+    assert asyncio.run(run())['success'] is success
+    assert FakeTuGraph.cypher_calls == calls
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+import validate_entities as ve
+
+class FakeConnector:
+    """execute_many 按 UNWIND 批次返回图中存在的名称"""
+    def __init__(self, names, fail=False):
+        self.names, self.fail, self.statements = set(names), fail, []
+
+    def execute_many(self, statements):
+        self.statements += statements
+        if self.fail:
+            return [{'success': False, 'error': "连接断开"} for _ in statements]
+        return [{'success': True, 'data': [{'name': n} for n in params['names'] if n in self.names]}
+                for _, params in statements]
+
+def test_graph_resolver_batches_lookups():
+    conn = FakeConnector(["感冒", "肺炎"])
+    found = ve.GraphResolver(conn, batch_size=2).lookup('Disease', ["感冒", "流感病", "肺炎", "糖尿病", "哮喘"])
+    assert found == {"感冒", "肺炎"}
+    assert [params['names'] for _, params in conn.statements] == [["感冒", "流感病"], ["肺炎", "糖尿病"], ["哮喘"]]
+    assert "UNWIND $names" in conn.statements[0][0] and ":Disease" in conn.statements[0][0]
+    with pytest.raises(RuntimeError):
+        ve.GraphResolver(FakeConnector([], fail=True)).lookup('Disease', ["感冒"])
+
+@pytest.fixture
+def out_dir(tmp_path, data_dir, monkeypatch):
+    lookups = []
+
+    class CountingResolver(ve.CsvResolver):
+        def lookup(self, label, names):
+            lookups.append((label, list(names)))
+            return super().lookup(label, names)
+
+    monkeypatch.setattr(ve, 'build_resolver', lambda backend, d: CountingResolver(data_dir))
+    out = tmp_path / "out"
+    out.mkdir()
+    pd.DataFrame([
+        {'row_id': "a", 'diseases': "感冒", 'symptoms': "发热", 'treatments': "多喝水"},
+        {'row_id': "b", 'diseases': "流感病 感冒", 'symptoms': "", 'treatments': ""},
+        {'row_id': "c", 'diseases': "糖尿病", 'symptoms': "发热", 'treatments': ""},
+        {'row_id': "d", 'diseases': "", 'symptoms': "", 'treatments': ""},
+    ]).to_csv(out / "简洁版_T0.0.csv", index=False)
+    return out, lookups
+
+def test_validate_annotates_rows(out_dir):
+    out, _ = out_dir
+    summary = ve.validate(str(out), backend='csv')
+    assert summary[['in_graph', 'fuzzy', 'not_in_graph']].values.tolist() == [[2, 1, 1]]
+    annotated = pd.read_csv(out / ve.VALIDATED_DIR / "简洁版_T0.0.csv", keep_default_na=False)
+    assert list(annotated['graph_status']) == ['in_graph', 'fuzzy', 'not_in_graph', 'in_graph']
+    assert list(annotated['diseases_fuzzy']) == ["", "流感病→流感", "", ""]
+    assert list(annotated['diseases_missing']) == ["", "", "糖尿病", ""]
+    # 非药物治疗不在图谱中，不校验
+    assert 'treatments_missing' not in annotated.columns
+
+def test_validate_only_looks_up_new_names(out_dir):
+    out, lookups = out_dir
+    ve.validate(str(out), backend='csv')
+    assert sorted(lookups) == [('Disease', ["感冒", "流感病", "糖尿病"]), ('Symptom', ["发热"])]
+    del lookups[:]
+    ve.validate(str(out), backend='csv')
+    assert lookups == []
+    pd.DataFrame([{'row_id': "e", 'diseases': "肺炎 感冒", 'symptoms': ""}]).to_csv(out / "新版_T0.5.csv", index=False)
+    ve.validate(str(out), backend='csv')
+    assert lookups == [('Disease', ["肺炎"])]
+    del lookups[:]
+    ve.validate(str(out), backend='csv', refresh=True)
+    # --refresh 丢弃解析缓存，全部名称重新查询
+    assert sum(len(names) for _, names in lookups) == 5
@@ -0,0 +1,48 @@
+import csv
+import random
+
+import numpy as np
+import pytest
+
+from vector_index import VectorIndex, build_index
+
+TOPICS = 8
+
+def topic_text(rng, topic, length=30):
+    # 每个主题使用各自的 40 个汉字，段落按主题自然成簇
+    chars = [chr(0x4e00 + topic * 40 + i) for i in range(40)]
+    return "".join(rng.choice(chars) for _ in range(length))
+
+@pytest.fixture
+def index_dir(tmp_path):
+    rng = random.Random(0)
+    with open(tmp_path / "node_disease.csv", 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['name', 'desc'])
+        writer.writeheader()
+        for i in range(400):
+            writer.writerow({'name': f"病{i}", 'desc': topic_text(rng, i % TOPICS)})
+    return build_index(str(tmp_path), nlist=16)
+
+def brute_force(index, question, k):
+    query = index.embedder.encode([question])[0]
+    scores = np.asarray(index.vectors) @ query
+    return {index.passages[i]['disease'] for i in np.argsort(-scores)[:k]}
+
+def recall(index, questions, k=5):
+    hits = sum(len({p.disease for p in index.search(q, k)} & brute_force(index, q, k)) for q in questions)
+    return hits / (k * len(questions))
+
+def test_ivf_recall_against_brute_force(index_dir):
+    rng = random.Random(1)
+    questions = [topic_text(rng, t % TOPICS, 10) for t in range(40)]
+    index = VectorIndex(index_dir, nprobe=16)
+    # 探查全部聚类即精确检索
+    assert recall(index, questions) == 1.0
+    index.nprobe = 2
+    assert recall(index, questions) >= 0.9
+
+def test_search_restricted_to_diseases(index_dir):
+    index = VectorIndex(index_dir)
+    passages = index.search(topic_text(random.Random(2), 0, 10), k=5, diseases=["病3", "病11"])
+    assert {p.disease for p in passages} <= {"病3", "病11"}
+    assert index.search("随便问问", diseases=["不存在的病"]) == []
@@ -4,12 +4,30 @@
 import json
 import requests
 import os
-from typing import Optional, Dict, Any
+import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Iterable, Union, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
+Statement = Union[str, Tuple[str, Optional[dict]]]
+
+def _normalize_statements(statements: Iterable[Statement]) -> List[Tuple[str, Optional[dict]]]:
+    """把 'cypher' 或 (cypher, params) 统一成 (cypher, params)"""
+    return [(st, None) if isinstance(st, str) else (st[0], st[1] if len(st) > 1 else None)
+            for st in statements]
+
+# 只有请求肯定没被处理时才重试：连接失败 (请求未发出) 与 503 (服务端拒绝)。
+# 502/504 时网关可能已经把查询转给了 TuGraph，重放会让同一查询执行多次
+RETRY_STATUSES = (503,)
+# 建立连接的超时，单独设得较短，使重试的总耗时主要由一次查询超时决定
+CONNECT_TIMEOUT = 3.0
+
 class TuGraphConnector:
     """TuGraph图数据库连接器"""
 
@@ -19,7 +37,10 @@ class TuGraphConnector:
         port: int = None,
         user: str = None,
         password: str = None,
-        graph_name: str = 'medical'
+        graph_name: str = 'medical',
+        pool_size: int = 20,
+        max_retries: int = 3,
+        backoff_factor: float = 0.3
     ):
         """
         初始化TuGraph连接器
@@ -30,6 +51,9 @@ class TuGraphConnector:
             user: 用户名
             password: 密码
             graph_name: 图数据库名称
+            pool_size: 连接池大小 (keep-alive 复用的最大连接数)
+            max_retries: 连接失败或 503 时的重试次数 (读超时与其他状态码不重试)
+            backoff_factor: 重试的指数退避系数
         """
         self.host = host or os.getenv('TUGRAPH_HOST', '127.0.0.1')
         self.port = port or int(os.getenv('TUGRAPH_PORT', '7070'))
@@ -40,6 +64,40 @@ class TuGraphConnector:
         self.base_url = f"http://{self.host}:{self.port}"
         self.token = None
         self._initialized = False
+        self._token_lock = threading.Lock()
+        self.pool_size = pool_size
+        self.session = self._build_session(pool_size, max_retries, backoff_factor)
+
+    @staticmethod
+    def _build_session(pool_size, max_retries, backoff_factor) -> requests.Session:
+        """构建复用 TCP 连接的 Session，只对连接失败和 503 重试"""
+        retry = Retry(
+            total=max_retries,
+            read=0,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'POST']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def close(self):
+        self.session.close()
+
+    def _refresh_token(self, stale_token: Optional[str]) -> Dict[str, Any]:
+        """
+        单飞刷新 Token：并发请求同时遇到过期时只有第一个线程调用 login()，
+        其余线程等锁后发现 Token 已更新，直接复用
+        """
+        with self._token_lock:
+            if self._initialized and self.token != stale_token:
+                return {'success': True, 'token': self.token}
+            self._initialized = False
+            return self.login()
 
     def login(self) -> Dict[str, Any]:
         """
@@ -55,7 +113,7 @@ class TuGraphConnector:
                 'password': self.password
             }
 
-            response = requests.post(url, json=payload, timeout=10)
+            response = self.session.post(url, json=payload, timeout=10)
 
             if response.status_code == 200:
                 result = response.json()
@@ -88,27 +146,30 @@ class TuGraphConnector:
                 'error': f'登录异常: {str(e)}'
             }
 
-    def execute_cypher(self, cypher: str, params: dict = None) -> Dict[str, Any]:
+    def execute_cypher(self, cypher: str, params: dict = None, timeout: float = None,
+                       _retry_auth: bool = True) -> Dict[str, Any]:
         """
         执行Cypher查询
 
         参数:
             cypher: Cypher查询语句
             params: 查询参数
+            timeout: 请求超时秒数，默认 30
 
         返回:
             {'success': bool, 'data': list, 'error': str}
         """
         # 确保已登录
         if not self._initialized:
-            login_result = self.login()
+            login_result = self._refresh_token(None)
             if not login_result['success']:
                 return login_result
 
+        token = self.token
         try:
             url = f"{self.base_url}/cypher"
             headers = {
-                'Authorization': f'Bearer {self.token}',
+                'Authorization': f'Bearer {token}',
                 'Content-Type': 'application/json'
             }
             payload = {
@@ -118,7 +179,9 @@ class TuGraphConnector:
             if params:
                 payload['parameters'] = params
 
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            timeout = timeout or 30
+            response = self.session.post(url, headers=headers, json=payload,
+                                         timeout=(min(CONNECT_TIMEOUT, timeout), timeout))
 
             if response.status_code == 200:
                 result = response.json()
@@ -133,12 +196,11 @@ class TuGraphConnector:
                         'success': True,
                         'data': result
                     }
-            elif response.status_code == 401:
-                # Token过期，重新登录
-                self._initialized = False
-                login_result = self.login()
+            elif response.status_code == 401 and _retry_auth:
+                # Token过期，重新登录 (单飞) 后重试一次
+                login_result = self._refresh_token(token)
                 if login_result['success']:
-                    return self.execute_cypher(cypher, params)
+                    return self.execute_cypher(cypher, params, timeout, _retry_auth=False)
                 return login_result
             else:
                 error_msg = response.text or f'HTTP {response.status_code}'
@@ -158,6 +220,23 @@ class TuGraphConnector:
                 'error': f'查询异常: {str(e)}'
             }
 
+    def execute_many(self, statements: Iterable[Statement], max_workers: int = None) -> List[Dict[str, Any]]:
+        """
+        并发执行多条 Cypher，共享连接池
+
+        参数:
+            statements: 'cypher' 或 (cypher, params) 的列表
+            max_workers: 并发数，默认等于连接池大小
+
+        返回:
+            与输入顺序一致的结果列表，每项格式同 execute_cypher
+        """
+        statements = _normalize_statements(statements)
+        if not statements:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers or self.pool_size, len(statements))) as pool:
+            return list(pool.map(lambda st: self.execute_cypher(*st), statements))
+
     def test_connection(self) -> Dict[str, Any]:
         """测试连接"""
         try:
@@ -207,6 +286,170 @@ class TuGraphConnector:
             }
 
 
+class AsyncTuGraphConnector:
+    """
+    基于 aiohttp 的异步 TuGraph 连接器，接口与 TuGraphConnector 一致 (方法均为协程)。
+    所有请求共享一个有上限的连接池，适合大量并发问答请求。
+    """
+
+    def __init__(
+        self,
+        host: str = None,
+        port: int = None,
+        user: str = None,
+        password: str = None,
+        graph_name: str = 'medical',
+        pool_size: int = 20,
+        max_retries: int = 3,
+        backoff_factor: float = 0.3
+    ):
+        self.host = host or os.getenv('TUGRAPH_HOST', '127.0.0.1')
+        self.port = port or int(os.getenv('TUGRAPH_PORT', '7070'))
+        self.user = user or os.getenv('TUGRAPH_USER', 'admin')
+        self.password = password or os.getenv('TUGRAPH_PASSWORD', 'lhy123')
+        self.graph_name = graph_name
+
+        self.base_url = f"http://{self.host}:{self.port}"
+        self.token = None
+        self._initialized = False
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._session = None
+        self._token_lock = asyncio.Lock()
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _post(self, path: str, payload: dict, headers: dict = None, timeout: float = 30):
+        """
+        POST 请求，连接失败或 503 时指数退避重试，返回 (status, json 或文本)
+        timeout 为包括重试在内的总时长，超出时抛 asyncio.TimeoutError
+        """
+        import aiohttp
+        session = await self._get_session()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            last = attempt == self.max_retries
+            try:
+                async with session.post(f"{self.base_url}{path}", json=payload, headers=headers,
+                                        timeout=aiohttp.ClientTimeout(total=remaining,
+                                                                      sock_connect=min(CONNECT_TIMEOUT, remaining))) as response:
+                    if response.status in RETRY_STATUSES and not last:
+                        await response.release()
+                    elif response.status == 200:
+                        return response.status, await response.json(content_type=None)
+                    else:
+                        return response.status, await response.text()
+            except aiohttp.ClientConnectorError:
+                # 连接未建立，请求没有发出，可以安全重试；连接建立后的断开/超时不重试
+                if last:
+                    raise
+            await asyncio.sleep(min(self.backoff_factor * (2 ** attempt), max(deadline - loop.time(), 0)))
+
+    async def login(self) -> Dict[str, Any]:
+        import aiohttp
+        try:
+            status, result = await self._post('/login', {'user': self.user, 'password': self.password}, timeout=10)
+            if status != 200:
+                return {'success': False, 'error': f'登录失败: HTTP {status}'}
+            if 'jwt' not in result:
+                return {'success': False, 'error': '登录响应中没有token'}
+            self.token = result['jwt']
+            self._initialized = True
+            return {'success': True, 'token': self.token}
+        except aiohttp.ClientConnectionError:
+            return {'success': False, 'error': f'无法连接到TuGraph服务器 {self.host}:{self.port}'}
+        except Exception as e:
+            return {'success': False, 'error': f'登录异常: {str(e)}'}
+
+    async def _refresh_token(self, stale_token: Optional[str]) -> Dict[str, Any]:
+        """单飞刷新 Token，语义同 TuGraphConnector._refresh_token"""
+        async with self._token_lock:
+            if self._initialized and self.token != stale_token:
+                return {'success': True, 'token': self.token}
+            self._initialized = False
+            return await self.login()
+
+    async def execute_cypher(self, cypher: str, params: dict = None, timeout: float = None,
+                             _retry_auth: bool = True) -> Dict[str, Any]:
+        if not self._initialized:
+            login_result = await self._refresh_token(None)
+            if not login_result['success']:
+                return login_result
+
+        token = self.token
+        try:
+            headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+            payload = {'graph': self.graph_name, 'script': cypher}
+            if params:
+                payload['parameters'] = params
+
+            status, result = await self._post('/cypher', payload, headers=headers, timeout=timeout or 30)
+            if status == 200:
+                if isinstance(result, dict) and 'result' in result:
+                    return {'success': True, 'data': result['result']}
+                return {'success': True, 'data': result}
+            elif status == 401 and _retry_auth:
+                login_result = await self._refresh_token(token)
+                if login_result['success']:
+                    return await self.execute_cypher(cypher, params, timeout, _retry_auth=False)
+                return login_result
+            return {'success': False, 'error': f'查询失败: {result or f"HTTP {status}"}'}
+
+        except asyncio.TimeoutError:
+            return {'success': False, 'error': '查询超时'}
+        except Exception as e:
+            return {'success': False, 'error': f'查询异常: {str(e)}'}
+
+    async def execute_many(self, statements: Iterable[Statement]) -> List[Dict[str, Any]]:
+        """并发执行多条 Cypher，并发度受连接池大小限制，结果按输入顺序返回"""
+        return list(await asyncio.gather(*(self.execute_cypher(c, p) for c, p in _normalize_statements(statements))))
+
+    async def test_connection(self) -> Dict[str, Any]:
+        login_result = await self.login()
+        if not login_result['success']:
+            return login_result
+        test_result = await self.execute_cypher("MATCH (n) RETURN count(n) as count LIMIT 1")
+        if test_result['success']:
+            return {
+                'success': True,
+                'message': f'TuGraph连接成功 ({self.host}:{self.port})',
+                'graph': self.graph_name
+            }
+        return test_result
+
+    async def get_schema(self) -> Dict[str, Any]:
+        result = await self.execute_cypher("CALL db.vertexLabels()")
+        if not result['success']:
+            return result
+        edge_result = await self.execute_cypher("CALL db.edgeLabels()")
+        return {
+            'success': True,
+            'vertex_labels': result['data'],
+            'edge_labels': edge_result.get('data', []) if edge_result['success'] else []
+        }
+
+
 class TuGraphConnectorMock:
     """TuGraph模拟连接器 - 用于开发测试"""
 
@@ -217,7 +460,7 @@ class TuGraphConnectorMock:
     def login(self) -> Dict[str, Any]:
         return {'success': True, 'token': 'mock_token'}
 
-    def execute_cypher(self, cypher: str, params: dict = None) -> Dict[str, Any]:
+    def execute_cypher(self, cypher: str, params: dict = None, timeout: float = None) -> Dict[str, Any]:
         """模拟执行Cypher"""
         # 根据查询返回模拟数据
         if 'Disease' in cypher:
@@ -244,6 +487,9 @@ class TuGraphConnectorMock:
                 'data': [{'count': 100}]
             }
 
+    def execute_many(self, statements: Iterable[Statement], max_workers: int = None) -> List[Dict[str, Any]]:
+        return [self.execute_cypher(c, p) for c, p in _normalize_statements(statements)]
+
     def test_connection(self) -> Dict[str, Any]:
         return {
             'success': True,
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+疾病描述文本的本地向量检索
+
+把 node_disease.csv 中 desc / cause / prevent 切成段落并向量化，离线写入:
+    vectors.npy    段落向量矩阵 (float32, 已 L2 归一化)，查询时以 mmap 方式打开
+    centroids.npy  IVF 聚类中心
+    lists.npy      按聚类排序的段落编号，offsets.npy 为各聚类在其中的起止位置
+    passages.jsonl 段落原文 (疾病名、字段、文本)
+    meta.json      向量化方式与参数
+
+向量化优先使用本地 CPU 模型 (sentence-transformers，由 VECTOR_MODEL 指定)，
+未配置或未安装时退化为 单字+双字 哈希 TF-IDF。查询先比较聚类中心，
+只在最近的 nprobe 个聚类内精确计算内积。
+
+用法:
+    python vector_index.py build --data-dir processed_data
+    python vector_index.py query --data-dir processed_data
+"""
+import os
+import csv
+import json
+import zlib
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+INDEX_DIR = "vector_index"
+INDEX_VERSION = 1
+TEXT_FIELDS = ('desc', 'cause', 'prevent')
+FIELD_NAMES = {'desc': "简介", 'cause': "病因", 'prevent': "预防"}
+PASSAGE_CHARS = 200
+HASH_DIM = 2048
+DEFAULT_NPROBE = 8
+
+Passage = namedtuple('Passage', ['disease', 'field', 'text', 'score'])
+
+def _split_passages(text: str, size: int = PASSAGE_CHARS) -> List[str]:
+    """按句号切分后拼成不超过 size 字的段落，单句过长时硬切"""
+    text = " ".join(text.split())
+    if not text:
+        return []
+    sentences, buf = [], ""
+    for ch in text:
+        buf += ch
+        if ch in "。！？；!?;":
+            sentences.append(buf)
+            buf = ""
+    if buf:
+        sentences.append(buf)
+
+    passages, current = [], ""
+    for s in sentences:
+        while len(s) > size:
+            if current:
+                passages.append(current)
+                current = ""
+            passages.append(s[:size])
+            s = s[size:]
+        if len(current) + len(s) > size:
+            passages.append(current)
+            current = ""
+        current += s
+    if current:
+        passages.append(current)
+    return passages
+
+def load_passages_from_csv(data_dir: str) -> List[Dict[str, str]]:
+    path = os.path.join(data_dir, "node_disease.csv")
+    passages = []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            name = (row.get('name') or '').strip()
+            if not name:
+                continue
+            for field in TEXT_FIELDS:
+                for text in _split_passages(row.get(field) or ''):
+                    passages.append({'disease': name, 'field': field, 'text': text})
+    return passages
+
+class HashingEmbedder:
+    """单字 + 双字 哈希到固定维度，按 IDF 加权后 L2 归一化；不依赖任何模型文件"""
+
+    name = 'hashing'
+
+    def __init__(self, dim: int = HASH_DIM, idf: Optional[np.ndarray] = None):
+        self.dim = dim
+        self.idf = idf
+
+    def _buckets(self, text: str) -> Dict[int, int]:
+        counts = {}
+        grams = list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+        for g in grams:
+            if g.isspace():
+                continue
+            b = zlib.crc32(g.encode('utf-8')) % self.dim
+            counts[b] = counts.get(b, 0) + 1
+        return counts
+
+    def fit(self, texts: List[str]) -> 'HashingEmbedder':
+        df = np.zeros(self.dim, dtype=np.float32)
+        for text in texts:
+            df[list(self._buckets(text))] += 1
+        self.idf = np.log((1 + len(texts)) / (1 + df)).astype(np.float32) + 1
+        return self
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for b, c in self._buckets(text).items():
+                out[i, b] = (1 + np.log(c)) * self.idf[b]
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+    def meta(self) -> dict:
+        return {'embedder': self.name, 'dim': self.dim}
+
+class SentenceTransformerEmbedder:
+    """本地 sentence-transformers 模型 (CPU)，需要 pip install sentence-transformers"""
+
+    name = 'sentence-transformers'
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def fit(self, texts: List[str]) -> 'SentenceTransformerEmbedder':
+        return self
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, batch_size=64, normalize_embeddings=True), dtype=np.float32)
+
+    def meta(self) -> dict:
+        return {'embedder': self.name, 'dim': self.dim, 'model': self.model_name}
+
+def make_embedder(model_name: Optional[str] = None):
+    """model_name 为空或 sentence-transformers 不可用时使用哈希向量"""
+    if model_name:
+        try:
+            return SentenceTransformerEmbedder(model_name)
+        except Exception as e:
+            print(f"⚠️ 本地向量模型 {model_name} 加载失败，改用哈希向量: {e}")
+    return HashingEmbedder()
+
+def _kmeans(vectors: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """球面 k-means (内积相似度)，固定随机种子保证重复构建结果一致"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(k):
+            members = vectors[assign == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+    return centroids
+
+def build_index(data_dir: str, out_dir: Optional[str] = None, model_name: Optional[str] = None,
+                nlist: Optional[int] = None, batch_size: int = 256) -> str:
+    """从 node_disease.csv 构建向量索引，返回索引目录"""
+    out_dir = out_dir or os.path.join(data_dir, INDEX_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+
+    passages = load_passages_from_csv(data_dir)
+    if not passages:
+        raise ValueError(f"{data_dir}/node_disease.csv 中没有可索引的文本")
+    texts = [p['text'] for p in passages]
+
+    embedder = make_embedder(model_name).fit(texts)
+    # 逐批写入 memmap，避免一次性占用整个矩阵的内存
+    vectors_path = os.path.join(out_dir, "vectors.npy")
+    vectors = np.lib.format.open_memmap(vectors_path, mode='w+', dtype=np.float32,
+                                        shape=(len(texts), embedder.dim))
+    for start in range(0, len(texts), batch_size):
+        vectors[start:start + batch_size] = embedder.encode(texts[start:start + batch_size])
+    vectors.flush()
+
+    # IVF 划分：聚类数取 sqrt(N)，段落很少时退化为单个聚类 (即精确检索)
+    nlist = nlist or max(1, int(np.sqrt(len(texts))))
+    nlist = min(nlist, len(texts))
+    sample = vectors[np.random.default_rng(0).permutation(len(texts))[:max(nlist * 64, 1)]]
+    centroids = _kmeans(np.asarray(sample), nlist) if nlist > 1 else np.asarray(vectors).mean(axis=0, keepdims=True)
+    assign = np.empty(len(texts), dtype=np.int32)
+    for start in range(0, len(texts), batch_size):
+        assign[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+    lists = np.argsort(assign, kind='stable').astype(np.int32)
+    offsets = np.searchsorted(assign[lists], np.arange(nlist + 1)).astype(np.int64)
+
+    np.save(os.path.join(out_dir, "centroids.npy"), centroids.astype(np.float32))
+    np.save(os.path.join(out_dir, "lists.npy"), lists)
+    np.save(os.path.join(out_dir, "offsets.npy"), offsets)
+    if isinstance(embedder, HashingEmbedder):
+        np.save(os.path.join(out_dir, "idf.npy"), embedder.idf)
+    with open(os.path.join(out_dir, "passages.jsonl"), 'w', encoding='utf-8') as f:
+        for p in passages:
+            f.write(json.dumps(p, ensure_ascii=False) + "\n")
+    with open(os.path.join(out_dir, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(dict(embedder.meta(), version=INDEX_VERSION, count=len(texts), nlist=nlist),
+                  f, ensure_ascii=False, indent=2)
+    return out_dir
+
+class VectorIndex:
+    """只读的 IVF 向量索引，向量矩阵以 mmap 打开，仅访问被探查聚类中的行"""
+
+    def __init__(self, index_dir: str, nprobe: int = DEFAULT_NPROBE):
+        with open(os.path.join(index_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != INDEX_VERSION:
+            raise ValueError(f"向量索引版本不匹配，请重新构建: {index_dir}")
+        self.vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode='r')
+        self.centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+        self.lists = np.load(os.path.join(index_dir, "lists.npy"))
+        self.offsets = np.load(os.path.join(index_dir, "offsets.npy"))
+        with open(os.path.join(index_dir, "passages.jsonl"), 'r', encoding='utf-8') as f:
+            self.passages = [json.loads(line) for line in f]
+        self.nprobe = nprobe
+        self.ids_of = {}
+        for i, p in enumerate(self.passages):
+            self.ids_of.setdefault(p['disease'], []).append(i)
+
+        if self.meta['embedder'] == HashingEmbedder.name:
+            self.embedder = HashingEmbedder(self.meta['dim'], np.load(os.path.join(index_dir, "idf.npy")))
+        else:
+            self.embedder = SentenceTransformerEmbedder(self.meta['model'])
+
+    @classmethod
+    def load(cls, data_dir: str, nprobe: int = DEFAULT_NPROBE) -> Optional['VectorIndex']:
+        """索引不存在或无法加载时返回 None，调用方按无检索结果处理"""
+        index_dir = os.path.join(data_dir, INDEX_DIR)
+        if not os.path.exists(os.path.join(index_dir, "meta.json")):
+            return None
+        try:
+            return cls(index_dir, nprobe)
+        except Exception as e:
+            print(f"⚠️ 向量索引加载失败，检索增强不可用: {e}")
+            return None
+
+    def __len__(self):
+        return len(self.passages)
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        nprobe = min(self.nprobe, len(self.centroids))
+        probe = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.concatenate([self.lists[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+
+    def search(self, question: str, k: int = 3, min_score: float = 0.0,
+               diseases: Optional[Iterable[str]] = None) -> List[Passage]:
+        """
+        参数:
+            diseases: 若给出，只在这些疾病的段落中检索 (例如实体识别得到的疾病名)
+        """
+        query = self.embedder.encode([question])[0]
+        if diseases:
+            ids = np.array(sorted(i for d in set(diseases) for i in self.ids_of.get(d, ())), dtype=np.int64)
+        else:
+            ids = np.sort(self._candidates(query))
+        if not len(ids):
+            return []
+        scores = self.vectors[ids] @ query
+        top = np.argsort(-scores)[:k]
+        return [Passage(self.passages[ids[i]]['disease'], self.passages[ids[i]]['field'],
+                        self.passages[ids[i]]['text'], float(scores[i]))
+                for i in top if scores[i] > min_score]
+
+def format_passages(passages: List[Passage]) -> str:
+    """拼成回答 Prompt 中的参考资料段"""
+    if not passages:
+        return "无"
+    return "\n".join(f"[{p.disease}·{FIELD_NAMES.get(p.field, p.field)}] {p.text}" for p in passages)
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="疾病描述文本的向量索引")
+    parser.add_argument('command', choices=['build', 'query'])
+    parser.add_argument('--data-dir', default="processed_data")
+    parser.add_argument('--model', default=os.getenv('VECTOR_MODEL', ''),
+                        help="本地 sentence-transformers 模型名或路径，留空使用哈希向量")
+    parser.add_argument('--nlist', type=int, default=None, help="IVF 聚类数，默认 sqrt(段落数)")
+    parser.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE)
+    parser.add_argument('-k', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        out_dir = build_index(args.data_dir, model_name=args.model or None, nlist=args.nlist)
+        print(f"向量索引已写入 {out_dir}，耗时 {time.perf_counter() - start:.1f}s")
+    else:
+        index = VectorIndex.load(args.data_dir, args.nprobe)
+        if index is None:
+            raise SystemExit("向量索引不存在，请先运行 build")
+        print(f"索引就绪: {len(index)} 个段落, 向量化方式 {index.meta['embedder']}")
+        while True:
+            try:
+                text = input("问题：").strip()
+            except (EOFError, KeyboardInterrupt):
+                break
+            start = time.perf_counter()
+            hits = index.search(text, args.k)
+            print(format_passages(hits))
+            print(f"({(time.perf_counter() - start) * 1000:.2f}ms)")